@@ -0,0 +1,1023 @@
+"""Module for sending requests to the ActionVFX API.
+
+This module contains a small HTTP client shared by the whole plugin. It keeps
+persistent keep-alive connections per host, decodes gzip/deflate responses
+and is the single place where the session ``Authorization`` header and the
+plugin ``User-Agent`` are added to outgoing requests.
+
+A request refused with ``401`` because the session token expired is sent
+once more after ``api.auth.renew_session`` renewed the token.
+
+Every request has a socket timeout and an overall deadline, retries
+included. Idempotent requests that fail to connect, time out or get a
+``5xx`` are retried with jittered exponential backoff while the deadline
+allows, and a per-host ``CircuitBreaker`` fails requests at once while the
+backend keeps failing instead of letting each one wait for its timeout.
+
+Cached ``GET`` requests are coalesced: while a URL is in flight, other
+callers asking for it wait for that response instead of sending their own.
+``fetch_scenes`` loads several scene details concurrently on a small
+bounded pool.
+"""
+# Standard modules import
+import io
+import json
+import ssl
+import time
+import random
+import socket
+import zlib
+import gzip
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+# Local modules
+from api.tracing import get_tracer
+
+
+# Constants
+BASE_URL = "https://backend.actionvfx.com"
+API_ROOT = BASE_URL + "/api/v1"
+USER_AGENT = "ActionVFX-Nuke/1.0"
+
+# Keep-alive settings
+MAX_IDLE_PER_HOST = 4
+IDLE_TIMEOUT = 30.0
+MAX_REDIRECTS = 5
+
+# Concurrent scene detail requests, one per pooled keep-alive connection
+SCENE_FETCH_WORKERS = MAX_IDLE_PER_HOST
+
+# Deadlines and retries, in seconds
+DEFAULT_TIMEOUT = 15.0
+DEFAULT_DEADLINE = 30.0
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 4.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Circuit breaker
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 15.0
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# Errors raised by a keep-alive socket the server already closed
+STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+def api_url(path):
+    """Return the absolute backend URL for an API path.
+
+    Args:
+        path (str): Path relative to ``/api/v1`` (e.g. ``scenes/12/``).
+
+    Returns:
+        str: The absolute URL.
+    """
+    return f"{API_ROOT}/{path.lstrip('/')}"
+
+
+def _session_auth_header():
+    """Return the ``Authorization`` header of the saved session."""
+    # Imported here because api.auth uses this module to sign in
+    from api.auth import get_auth_header
+    return get_auth_header()
+
+
+def _session_renew(stale_header):
+    """Renew the session refused with ``stale_header``; True on success."""
+    from api.auth import renew_session
+    return renew_session(stale_header) is not None
+
+
+def _session_user():
+    """Return the username of the saved session, used in cache keys."""
+    from api.auth import load_session
+    session = load_session() or {}
+    return session.get("username")
+
+
+class Response(object):
+    """A fully read HTTP response.
+
+    Attributes:
+        url (str): The final URL after redirects.
+        status (int): HTTP status code.
+        headers (http.client.HTTPMessage): Case-insensitive headers.
+        body (bytes): Decoded response body.
+        from_cache (bool): The body was served by the response cache, fresh
+            or confirmed by a ``304``.
+    """
+
+    def __init__(self, url, status, reason, headers, body, from_cache=False):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.from_cache = from_cache
+
+    def getcode(self):
+        """Return the HTTP status code, like ``urlopen`` responses."""
+        return self.status
+
+    def text(self, encoding="utf-8"):
+        """Return the body decoded as text."""
+        return self.body.decode(encoding)
+
+    def json(self):
+        """Return the body parsed as JSON."""
+        return json.loads(self.body.decode("utf-8"))
+
+
+def _traced_create_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                              source_address=None):
+    """``socket.create_connection`` recording the DNS lookup and the TCP
+    connect as separate spans."""
+    tracer = get_tracer()
+    host, port = address
+    start = time.perf_counter()
+    addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    resolved = time.perf_counter()
+    tracer.record("http.dns", start, resolved, "http", host=host)
+
+    error = None
+    for family, kind, proto, _, sockaddr in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, kind, proto)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            tracer.record("http.tcp_connect", resolved, time.perf_counter(),
+                          "http", host=host)
+            return sock
+        except OSError as e:
+            error = e
+            if sock is not None:
+                sock.close()
+    raise error or OSError(f"No address found for {host}")
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of idle keep-alive connections per host."""
+
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST,
+                 idle_timeout=IDLE_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self._ssl_context = None
+        self._idle = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.opened = 0
+        self.reused = 0
+
+    def acquire(self, scheme, host, port, timeout=None):
+        """Return an idle connection for the host or open a new one.
+
+        Returns:
+            tuple: ``(connection, reused)``.
+        """
+        key = (scheme, host, port)
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self.reused += 1
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+            self.opened += 1
+
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                host, port, timeout=timeout, context=self.ssl_context())
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        if get_tracer().enabled:
+            conn._create_connection = _traced_create_connection
+        return conn, False
+
+    def ssl_context(self):
+        """Return the shared SSL context, created on the first HTTPS
+        connection since loading the CA certificates is slow."""
+        with self._lock:
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            return self._ssl_context
+
+    def release(self, scheme, host, port, conn):
+        """Give a connection back to the pool once its response is read."""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, _ in idle:
+                    conn.close()
+            self._idle.clear()
+
+    def stats(self):
+        """Return the pool counters as a dictionary."""
+        with self._lock:
+            return {
+                "opened": self.opened,
+                "reused": self.reused,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
+
+
+class CircuitOpenError(urllib.error.URLError):
+    """Raised without sending the request while the host's breaker is open."""
+
+
+class CircuitBreaker(object):
+    """Fail fast while a host keeps failing.
+
+    After ``failures`` consecutive connection errors, timeouts or ``5xx``
+    responses from a host, its requests raise ``CircuitOpenError`` for
+    ``cooldown`` seconds. Then a single trial request is let through: a
+    success closes the breaker again, a failure keeps it open for another
+    ``cooldown``.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        # host -> [consecutive failures, opened at, trial started at]
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self, host):
+        """Raise ``CircuitOpenError`` if requests to ``host`` must fail."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return
+            failures, opened_at, trial_at = state
+            waiting = opened_at + self.cooldown - now
+            # A trial that never reported back does not block forever
+            if waiting > 0 or (trial_at is not None
+                               and now - trial_at < self.cooldown):
+                self.rejected += 1
+                raise CircuitOpenError(
+                    f"{host} is failing, requests paused for "
+                    f"{max(waiting, 0.0):.0f}s")
+            state[2] = now
+
+    def record_success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host):
+        now = time.monotonic()
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, None, None])
+            state[0] += 1
+            if state[2] is not None or (
+                    state[1] is None and state[0] >= self.failures):
+                # Tripped, or the trial request failed
+                self.trips += 1
+                state[1] = now
+                state[2] = None
+
+    def state(self, host):
+        """Return ``"closed"``, ``"open"`` or ``"half_open"``."""
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return "closed"
+            if time.monotonic() - state[1] < self.cooldown:
+                return "open"
+            return "half_open"
+
+    def stats(self):
+        """Return the breaker counters as a dictionary."""
+        with self._lock:
+            return {
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "open_hosts": sorted(host for host, state in
+                                     self._hosts.items()
+                                     if state[1] is not None),
+            }
+
+
+class HTTPClient(object):
+    """HTTP client with keep-alive pooling and auth header injection.
+
+    Errors are reported with the same exceptions ``urllib.request.urlopen``
+    raises: ``urllib.error.HTTPError`` for 4xx/5xx responses and
+    ``urllib.error.URLError`` when the connection fails.
+
+    An authenticated request answered with ``401`` calls
+    ``session_renewer`` with the header it sent and, if the session was
+    renewed, is sent once more with the new token.
+
+    ``timeout`` bounds every socket operation and ``deadline`` the whole
+    request, retries included; both can be given per request. Idempotent
+    requests are retried up to ``max_retries`` times.
+    """
+
+    def __init__(self, user_agent=USER_AGENT, auth_header_provider=None,
+                 pool=None, session_renewer=None, timeout=DEFAULT_TIMEOUT,
+                 deadline=DEFAULT_DEADLINE, max_retries=MAX_RETRIES,
+                 breaker=None):
+        self.user_agent = user_agent
+        self.auth_header_provider = (
+            auth_header_provider or _session_auth_header)
+        self.session_renewer = session_renewer or _session_renew
+        self.pool = pool or ConnectionPool()
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+
+        # Counters
+        self.auth_retries = 0
+        self.retries = 0
+        self.deadlines_exceeded = 0
+
+    def build_headers(self, headers=None, auth=True):
+        """Return the default request headers merged with ``headers``."""
+        request_headers = {
+            "User-Agent": self.user_agent,
+            "Accept": "*/*",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        if auth:
+            token = self.auth_header_provider()
+            if token:
+                request_headers["Authorization"] = token
+        if headers:
+            request_headers.update(headers)
+        return request_headers
+
+    def request(self, method, url, data=None, headers=None, auth=True,
+                timeout=None, deadline=None):
+        """Send a request and return the fully read response.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Absolute URL.
+            data (bytes): Optional request body.
+            headers (dict): Extra headers, overriding the defaults.
+            auth (bool): Add the session ``Authorization`` header.
+            timeout (float): Socket timeout in seconds, the client's
+                ``timeout`` if None.
+            deadline (float): Seconds the request may take with its
+                retries, the client's ``deadline`` if None.
+
+        Returns:
+            Response: The response, with the body already decoded.
+        """
+        expires = time.monotonic() + (
+            self.deadline if deadline is None else deadline)
+        request_headers = self.build_headers(headers, auth)
+        response = self._with_retries(
+            method, timeout, expires,
+            lambda attempt_timeout: self._request(
+                method, url, data, request_headers, attempt_timeout))
+        if response.status == 401 and auth and \
+                self._renewed(request_headers, url, response.url):
+            # The token expired on the server, send it again once
+            request_headers = self.build_headers(headers, auth)
+            response = self._with_retries(
+                method, timeout, expires,
+                lambda attempt_timeout: self._request(
+                    method, url, data, request_headers, attempt_timeout))
+
+        if response.status >= 400:
+            raise urllib.error.HTTPError(
+                response.url, response.status, response.reason,
+                response.headers, io.BytesIO(response.body))
+        return response
+
+    def _with_retries(self, method, timeout, expires, send):
+        """Call ``send(timeout)`` until it gives a final response.
+
+        Connection errors, timeouts and ``RETRY_STATUSES`` of idempotent
+        requests are retried with full jitter backoff, as long as the wait
+        ends before ``expires``.
+
+        Returns:
+            The last response of ``send``. The last error is raised instead
+            when there is no response to return.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        attempt = 0
+        while True:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                self.deadlines_exceeded += 1
+                raise urllib.error.URLError(
+                    socket.timeout("Request deadline exceeded"))
+            error = response = None
+            try:
+                response = send(min(timeout, remaining)
+                                if timeout is not None else remaining)
+            except CircuitOpenError:
+                raise
+            except urllib.error.URLError as e:
+                if time.monotonic() >= expires:
+                    # The socket timeout was cut to the deadline
+                    self.deadlines_exceeded += 1
+                    raise urllib.error.URLError(
+                        socket.timeout("Request deadline exceeded")) from e
+                error = e
+
+            if (method not in IDEMPOTENT_METHODS
+                    or attempt >= self.max_retries
+                    or (error is None
+                        and response.status not in RETRY_STATUSES)):
+                if error is not None:
+                    raise error
+                return response
+
+            delay = random.uniform(
+                0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            if response is not None:
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            if time.monotonic() + delay >= expires:
+                # No time left to wait, report this attempt
+                if error is not None:
+                    raise error
+                return response
+            if isinstance(response, StreamingResponse):
+                response.read()
+                response.close()
+            self.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    def _renewed(self, request_headers, url, final_url):
+        """Renew the session a request was refused with; True on success."""
+        sent = request_headers.get("Authorization")
+        # A host the request was redirected to never received the token
+        if (urllib.parse.urlsplit(final_url).netloc
+                != urllib.parse.urlsplit(url).netloc):
+            return False
+        if not sent or not self.session_renewer(sent):
+            return False
+        self.auth_retries += 1
+        return True
+
+    def _request(self, method, url, data, headers, timeout):
+        """Send a request following redirects; return the last
+        ``Response``."""
+        request_headers = dict(headers)
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(method, url, data, request_headers,
+                                  timeout)
+            if response.status not in REDIRECT_CODES:
+                break
+
+            location = response.headers.get("Location")
+            if not location:
+                break
+            new_url = urllib.parse.urljoin(url, location)
+            # Never forward credentials to another host
+            if (urllib.parse.urlsplit(new_url).netloc
+                    != urllib.parse.urlsplit(url).netloc):
+                request_headers.pop("Authorization", None)
+            if response.status == 303 or (
+                    response.status in (301, 302) and method == "POST"):
+                method, data = "GET", None
+                request_headers.pop("Content-Type", None)
+            url = new_url
+        return response
+
+    def get(self, url, headers=None, auth=True, timeout=None,
+            deadline=None):
+        """Send a ``GET`` request."""
+        return self.request("GET", url, headers=headers, auth=auth,
+                            timeout=timeout, deadline=deadline)
+
+    def post(self, url, data=None, headers=None, auth=True, timeout=None,
+             deadline=None):
+        """Send a ``POST`` request."""
+        return self.request("POST", url, data=data, headers=headers,
+                            auth=auth, timeout=timeout, deadline=deadline)
+
+    def get_json(self, url, headers=None, auth=True, timeout=None,
+                 deadline=None):
+        """Send a ``GET`` request and return the parsed JSON body."""
+        return self.get(url, headers=headers, auth=auth, timeout=timeout,
+                        deadline=deadline).json()
+
+    def post_json(self, url, payload, headers=None, auth=True, timeout=None,
+                  deadline=None):
+        """Send ``payload`` as a JSON ``POST`` and return the response."""
+        request_headers = {"Content-Type": "application/json"}
+        if headers:
+            request_headers.update(headers)
+        return self.post(url, json.dumps(payload).encode("utf-8"),
+                         headers=request_headers, auth=auth,
+                         timeout=timeout, deadline=deadline)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.pool.close()
+
+    def stats(self):
+        """Return the retry, deadline and circuit breaker counters."""
+        return {
+            "retries": self.retries,
+            "auth_retries": self.auth_retries,
+            "deadlines_exceeded": self.deadlines_exceeded,
+            "breaker": self.breaker.stats(),
+            "pool": self.pool.stats(),
+        }
+
+    def open(self, method, url, data=None, headers=None, auth=True,
+             timeout=None, deadline=None):
+        """Send a request and return a response to read incrementally.
+
+        Redirects are followed and 4xx/5xx responses raise
+        ``urllib.error.HTTPError``. The body is not decoded, so
+        ``Accept-Encoding`` defaults to ``identity``. Use the result as a
+        context manager so the connection goes back to the pool.
+
+        ``deadline`` only covers getting the response; reading the body is
+        bounded by ``timeout`` per read.
+
+        Returns:
+            StreamingResponse: The response, with the body still unread.
+        """
+        expires = time.monotonic() + (
+            self.deadline if deadline is None else deadline)
+        request_headers = {"Accept-Encoding": "identity"}
+        if headers:
+            request_headers.update(headers)
+        extra_headers = request_headers
+        request_headers = self.build_headers(extra_headers, auth)
+        response = self._with_retries(
+            method, timeout, expires,
+            lambda attempt_timeout: self._open_following(
+                method, url, data, request_headers, attempt_timeout))
+        if response.status == 401 and auth and \
+                self._renewed(request_headers, url, response.url):
+            response.read()
+            response.close()
+            request_headers = self.build_headers(extra_headers, auth)
+            response = self._with_retries(
+                method, timeout, expires,
+                lambda attempt_timeout: self._open_following(
+                    method, url, data, request_headers, attempt_timeout))
+
+        if response.status >= 400:
+            body = response.read()
+            response.close()
+            raise urllib.error.HTTPError(
+                response.url, response.status, response.reason,
+                response.headers, io.BytesIO(body))
+        return response
+
+    def _open_following(self, method, url, data, headers, timeout):
+        """Open a request following redirects; return the last response."""
+        request_headers = dict(headers)
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._open(method, url, data, request_headers,
+                                  timeout)
+            location = response.headers.get("Location")
+            if response.status not in REDIRECT_CODES or not location:
+                break
+            response.read()
+            response.close()
+            new_url = urllib.parse.urljoin(url, location)
+            if (urllib.parse.urlsplit(new_url).netloc
+                    != urllib.parse.urlsplit(url).netloc):
+                request_headers.pop("Authorization", None)
+            url = new_url
+        return response
+
+    def _open(self, method, url, data, headers, timeout):
+        """Send a single request and return it before reading the body."""
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        tracer = get_tracer()
+        started = time.perf_counter()
+        breaker = self.breaker
+        breaker.allow(parts.hostname)
+
+        while True:
+            conn, reused = self.pool.acquire(
+                scheme, parts.hostname, port, timeout)
+            try:
+                if tracer.enabled and conn.sock is None:
+                    # Connect here to time it apart from the first byte
+                    connect_start = time.perf_counter()
+                    conn.connect()
+                    tracer.record("http.connect", connect_start,
+                                  time.perf_counter(), "http",
+                                  host=parts.hostname, scheme=scheme)
+                sent = time.perf_counter()
+                conn.request(method, path, body=data, headers=headers)
+                raw = conn.getresponse()
+            except STALE_ERRORS as e:
+                conn.close()
+                if reused:
+                    # The server dropped an idle connection, use a new one
+                    continue
+                breaker.record_failure(parts.hostname)
+                raise urllib.error.URLError(e) from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                breaker.record_failure(parts.hostname)
+                raise urllib.error.URLError(e) from e
+            break
+
+        if raw.status >= 500:
+            breaker.record_failure(parts.hostname)
+        else:
+            breaker.record_success(parts.hostname)
+
+        trace = None
+        if tracer.enabled:
+            received = time.perf_counter()
+            trace = {"method": method, "host": parts.hostname,
+                     "path": parts.path, "reused": reused,
+                     "started": started, "received": received}
+            tracer.record("http.ttfb", sent, received, "http",
+                          method=method, path=parts.path, status=raw.status)
+        return StreamingResponse(self.pool, (scheme, parts.hostname, port),
+                                 conn, raw, url, trace)
+
+    def _send(self, method, url, data, headers, timeout):
+        """Send a single request and read the whole response."""
+        with self._open(method, url, data, headers, timeout) as response:
+            try:
+                body = response.read()
+            except urllib.error.URLError:
+                # Stalled or dropped while sending the body
+                self.breaker.record_failure(
+                    urllib.parse.urlsplit(url).hostname)
+                raise
+        body = decode_body(body, response.headers.get("Content-Encoding"))
+        return Response(url, response.status, response.reason,
+                        response.headers, body)
+
+
+class StreamingResponse(object):
+    """An HTTP response whose body is read incrementally.
+
+    Closing it gives the connection back to the pool when the body was
+    read to the end, and closes the connection otherwise. With tracing on,
+    closing also records the body read and the whole request as spans.
+    """
+
+    def __init__(self, pool, key, conn, raw, url, trace=None):
+        self.url = url
+        self.status = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+        self.bytes_read = 0
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._raw = raw
+        self._trace = trace
+
+    def getcode(self):
+        return self.status
+
+    def read(self, amt=None):
+        """Read up to ``amt`` bytes, or everything if ``amt`` is None."""
+        try:
+            data = self._raw.read(amt)
+            self.bytes_read += len(data)
+            return data
+        except (OSError, http.client.HTTPException) as e:
+            self._conn.close()
+            raise urllib.error.URLError(e) from e
+
+    def iter_content(self, chunk_size=64 * 1024):
+        """Yield the body in chunks of at most ``chunk_size`` bytes."""
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._raw.isclosed() and not self._raw.will_close:
+            self._pool.release(*self._key, self._conn)
+        else:
+            self._conn.close()
+        self._conn = None
+        if self._trace is not None:
+            self._record_trace()
+
+    def _record_trace(self):
+        trace = self._trace
+        tracer = get_tracer()
+        end = time.perf_counter()
+        tracer.record("http.body", trace["received"], end, "http",
+                      path=trace["path"], bytes=self.bytes_read)
+        tracer.record("http.request", trace["started"], end, "http",
+                      method=trace["method"], host=trace["host"],
+                      path=trace["path"], status=self.status,
+                      bytes=self.bytes_read, reused=trace["reused"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Call(object):
+    """A call in flight in ``SingleFlight``."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Run one call per key at a time and share its result.
+
+    Callers asking for a key that is already running wait for that call and
+    get its result, or its exception, instead of running their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return ``fn(*args, **kwargs)``, coalesced by ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Return the counters as a dictionary."""
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "shared": self.shared,
+                "in_flight": len(self._calls),
+            }
+
+
+def decode_body(body, encoding):
+    """Decode a gzip or deflate encoded response body.
+
+    Args:
+        body (bytes): Raw response body.
+        encoding (str): Value of the ``Content-Encoding`` header.
+
+    Returns:
+        bytes: The decoded body.
+    """
+    encoding = (encoding or "").strip().lower()
+    if not body or encoding in ("", "identity"):
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Some servers send raw deflate without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+# Shared client for the whole plugin
+http_client = HTTPClient()
+# Coalesces identical cached GET requests
+single_flight = SingleFlight()
+
+
+def get(url, headers=None, auth=True, timeout=None, deadline=None):
+    """Send an authenticated ``GET`` request with the shared client."""
+    return http_client.get(url, headers=headers, auth=auth, timeout=timeout,
+                           deadline=deadline)
+
+
+def post(url, data=None, headers=None, auth=True, timeout=None,
+         deadline=None):
+    """Send an authenticated ``POST`` request with the shared client."""
+    return http_client.post(url, data=data, headers=headers, auth=auth,
+                            timeout=timeout, deadline=deadline)
+
+
+def open_url(url, headers=None, auth=True, timeout=None, deadline=None):
+    """Open a ``GET`` request with the shared client for streaming."""
+    return http_client.open("GET", url, headers=headers, auth=auth,
+                            timeout=timeout, deadline=deadline)
+
+
+def get_json(url, headers=None, auth=True, timeout=None, deadline=None):
+    """Send a ``GET`` with the shared client and return parsed JSON."""
+    return http_client.get_json(url, headers=headers, auth=auth,
+                                timeout=timeout, deadline=deadline)
+
+
+def get_http_stats():
+    """Return the retry and circuit breaker counters of the shared client."""
+    return http_client.stats()
+
+
+def get_cached(url, timeout=None, cache=None):
+    """Send a ``GET`` through the on-disk response cache.
+
+    A fresh entry is returned without touching the network. A stale entry
+    is revalidated with ``If-None-Match``/``If-Modified-Since`` so an
+    unchanged resource only costs a ``304``.
+
+    Args:
+        url (str): Absolute URL.
+        timeout (float): Socket timeout in seconds.
+        cache (ResponseCache): Cache to use, defaults to the shared one.
+
+    Returns:
+        Response: The cached or downloaded response.
+    """
+    from api.response_cache import cache_key, get_response_cache
+    cache = cache or get_response_cache()
+    key = cache_key(url, _session_user())
+    return single_flight.do(key, _get_cached, url, key, timeout, cache)
+
+
+def _get_cached(url, key, timeout, cache):
+    entry = cache.lookup(key)
+    if entry is not None and entry.is_fresh(cache.ttl):
+        cache.record_hit(entry)
+        return Response(url, 200, "OK", entry.headers, entry.body,
+                        from_cache=True)
+
+    headers = entry.conditional_headers() if entry is not None else None
+    response = http_client.get(url, headers=headers, timeout=timeout)
+    if response.status == 304 and entry is not None:
+        cache.refresh(key, response.headers)
+        cache.record_revalidated(entry)
+        return Response(url, 200, "OK", entry.headers, entry.body,
+                        from_cache=True)
+
+    cache.record_miss(len(response.body))
+    cache_control = (response.headers.get("Cache-Control") or "").lower()
+    if response.status == 200 and "no-store" not in cache_control:
+        cache.store(key, url, response.headers, response.body)
+    return response
+
+
+def get_cached_json(url, timeout=None, cache=None):
+    """Return the parsed JSON of ``url`` using the response cache.
+
+    Catalog responses are also indexed in the local catalog for search when
+    their body changed; a cached body was indexed when it was downloaded.
+    """
+    response = get_cached(url, timeout=timeout, cache=cache)
+    data = response.json()
+    if not response.from_cache:
+        _index_catalog(url, data)
+    return data
+
+
+def _index_catalog(url, data):
+    """Feed a response to the local catalog; never fails the request."""
+    from api.catalog import get_catalog
+    try:
+        get_catalog().index_response(url, data, _session_user())
+    except Exception as e:
+        print(f"[WARNING] Could not index {url} in the catalog: {e}")
+
+
+_scene_executor = None
+_scene_executor_lock = threading.Lock()
+
+
+def _scene_pool():
+    """Return the thread pool used by ``fetch_scenes``."""
+    global _scene_executor
+    with _scene_executor_lock:
+        if _scene_executor is None:
+            _scene_executor = ThreadPoolExecutor(
+                max_workers=SCENE_FETCH_WORKERS,
+                thread_name_prefix="actionvfx-scenes")
+        return _scene_executor
+
+
+def fetch_scene(scene_id, timeout=None):
+    """Return the details of a scene, through the response cache.
+
+    Args:
+        scene_id (int): The ID of the scene.
+        timeout (float): Socket timeout in seconds.
+
+    Returns:
+        dict: The scene data.
+    """
+    return get_cached_json(api_url(f"scenes/{scene_id}/"), timeout=timeout)
+
+
+def fetch_scenes(ids, timeout=None):
+    """Fetch the details of several scenes concurrently.
+
+    Requests run on a bounded pool and duplicate IDs, or IDs another caller
+    is already loading, only cost one request.
+
+    Args:
+        ids (list): The scene IDs.
+        timeout (float): Socket timeout in seconds.
+
+    Returns:
+        dict: Scene data by ID for the scenes that loaded. Failed scenes
+            are logged and left out.
+    """
+    pool = _scene_pool()
+    futures = {scene_id: pool.submit(fetch_scene, scene_id, timeout)
+               for scene_id in dict.fromkeys(ids)}
+    scenes = {}
+    for scene_id, future in futures.items():
+        try:
+            scenes[scene_id] = future.result()
+        except Exception as e:
+            print(f"[ERROR] fetch scene {scene_id}: {e}")
+    return scenes
+
+
+def prefetch_scenes(ids):
+    """Warm the response cache with scene details in the background.
+
+    Meant for grids to call with their visible items, so opening one is
+    served from the cache.
+    """
+    pool = _scene_pool()
+    for scene_id in dict.fromkeys(ids):
+        future = pool.submit(fetch_scene, scene_id)
+        future.add_done_callback(_log_prefetch_error)
+
+
+def _log_prefetch_error(future):
+    if future.exception() is not None:
+        print(f"[WARNING] prefetch scene: {future.exception()}")
@@ -0,0 +1,298 @@
+"""Streaming extraction of ActionVFX variant archives.
+
+This module contains the extractors used to unpack a variant while it is
+still downloading. They read from any file-like object, in order and only
+once: zip entries are decoded from their local headers and tar archives go
+through ``tarfile``'s stream mode, so nothing waits for the end of the file.
+
+Zip entries the stream cannot decode (encrypted entries, unusual compression
+methods or stored entries of unknown length) raise ``StreamingUnsupported``
+and the archive is extracted with ``extract_archive`` once it is complete.
+"""
+# Standard modules import
+import os
+import zlib
+import shutil
+import struct
+import tarfile
+import zipfile
+
+
+# Constants
+READ_SIZE = 256 * 1024
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2",
+                  ".tar.xz", ".txz")
+
+# Zip format
+LOCAL_HEADER = struct.Struct("<HHHHHIIIHH")
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+CENTRAL_HEADER_SIGNATURE = 0x02014b50
+END_SIGNATURE = 0x06054b50
+DESCRIPTOR_SIGNATURE = 0x08074b50
+ZIP64_EXTRA_ID = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+FLAG_ENCRYPTED = 0x1
+FLAG_DESCRIPTOR = 0x8
+FLAG_UTF8 = 0x800
+STORED = 0
+DEFLATED = 8
+
+
+class StreamingUnsupported(Exception):
+    """Raised when an archive can only be extracted once it is complete."""
+
+
+def archive_type(filename):
+    """Return ``"zip"``, ``"tar"`` or None for a file name."""
+    name = filename.lower()
+    if name.endswith(ZIP_EXTENSIONS):
+        return "zip"
+    if name.endswith(TAR_EXTENSIONS):
+        return "tar"
+    return None
+
+
+def archive_stem(filename):
+    """Return the file name without its archive extension."""
+    name = os.path.basename(filename)
+    for extension in TAR_EXTENSIONS + ZIP_EXTENSIONS:
+        if name.lower().endswith(extension):
+            return name[:-len(extension)]
+    return os.path.splitext(name)[0]
+
+
+def safe_path(directory, name):
+    """Return where an archive member is extracted.
+
+    Returns:
+        str: The path inside ``directory``, or None if the member name is
+            absolute or climbs out of it.
+    """
+    name = name.replace("\\", "/")
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if not parts or ".." in parts or name.startswith("/") \
+            or ":" in parts[0]:
+        return None
+    return os.path.join(directory, *parts)
+
+
+class StreamingZipExtractor(object):
+    """Extract a zip archive from a stream, entry by entry.
+
+    Args:
+        fileobj: Object with a ``read(size)`` method returning the archive
+            bytes in order.
+        directory (str): Folder the entries are extracted into.
+    """
+
+    def __init__(self, fileobj, directory):
+        self.fileobj = fileobj
+        self.directory = directory
+        self.extracted = []
+        self._buffer = b""
+
+    def extract(self):
+        """Extract every entry up to the central directory.
+
+        Returns:
+            list: The extracted file paths.
+        """
+        while True:
+            signature, = struct.unpack("<I", self._read_exact(4))
+            if signature in (CENTRAL_HEADER_SIGNATURE, END_SIGNATURE):
+                return self.extracted
+            if signature != LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(
+                    f"Bad zip entry signature {signature:#x}")
+            self._extract_entry()
+
+    def _extract_entry(self):
+        (_, flags, method, _, _, crc, compressed_size, file_size,
+         name_length, extra_length) = LOCAL_HEADER.unpack(
+            self._read_exact(LOCAL_HEADER.size))
+        raw_name = self._read_exact(name_length)
+        name = raw_name.decode("utf-8" if flags & FLAG_UTF8 else "cp437")
+        extra = self._read_exact(extra_length)
+
+        zip64, compressed_size, file_size = self._zip64_sizes(
+            extra, compressed_size, file_size)
+        has_descriptor = bool(flags & FLAG_DESCRIPTOR)
+        if flags & FLAG_ENCRYPTED:
+            raise StreamingUnsupported(f"{name} is encrypted")
+        if method not in (STORED, DEFLATED):
+            raise StreamingUnsupported(
+                f"{name} uses compression method {method}")
+        if method == STORED and has_descriptor and not compressed_size \
+                and not name.endswith("/"):
+            raise StreamingUnsupported(f"{name} has no size in its header")
+
+        target = safe_path(self.directory, name)
+        if target is None:
+            print(f"[WARNING] Skipping unsafe archive member {name}")
+        if name.endswith("/") or target is None:
+            if target is not None:
+                os.makedirs(target, exist_ok=True)
+            self._skip(method, compressed_size)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as file:
+                actual_crc = self._copy(method, compressed_size, file)
+            self.extracted.append(target)
+
+        if has_descriptor:
+            crc = self._read_descriptor(zip64)
+        if target is not None and not name.endswith("/") and \
+                actual_crc != crc:
+            raise zipfile.BadZipFile(f"Bad CRC for {name}")
+
+    def _zip64_sizes(self, extra, compressed_size, file_size):
+        """Read the 64 bit sizes of the zip64 extra field, if any."""
+        zip64 = False
+        offset = 0
+        while offset + 4 <= len(extra):
+            header_id, length = struct.unpack_from("<HH", extra, offset)
+            data = extra[offset + 4:offset + 4 + length]
+            offset += 4 + length
+            if header_id != ZIP64_EXTRA_ID:
+                continue
+            zip64 = True
+            position = 0
+            if file_size == ZIP64_LIMIT and len(data) >= position + 8:
+                file_size, = struct.unpack_from("<Q", data, position)
+                position += 8
+            if compressed_size == ZIP64_LIMIT and len(data) >= position + 8:
+                compressed_size, = struct.unpack_from("<Q", data, position)
+        return zip64, compressed_size, file_size
+
+    def _read_descriptor(self, zip64):
+        """Read the data descriptor after an entry and return its CRC."""
+        value, = struct.unpack("<I", self._read_exact(4))
+        if value == DESCRIPTOR_SIGNATURE:
+            value, = struct.unpack("<I", self._read_exact(4))
+        self._read_exact(16 if zip64 else 8)
+        return value
+
+    def _copy(self, method, compressed_size, file):
+        """Write an entry's data to ``file`` and return its CRC."""
+        crc = 0
+        if method == STORED:
+            for chunk in self._iter_bytes(compressed_size):
+                file.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+            return crc
+
+        # Deflate streams end by themselves, the compressed size is not
+        # needed, which also covers entries with a data descriptor
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        while not decompressor.eof:
+            data = self._read_some()
+            while data and not decompressor.eof:
+                chunk = decompressor.decompress(data, READ_SIZE)
+                file.write(chunk)
+                crc = zlib.crc32(chunk, crc)
+                data = decompressor.unconsumed_tail
+        self._buffer = decompressor.unused_data + self._buffer
+        return crc
+
+    def _skip(self, method, compressed_size):
+        if method == STORED:
+            for _ in self._iter_bytes(compressed_size):
+                pass
+        else:
+            self._copy(method, compressed_size, _NullFile())
+
+    # ---------- Reading ----------
+
+    def _read_some(self):
+        """Return the buffered bytes, or the next chunk of the stream."""
+        if self._buffer:
+            data, self._buffer = self._buffer, b""
+            return data
+        data = self.fileobj.read(READ_SIZE)
+        if not data:
+            raise zipfile.BadZipFile("Unexpected end of archive")
+        return data
+
+    def _read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            data += self._read_some()
+        data, self._buffer = data[:size], data[size:] + self._buffer
+        return data
+
+    def _iter_bytes(self, size):
+        while size > 0:
+            data = self._read_some()
+            if len(data) > size:
+                data, self._buffer = data[:size], data[size:]
+            size -= len(data)
+            yield data
+
+
+class _NullFile(object):
+    def write(self, data):
+        pass
+
+
+def extract_tar_stream(fileobj, directory):
+    """Extract a tar archive, compressed or not, from a stream.
+
+    Returns:
+        list: The extracted file paths.
+    """
+    extracted = []
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            target = safe_path(directory, member.name)
+            if target is None or not (member.isfile() or member.isdir()):
+                print(f"[WARNING] Skipping archive member {member.name}")
+                continue
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.extractfile(member) as source, \
+                    open(target, "wb") as file:
+                shutil.copyfileobj(source, file, READ_SIZE)
+            extracted.append(target)
+    return extracted
+
+
+def extract_stream(fileobj, directory, kind):
+    """Extract an archive of type ``kind`` while reading it from a stream.
+
+    Args:
+        fileobj: Object with a ``read(size)`` method.
+        directory (str): Folder the entries are extracted into.
+        kind (str): ``"zip"`` or ``"tar"``, see ``archive_type``.
+
+    Returns:
+        list: The extracted file paths.
+
+    Raises:
+        StreamingUnsupported: If the archive has to be complete to be
+            extracted; use ``extract_archive`` then.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if kind == "zip":
+        return StreamingZipExtractor(fileobj, directory).extract()
+    if kind == "tar":
+        return extract_tar_stream(fileobj, directory)
+    raise StreamingUnsupported(f"Unknown archive type {kind}")
+
+
+def extract_archive(path, directory):
+    """Extract a complete archive file.
+
+    Returns:
+        list: The extracted file paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if archive_type(path) == "zip":
+        with zipfile.ZipFile(path) as archive:
+            # ZipFile.extract() already strips unsafe path components
+            return [archive.extract(info, directory)
+                    for info in archive.infolist()]
+    with open(path, "rb") as file:
+        return extract_tar_stream(file, directory)
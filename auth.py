@@ -2,21 +2,39 @@
 
 This module contains the necessary functions and classes for sending
 credentials to the ActionVFX API.
+
+The expiry of the session token is read locally from its JWT ``exp`` claim.
+A token about to expire is renewed in the background by ``TokenRefresher``,
+an expired one is renewed before a request is sent with it, and a request
+the server still refuses with ``401`` is retried once after
+``renew_session``. Renewing first exchanges the token at ``REFRESH_URL``,
+then signs in again with the credentials typed earlier in this Nuke
+session; they are kept in memory only, never written to disk.
 """
 # Standard modules import
 import os
 import json
+import time
+import threading
 
 # Third-party modules import
-import urllib.request
 import urllib.error
 import base64
-from cryptography.fernet import Fernet
+
+# Local modules
+from api.api_request import http_client
+from api.tracing import traced, span
 
 
 # Constants
 API_URL = "sign in url"
 USER_INFO_URL = "user_url"
+REFRESH_URL = "refresh url"
+
+# Token lifetime, in seconds
+REFRESH_MARGIN = 300.0
+EXPIRY_SKEW = 30.0
+RENEW_RETRY_INTERVAL = 60.0
 
 # Constants for generating the key and saving the session
 
@@ -26,6 +44,8 @@ KEY_FILE = os.path.join(os.path.expanduser("~"), ".actionvfx_key.key")
 
 def load_or_generate_key():
     """Load or generate a key for encryption."""
+    from cryptography.fernet import Fernet
+
     if os.path.exists(KEY_FILE):
         # Load the token from the file
         with open(KEY_FILE, "rb") as key_file:
@@ -38,23 +58,201 @@ def load_or_generate_key():
         return key
 
 
-# Load the key
-SECRET_KEY = load_or_generate_key()
-fernet = Fernet(SECRET_KEY)
+# The key file is read, and cryptography imported, on the first encrypt or
+# decrypt instead of when Nuke imports the plugin
+_fernet = None
+_fernet_lock = threading.Lock()
+
+
+def get_fernet():
+    """Return the Fernet of the key file, loading the key on first use."""
+    global _fernet
+    with _fernet_lock:
+        if _fernet is None:
+            from cryptography.fernet import Fernet
+            _fernet = Fernet(load_or_generate_key())
+        return _fernet
+
+
+class SessionExpiredError(ValueError):
+    """The session token expired and could not be renewed."""
+
+
+def token_expiry(token):
+    """Return the ``exp`` claim of a JWT as a Unix time, or None.
+
+    The signature is not checked: the expiry only decides when to renew,
+    the server still validates every request.
+    """
+    if not token:
+        return None
+    if token.startswith("Bearer "):
+        token = token[len("Bearer "):]
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    payload = parts[1] + "=" * (-len(parts[1]) % 4)
+    try:
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (ValueError, KeyError, TypeError):
+        return None
 
 
 def encrypt_data(data):
     """Ecrypt data given."""
-    encrypted_data = fernet.encrypt(data.encode())
+    encrypted_data = get_fernet().encrypt(data.encode())
     return encrypted_data
 
 
 def decrypt_data(encrypted_data):
     """Decrypt data given."""
-    decrypted_data = fernet.decrypt(encrypted_data).decode()
+    decrypted_data = get_fernet().decrypt(encrypted_data).decode()
     return decrypted_data
 
 
+class SessionCache(object):
+    """Process-wide cache of the decrypted session file.
+
+    The session file is decrypted once and kept in memory together with a
+    ready to use ``Bearer`` header and the token expiry. The cache is
+    dropped when the file's
+    mtime or size changes on disk, or when ``invalidate`` is called by
+    ``save_session``/``delete_session``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+        self._auth_header = ""
+        self._expires_at = None
+        self._stamp = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _file_stamp(self):
+        """Return a (mtime, size) tuple for the session file or None."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        """Return the cached session, decrypting the file only if needed.
+
+        Returns:
+            dict: A copy of the session data, or None if there is no
+                valid session on disk.
+        """
+        stamp = self._file_stamp()
+        with self._lock:
+            if stamp is None:
+                if self._data is not None:
+                    self.invalidations += 1
+                self._data = None
+                self._auth_header = ""
+                self._stamp = None
+                self.misses += 1
+                return None
+
+            if self._data is not None and stamp == self._stamp:
+                self.hits += 1
+                return dict(self._data)
+
+            if self._data is not None:
+                # The file changed on disk since it was decrypted
+                self.invalidations += 1
+            self.misses += 1
+            try:
+                with open(self.path, "rb") as file:
+                    encrypted_data = file.read()
+                data = json.loads(decrypt_data(encrypted_data))
+            except Exception:
+                self._data = None
+                self._auth_header = ""
+                self._stamp = None
+                return None
+
+            self._data = data
+            self._auth_header = _bearer(data.get("Authorization", ""))
+            self._expires_at = token_expiry(data.get("Authorization"))
+            self._stamp = stamp
+            return dict(data)
+
+    def auth_header(self):
+        """Return the precomputed ``Bearer`` header, or an empty string."""
+        if self.get() is None:
+            return ""
+        with self._lock:
+            return self._auth_header
+
+    def expires_at(self):
+        """Return the token expiry as a Unix time, or None if there is no
+        session or the token has no ``exp`` claim."""
+        if self.get() is None:
+            return None
+        with self._lock:
+            return self._expires_at
+
+    def expires_within(self, seconds):
+        """Return True if the token expires in less than ``seconds``."""
+        expires_at = self.expires_at()
+        return expires_at is not None and expires_at - time.time() < seconds
+
+    def invalidate(self):
+        """Drop the cached session so the next call reads the file again."""
+        with self._lock:
+            if self._data is not None:
+                self.invalidations += 1
+            self._data = None
+            self._auth_header = ""
+            self._stamp = None
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "cached": self._data is not None,
+            }
+
+
+def _bearer(token):
+    """Return the token formatted as a ``Bearer`` header value."""
+    if not token:
+        return ""
+    return token if token.startswith("Bearer ") else f"Bearer {token}"
+
+
+# Process-wide session cache
+session_cache = SessionCache(SESSION_FILE)
+
+# Credentials of the last sign in, encrypted like the session file and kept
+# in memory to renew the session
+_credentials = None
+# Held for the whole renewal, network requests included
+_renew_lock = threading.Lock()
+# Guards the renewal failure and counters, never held during a request
+_renew_stats_lock = threading.Lock()
+# (header, time.monotonic()) of the last renewal that failed
+_renew_failure = None
+renew_stats = {"refreshed": 0, "signed_in": 0, "failed": 0}
+
+
+def _write_session(session_data):
+    """Encrypt ``session_data`` into the session file."""
+    encrypted_data = encrypt_data(json.dumps(session_data))
+    with open(SESSION_FILE, "wb") as file:
+        file.write(encrypted_data)
+    session_cache.invalidate()
+
+
 def save_session(user_data, token):
     """Save the user session data to an encrypted file."""
     session_data = {
@@ -66,35 +264,212 @@ def save_session(user_data, token):
 
     }
 
-    # Convert the session data to a JSON string
-    json_data = json.dumps(session_data)
-    encrypted_data = encrypt_data(json_data)
-
-    # Save the encrypted data to the file
-    with open(SESSION_FILE, "wb") as file:
-        file.write(encrypted_data)
+    _write_session(session_data)
 
 
+@traced("auth.load_session", "auth")
 def load_session():
-    """Load the user session data from an encrypted file."""
-    if os.path.exists(SESSION_FILE):
-        try:
-            with open(SESSION_FILE, "rb") as file:
-                encrypted_data = file.read()
+    """Load the user session data from an encrypted file.
+
+    The file is only decrypted the first time and whenever it changes on
+    disk, see ``SessionCache``.
+    """
+    return session_cache.get()
+
+
+def valid_session():
+    """Return the saved session if its token is usable, renewing a token
+    that expired, or None."""
+    session = load_session()
+    if session and session_cache.expires_within(EXPIRY_SKEW):
+        session = renew_session(session_cache.auth_header())
+    return session
+
+
+def get_auth_header():
+    """Return the ``Authorization`` header value for the saved session.
+
+    A token that already expired is renewed first instead of being sent
+    only to be refused.
+    """
+    header = session_cache.auth_header()
+    if header and session_cache.expires_within(EXPIRY_SKEW):
+        if renew_session(header) is not None:
+            header = session_cache.auth_header()
+    return header
 
-            decrypted_data = decrypt_data(encrypted_data)
-            return json.loads(decrypted_data)
-        except Exception as e:
-            return None
-    return None
+
+def get_session_cache_stats():
+    """Return hit/miss counters of the in-memory session cache and the
+    token renewal counters."""
+    with _renew_stats_lock:
+        return dict(session_cache.stats(), **renew_stats)
 
 
 def delete_session():
     """Delete the user session file."""
+    global _credentials
     if os.path.exists(SESSION_FILE):
         os.remove(SESSION_FILE)
+    _credentials = None
+    session_cache.invalidate()
+
+
+def _response_token(response):
+    """Return the token of a sign in or refresh response, or None."""
+    token = response.headers.get("Authorization")
+    if not token:
+        try:
+            token = (response.json() or {}).get("token")
+        except (ValueError, AttributeError):
+            token = None
+    return token
+
 
+def _refresh_token(session):
+    """Exchange the session token at ``REFRESH_URL``.
+
+    Returns:
+        dict: The saved session with the new token, or None.
+    """
+    token = session.get("Authorization")
+    if not token:
+        return None
+    try:
+        response = http_client.post(
+            REFRESH_URL, headers={"Authorization": _bearer(token)},
+            auth=False)
+        new_token = _response_token(response)
+    except Exception as e:
+        # A failed refresh falls back to signing in again
+        print(f"[WARNING] Could not refresh the session token: {e}")
+        return None
+    if not new_token:
+        return None
+    session = dict(session, Authorization=new_token)
+    _write_session(session)
+    return session
+
+
+def renew_session(stale_header=None):
+    """Renew the session token without showing the login dialog.
+
+    The token is refreshed at ``REFRESH_URL`` or, failing that, the user is
+    signed in again with the credentials of this Nuke session. Concurrent
+    callers share one renewal, and a token whose renewal failed is not
+    tried again for ``RENEW_RETRY_INTERVAL`` seconds.
 
+    Args:
+        stale_header (str): The ``Authorization`` header a request was sent
+            with. If the saved session already has another token, it is
+            returned as is.
+
+    Returns:
+        dict: The renewed session, or None if it could not be renewed.
+    """
+    global _renew_failure
+    with _renew_lock:
+        session = load_session()
+        current = session_cache.auth_header()
+        if session and stale_header and current != stale_header:
+            # Renewed by another request meanwhile
+            return session
+        with _renew_stats_lock:
+            failure = _renew_failure
+        if failure and failure[0] == current and \
+                time.monotonic() - failure[1] < RENEW_RETRY_INTERVAL:
+            return None
+
+        outcome = "failed"
+        with span("auth.renew_session", "auth") as renew_span:
+            renewed = _refresh_token(session) if session else None
+            if renewed is not None:
+                outcome = "refreshed"
+            elif _credentials is not None:
+                try:
+                    renewed = _sign_in(
+                        *json.loads(decrypt_data(_credentials)))
+                    outcome = "signed_in"
+                except ValueError as e:
+                    print(f"[WARNING] Could not sign in again: {e}")
+            renew_span.set(renewed=renewed is not None)
+
+        with _renew_stats_lock:
+            renew_stats[outcome] += 1
+            if renewed is None:
+                _renew_failure = (current, time.monotonic())
+        return renewed
+
+
+class TokenRefresher(object):
+    """Renew the session token in the background before it expires.
+
+    The thread sleeps until ``margin`` seconds before the token's ``exp``
+    and renews it then, so requests never wait for a renewal. Tokens without
+    an ``exp`` claim are left to the ``401`` retry of the HTTP client.
+
+    Args:
+        margin (float): Seconds before the expiry to renew the token.
+        poll_interval (float): Longest sleep, so a new session is noticed.
+    """
+
+    def __init__(self, margin=REFRESH_MARGIN, poll_interval=60.0):
+        self.margin = margin
+        self.poll_interval = poll_interval
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the refresh thread if it is not running.
+
+        A thread still stopping after ``stop`` is left to exit on its own
+        and a new one is started with its own stop event.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and \
+                    not self._stop_event.is_set():
+                return
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop_event,),
+                name="actionvfx-token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the refresh thread."""
+        with self._lock:
+            self._stop_event.set()
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            expires_at = session_cache.expires_at()
+            if expires_at is None:
+                stop_event.wait(self.poll_interval)
+                continue
+            delay = expires_at - self.margin - time.time()
+            if delay > 0:
+                stop_event.wait(min(delay, self.poll_interval))
+                continue
+            renew_session(session_cache.auth_header())
+            # A failed or short-lived renewal is not retried right away
+            stop_event.wait(RENEW_RETRY_INTERVAL)
+
+
+_token_refresher = None
+_token_refresher_lock = threading.Lock()
+
+
+def get_token_refresher():
+    """Return the process-wide token refresher."""
+    global _token_refresher
+    with _token_refresher_lock:
+        if _token_refresher is None:
+            _token_refresher = TokenRefresher()
+        return _token_refresher
+
+
+@traced("auth.authenticate", "auth")
 def authenticate(email=None, password=None):
     """
     Authenticate the user with the ActionVFX API and return session details.
@@ -108,59 +483,68 @@ def authenticate(email=None, password=None):
     """
     saved_session = load_session()
     if saved_session:
-        return saved_session
+        if not session_cache.expires_within(EXPIRY_SKEW):
+            return saved_session
+        # The saved token expired, renew it without asking again
+        renewed = renew_session(session_cache.auth_header())
+        if renewed:
+            return renewed
+        if not email or not password:
+            raise SessionExpiredError(
+                "The session expired, please sign in again.")
 
     if not email or not password:
         raise ValueError("Email and password are required.")
+    return _sign_in(email, password)
+
+
+def _sign_in(email, password):
+    """Send the credentials to the API and save the new session."""
+    global _credentials
 
     # Send the credentials to the API, email and password
     payload = json.dumps(
         {"email": email, "password": password}).encode("utf-8")
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "*/*"
-    }
-
-    # Create the request
-    req = urllib.request.Request(
-        API_URL, data=payload, headers=headers, method="POST")
+    headers = {"Content-Type": "application/json"}
 
     try:
-        with urllib.request.urlopen(req) as response:
-            # Primero intentamos obtener el token desde los headers
-            response_headers = response.info()
-            token = response_headers.get("Authorization")
-
-            # Si no está en los headers, lo buscamos en el JSON
-            response_data = json.loads(response.read().decode("utf-8"))
-            print(response_data)
-            if not token:
-                token = response_data.get("token")
-
-            if not token:
-                raise ValueError("No token found in response.")
-
-            # Obtener los datos del usuario
-            user_data = response_data.get("data", {})
-            if not user_data:
-                raise ValueError("No user data found in response.")
-
-            # Extraer tier si existe (ej: Premium, Free, etc.)
-            membership_info = user_data.get("membership", {})
-            membership_tier = membership_info.get("tier", "Unknown")
-
-            session_details = {
-                "username": user_data.get("username"),
-                "firstname": user_data.get("first_name"),
-                "lastname": user_data.get("last_name"),
-                "Authorization": token,
-                "Status": user_data.get("free_subscriber", True),
-            }
-
-            save_session(session_details, token)
-
-            return session_details
+        # The sign in request must not carry a previous session token
+        response = http_client.post(
+            API_URL, data=payload, headers=headers, auth=False)
+
+        # Primero intentamos obtener el token desde los headers
+        token = response.headers.get("Authorization")
+
+        # Si no está en los headers, lo buscamos en el JSON
+        # Never printed, it holds the session token
+        response_data = response.json()
+        if not token:
+            token = response_data.get("token")
+
+        if not token:
+            raise ValueError("No token found in response.")
+
+        # Obtener los datos del usuario
+        user_data = response_data.get("data", {})
+        if not user_data:
+            raise ValueError("No user data found in response.")
+
+        # Extraer tier si existe (ej: Premium, Free, etc.)
+        membership_info = user_data.get("membership", {})
+        membership_tier = membership_info.get("tier", "Unknown")
+
+        session_details = {
+            "username": user_data.get("username"),
+            "firstname": user_data.get("first_name"),
+            "lastname": user_data.get("last_name"),
+            "Authorization": token,
+            "Status": user_data.get("free_subscriber", True),
+        }
+
+        save_session(session_details, token)
+        _credentials = encrypt_data(json.dumps([email, password]))
+
+        return session_details
 
     except urllib.error.HTTPError as e:
         error_message = e.read().decode()
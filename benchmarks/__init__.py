@@ -0,0 +1 @@
+"""Benchmarks for the ActionVFX Nuke plugin."""
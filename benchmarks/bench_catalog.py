@@ -0,0 +1,138 @@
+"""Benchmark of the local catalog on a synthetic catalog.
+
+Indexes ``--scenes`` generated scenes (100k by default) into a temporary
+``api.catalog.Catalog`` and times typical dashboard searches and filters.
+
+Run from the plugin root so the ``api`` package is importable::
+
+    python -m benchmarks.bench_catalog
+"""
+# Standard modules
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+# Local modules
+from api.catalog import Catalog, SCENE
+
+
+WORDS = (
+    "explosion fire smoke dust debris spark muzzle flash blood water splash "
+    "rain snow fog cloud lightning energy magic portal shockwave crack "
+    "glass shatter wood metal concrete ground impact bullet hit tracer "
+    "fireball flamethrower ember ash steam vapor atmosphere ambient").split()
+TAGS = ("fire", "smoke", "explosions", "weather", "gore", "particles",
+        "destruction", "water", "muzzle flashes", "atmospherics")
+RESOLUTIONS = ("2K", "4K", "6K", "8K")
+# Descriptions draw from a larger vocabulary with Zipf-like frequencies,
+# like real text, instead of repeating the few words above
+DESCRIPTION_WORDS = 5000
+
+
+def synthetic_scenes(count, seed=0):
+    """Yield scene records shaped like ``/scenes/`` responses."""
+    rng = random.Random(seed)
+    vocabulary = list(WORDS) + [f"word{index}" for index in
+                                range(DESCRIPTION_WORDS - len(WORDS))]
+    weights = [1.0 / rank for rank in range(1, len(vocabulary) + 1)]
+    rng.shuffle(vocabulary)
+    for scene_id in range(1, count + 1):
+        name = " ".join(rng.sample(WORDS, 3)).title() + f" {scene_id}"
+        description = " ".join(rng.choices(vocabulary, weights, k=24))
+        variants = [
+            {"id": scene_id * 10 + index, "resolution": resolution,
+             "size": rng.randint(50, 4000) * 1024 * 1024}
+            for index, resolution in enumerate(
+                rng.sample(RESOLUTIONS, rng.randint(1, 4)))]
+        yield {
+            "id": scene_id,
+            "name": name,
+            "slug": name.lower().replace(" ", "-"),
+            "description": description,
+            "tags": [{"name": tag} for tag in rng.sample(TAGS, 3)],
+            "free_for_subscriber": rng.random() < 0.2,
+            "poster": f"https://cdn.example.com/{scene_id}.jpg",
+            "clips": [{"collection_variants": variants}],
+        }
+
+
+def timed(fn, repeat):
+    """Return the median wall time of ``fn`` in ms, and its last result."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(1000.0 * (time.perf_counter() - start))
+    return statistics.median(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenes", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = Catalog(os.path.join(directory, "catalog.sqlite3"))
+
+        start = time.perf_counter()
+        batch = []
+        for scene in synthetic_scenes(args.scenes):
+            batch.append(scene)
+            if len(batch) == args.batch:
+                catalog.index_items(SCENE, batch)
+                batch = []
+        catalog.index_items(SCENE, batch)
+        index_seconds = time.perf_counter() - start
+
+        owned = random.Random(1).sample(range(1, args.scenes + 1),
+                                        args.scenes // 20)
+        catalog.index_ownership([{"scene": scene_id}
+                                 for scene_id in owned], "bench")
+
+        queries = {
+            "browse_first_page": lambda: catalog.search(),
+            "text_one_word": lambda: catalog.search("explosion"),
+            "text_prefix": lambda: catalog.search("shatt"),
+            "text_two_words": lambda: catalog.search("muzzle flash"),
+            "text_rare": lambda: catalog.search("fireball portal ember"),
+            "filter_resolution": lambda: catalog.search(resolution="8K"),
+            "filter_size_range": lambda: catalog.search(
+                min_size=3000 * 1024 * 1024),
+            "text_and_resolution": lambda: catalog.search(
+                "smoke", resolution="4K", free=False),
+            "owned": lambda: catalog.search(owned_by="bench"),
+            "count_text": lambda: catalog.count("fire"),
+            "count_all_8k": lambda: catalog.count(resolution="8K"),
+        }
+        results = {
+            "scenes": args.scenes,
+            "full_text_search": catalog.stats()["full_text_search"],
+            "index_seconds": round(index_seconds, 2),
+            "index_scenes_per_second": round(args.scenes / index_seconds),
+            "database_mb": round(os.path.getsize(catalog.path) / 1024 ** 2,
+                                 1),
+            "queries_ms": {},
+        }
+        for name, query in queries.items():
+            milliseconds, result = timed(query, args.repeat)
+            results["queries_ms"][name] = {
+                "median": round(milliseconds, 2),
+                "results": result if isinstance(result, int) else len(result),
+            }
+        catalog.close()
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Benchmark of switching scenes in the clip list of the detail view.
+
+Compares the previous clip list (one ``QPushButton`` per clip in a scroll
+area, rebuilt on every scene and loading every thumbnail) with
+``ui.ui_clip_list.ClipListView``, for scenes of ``--clips`` clips. For each
+it reports the time to show a new scene and paint it, the widgets in the
+list afterwards and the thumbnail requests sent. Thumbnails come from a stub
+image cache so no network is used.
+
+Run from the plugin root so the ``api`` and ``ui`` packages are importable::
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_clip_list
+"""
+# Standard modules
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# Third-party modules
+from PySide2 import QtWidgets, QtGui, QtCore
+
+# Local modules
+from ui.ui_clip_list import ClipListView, ClipListModel, THUMBNAIL_SIZE
+
+
+VIEW_HEIGHT = 600
+
+
+class StubImageCache(object):
+    """Image cache answering every request with a blank thumbnail."""
+
+    def __init__(self):
+        self.requests = 0
+        self.image = QtGui.QImage(THUMBNAIL_SIZE, QtGui.QImage.Format_RGB32)
+        self.image.fill(0x404040)
+        self._loaded = set()
+
+    def cached(self, url, size):
+        return self.image if url in self._loaded else None
+
+    def request(self, url, size, on_result, on_error=None):
+        self.requests += 1
+        self._loaded.add(url)
+        on_result(self.image)
+
+
+def scene_clips(scene, count):
+    return [{"name": f"Clip {index + 1}", "video": None, "poster": None,
+             "thumbnail": f"https://cdn.example.com/{scene}/{index}.jpg",
+             "variants": []}
+            for index in range(count)]
+
+
+class LegacyClipList(QtWidgets.QScrollArea):
+    """The clip list the detail view used to build."""
+
+    def __init__(self, image_cache):
+        super(LegacyClipList, self).__init__()
+        self.image_cache = image_cache
+        self.setWidgetResizable(True)
+        self.container = QtWidgets.QWidget()
+        self.layout = QtWidgets.QVBoxLayout(self.container)
+        self.setWidget(self.container)
+
+    def set_clips(self, clips):
+        while self.layout.count():
+            child = self.layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+        for clip in clips:
+            button = QtWidgets.QPushButton(clip["name"])
+            button.setIconSize(THUMBNAIL_SIZE)
+            button.setMinimumHeight(THUMBNAIL_SIZE.height() + 20)
+            button.setStyleSheet(
+                "background-color: #2D2D2D; color: white; "
+                "text-align: bottom center; font-size: 10px;")
+            self.layout.addWidget(button)
+            self.image_cache.request(
+                clip["thumbnail"], THUMBNAIL_SIZE,
+                lambda image, button=button: button.setIcon(
+                    QtGui.QIcon(QtGui.QPixmap.fromImage(image))))
+        self.layout.addStretch()
+
+
+def model_clip_list(image_cache):
+    view = ClipListView()
+    view.setModel(ClipListModel(image_cache, parent=view))
+    return view
+
+
+def switch_scenes(app, view, image_cache, count, repeat):
+    """Return the median ms to show and paint a new scene, the widgets
+    inside the view and the thumbnail requests of the last scene."""
+    view.resize(THUMBNAIL_SIZE.width() + 40, VIEW_HEIGHT)
+    view.show()
+    times = []
+    requests = 0
+    for scene in range(repeat):
+        before = image_cache.requests
+        start = time.perf_counter()
+        view.set_clips(scene_clips(scene, count))
+        app.processEvents()
+        # Run the deleteLater() of the previous scene's widgets
+        QtCore.QCoreApplication.sendPostedEvents(
+            None, QtCore.QEvent.DeferredDelete)
+        view.viewport().grab()
+        times.append(1000.0 * (time.perf_counter() - start))
+        requests = image_cache.requests - before
+    widgets = len(view.findChildren(QtWidgets.QWidget))
+    view.close()
+    view.deleteLater()
+    app.processEvents()
+    return statistics.median(times), widgets, requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, nargs="+",
+                        default=[10, 100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    results = {}
+    for count in args.clips:
+        results[count] = {}
+        for label, factory in (("legacy_buttons", LegacyClipList),
+                               ("list_view", model_clip_list)):
+            image_cache = StubImageCache()
+            milliseconds, widgets, requests = switch_scenes(
+                app, factory(image_cache), image_cache, count, args.repeat)
+            results[count][label] = {
+                "switch_ms": round(milliseconds, 2),
+                "widgets": widgets,
+                "thumbnail_requests": requests,
+            }
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    del app
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
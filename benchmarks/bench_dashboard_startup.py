@@ -0,0 +1,151 @@
+"""Benchmark of the time to show the dashboard.
+
+Times ``DashboardWindow`` from construction to its first paint, as it starts
+now (only the default library grid is built, background services after the
+first paint), against the eager constructor of the baseline commit, loaded
+from git with ``git show <commit>:ui_main.py``. The baseline builds its views
+with the current widget classes, so the difference is the constructor.
+
+The time until the catalog sync and the token refresher start is reported
+separately; they are stopped after every run.
+
+Run from the plugin root with a Python that can import the plugin UI, such
+as Nuke's (``nuke -t``)::
+
+    python -m benchmarks.bench_dashboard_startup --baseline d80914b
+"""
+# Standard modules
+import os
+import sys
+import json
+import time
+import types
+import argparse
+import statistics
+import subprocess
+
+# Third-party modules
+from PySide2 import QtWidgets, QtCore
+
+# Local modules
+from ui import ui_main
+
+
+SESSION = {"username": "benchmark", "Status": True}
+BASELINE_COMMIT = "d80914b"
+TIMEOUT = 10.0
+
+
+class FirstPaint(QtCore.QObject):
+    """Record when the first paint event of any widget is delivered."""
+
+    def __init__(self):
+        super(FirstPaint, self).__init__()
+        self.painted_at = None
+
+    def eventFilter(self, watched, event):
+        if self.painted_at is None and event.type() == QtCore.QEvent.Paint:
+            self.painted_at = time.perf_counter()
+        return False
+
+
+def load_baseline(commit):
+    """Return ``ui_main`` as of ``commit``, or None if git cannot show it."""
+    root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    try:
+        source = subprocess.check_output(
+            ["git", "show", f"{commit}:ui_main.py"], cwd=root,
+            stderr=subprocess.DEVNULL, universal_newlines=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    module = types.ModuleType("ui.ui_main_baseline")
+    module.__file__ = ui_main.__file__
+    exec(compile(source, f"{commit}:ui_main.py", "exec"), module.__dict__)
+    return module
+
+
+def time_to_dashboard(app, window_class):
+    """Return the ms from construction to the first paint of the window and
+    to the start of its background services, None if it has none."""
+    services = []
+    start_services = getattr(window_class, "start_background_services", None)
+    if start_services is not None:
+        def record(window):
+            start_services(window)
+            services.append(time.perf_counter())
+        window_class.start_background_services = record
+
+    first_paint = FirstPaint()
+    app.installEventFilter(first_paint)
+    try:
+        start = time.perf_counter()
+        window = window_class(SESSION)
+        window.show()
+        deadline = start + TIMEOUT
+        while (first_paint.painted_at is None or
+               (start_services is not None and not services)) and \
+                time.perf_counter() < deadline:
+            app.processEvents()
+    finally:
+        app.removeEventFilter(first_paint)
+        if start_services is not None:
+            window_class.start_background_services = start_services
+
+    painted = 1000.0 * (first_paint.painted_at - start)
+    started = 1000.0 * (services[0] - start) if services else None
+    built = len(getattr(window, "views", {})) or None
+    window.close()
+    window.deleteLater()
+    ui_main.get_catalog_sync().stop()
+    ui_main.get_token_refresher().stop()
+    app.processEvents()
+    return painted, started, built
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--baseline", default=BASELINE_COMMIT,
+                        help="Commit of the eager dashboard constructor")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    windows = {"lazy": ui_main.DashboardWindow}
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"[WARNING] Could not load ui_main.py of {args.baseline}, "
+              "timing the current dashboard only", file=sys.stderr)
+    else:
+        windows = {"baseline": baseline.DashboardWindow, **windows}
+
+    # The first window pays for one-off style and font loading
+    time_to_dashboard(app, ui_main.DashboardWindow)
+
+    results = {}
+    for label, window_class in windows.items():
+        painted = []
+        started = []
+        built = None
+        for _ in range(args.repeat):
+            first_paint, services, built = time_to_dashboard(
+                app, window_class)
+            painted.append(first_paint)
+            if services is not None:
+                started.append(services)
+        results[label] = {
+            "first_paint_median_ms": round(statistics.median(painted), 2),
+            "first_paint_min_ms": round(min(painted), 2),
+            "services_started_median_ms":
+                round(statistics.median(started), 2) if started else None,
+            "views_built": built,
+        }
+    results["baseline_commit"] = args.baseline if baseline else None
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    del app
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Benchmark of the per-frame preview display path.
+
+Compares the previous path (full resolution BGR->RGB conversion, QImage,
+QPixmap and a smooth Qt scale on the GUI thread) with the display
+resolution path of ``ui.video_player.FrameScaler``.
+
+Run from the plugin root so the ``api`` and ``ui`` packages are importable::
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_frame_path
+"""
+# Standard modules
+import sys
+import json
+import time
+import argparse
+
+# Third-party modules
+import cv2
+import numpy as np
+from PySide2 import QtWidgets, QtGui, QtCore
+
+# Local modules
+from ui.video_player import FrameScaler
+
+
+def legacy_path(frame, label_size):
+    """The per-frame work ``play_video_frame`` used to do."""
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    h, w, ch = rgb.shape
+    qimage = QtGui.QImage(rgb.data, w, h, ch * w, QtGui.QImage.Format_RGB888)
+    pixmap = QtGui.QPixmap.fromImage(qimage)
+    return pixmap.scaled(label_size, QtCore.Qt.KeepAspectRatio,
+                         QtCore.Qt.SmoothTransformation)
+
+
+def display_path(scaler, frame, label_size, image_format):
+    """Resize on the decoder side, then wrap the buffer in a QImage."""
+    out = scaler.process(frame, (label_size.width(), label_size.height()))
+    return gui_path(out, image_format)
+
+
+def gui_path(out, image_format):
+    """The part of the display path left on the GUI thread."""
+    h, w, _ = out.shape
+    qimage = QtGui.QImage(out.data, w, h, out.strides[0], image_format)
+    return QtGui.QPixmap.fromImage(qimage)
+
+
+def measure(fn, frames, repeat):
+    """Return the average CPU time per frame in ms."""
+    start = time.process_time()
+    for _ in range(repeat):
+        for frame in frames:
+            fn(frame)
+    return 1000.0 * (time.process_time() - start) / (repeat * len(frames))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    label_size = QtCore.QSize(640, 360)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (args.height, args.width, 3), np.uint8)
+              for _ in range(args.frames)]
+
+    bgr_format = getattr(QtGui.QImage, "Format_BGR888", None)
+    scaler = FrameScaler(10, convert_rgb=bgr_format is None)
+    image_format = bgr_format or QtGui.QImage.Format_RGB888
+
+    results = {
+        "source": [args.width, args.height],
+        "display": [label_size.width(), label_size.height()],
+        "legacy_ms_per_frame": measure(
+            lambda frame: legacy_path(frame, label_size),
+            frames, args.repeat),
+        "display_ms_per_frame": measure(
+            lambda frame: display_path(scaler, frame, label_size,
+                                       image_format),
+            frames, args.repeat),
+    }
+
+    # Only the QImage wrap and QPixmap upload still run on the GUI thread
+    scaled = [scaler.process(frame, (label_size.width(),
+                                     label_size.height())).copy()
+              for frame in frames]
+    results["display_gui_ms_per_frame"] = measure(
+        lambda out: gui_path(out, image_format), scaled, args.repeat)
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    del app
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Import time check of the plugin.
+
+Imports ``--module`` (``ui.ui_main`` by default) in a fresh interpreter with
+``python -X importtime``, ``--repeat`` times, and reports the median time
+and the slowest imports. Fails when a plugin module imports one of the
+``DEFERRED`` packages at import time, which must only load on first use,
+or when ``--max-ms`` is given and the median import is slower.
+
+Run from the plugin root with a Python that can import the plugin UI, such
+as Nuke's (``nuke -t``)::
+
+    python -m benchmarks.bench_import_time --max-ms 400
+"""
+# Standard modules
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+
+# Packages only loaded once the feature using them runs
+DEFERRED = ("cv2", "numpy", "cryptography")
+PLUGIN_PACKAGES = ("api", "ui")
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def root_of(name):
+    return name.split(".")[0]
+
+
+def parse_importtime(output):
+    """Return the imports of ``-X importtime`` output.
+
+    Returns:
+        list: ``(name, self_us, cumulative_us, parent)`` tuples, where
+            ``parent`` is the importing module's name, or None at the top
+            level.
+    """
+    entries = []
+    # importtime prints an import once it finished, after its children
+    children = {}
+    for line in output.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        entry = [match.group(4), int(match.group(1)), int(match.group(2)),
+                 None]
+        for child in children.pop(depth + 1, []):
+            child[3] = entry[0]
+        children.setdefault(depth, []).append(entry)
+        entries.append(entry)
+    return [tuple(entry) for entry in entries]
+
+
+def deferred_violations(entries):
+    """Return ``"<package> imported by <module>"`` for each deferred
+    package a plugin module imports directly."""
+    violations = []
+    for name, _, _, parent in entries:
+        if root_of(name) not in DEFERRED or parent is None:
+            continue
+        if root_of(parent) == root_of(name):
+            continue
+        if root_of(parent) in PLUGIN_PACKAGES:
+            violations.append(f"{name} imported by {parent}")
+    return violations
+
+
+def import_once(module):
+    """Import ``module`` in a new interpreter and return its imports."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if process.returncode:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr}")
+    return parse_importtime(process.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="ui.ui_main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    runs = [import_once(args.module) for _ in range(args.repeat)]
+    totals = [next(entry[2] for entry in entries if entry[0] == args.module)
+              for entries in runs]
+    entries = runs[-1]
+
+    plugin = [entry for entry in entries
+              if root_of(entry[0]) in PLUGIN_PACKAGES]
+    slowest = sorted(entries, key=lambda entry: entry[1], reverse=True)
+    violations = deferred_violations(entries)
+    median_ms = statistics.median(totals) / 1000.0
+
+    results = {
+        "module": args.module,
+        "median_ms": round(median_ms, 1),
+        "min_ms": round(min(totals) / 1000.0, 1),
+        "plugin_self_ms": round(sum(entry[1] for entry in plugin) / 1000.0,
+                                1),
+        "deferred_loaded": sorted({root_of(entry[0]) for entry in entries
+                                   if root_of(entry[0]) in DEFERRED}),
+        "slowest_self_ms": {
+            name: round(self_us / 1000.0, 1)
+            for name, self_us, _, _ in slowest[:args.top]},
+        "violations": violations,
+    }
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+    if violations:
+        print(f"[ERROR] Deferred packages imported at import time: "
+              f"{', '.join(violations)}", file=sys.stderr)
+        return 1
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"[ERROR] import {args.module} took {median_ms:.1f} ms, "
+              f"budget {args.max_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
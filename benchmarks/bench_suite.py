@@ -0,0 +1,355 @@
+"""Benchmarks of the plugin's network and media paths.
+
+Starts ``benchmarks.fake_api.FakeAPIServer``, points the plugin at it and
+measures, through the plugin's own code:
+
+- ``authenticate``: sign in and save the encrypted session.
+- ``load_scene``: ``FreeFootageDetailWidget.load_scene`` until the clip
+  list is populated, for new scenes and for a scene already cached.
+- ``detail_views``: opening a scene, a 2D collection and an owned
+  collection in their detail views until each clip list is populated.
+- ``load_image``: ``load_image`` until the poster is shown, cold and from
+  the memory cache.
+- ``video``: ``start_video`` until the first frame, then the frame rate
+  ``play_video_frame`` shows against the clip's and the late frames it
+  dropped or the decoder skipped.
+- ``download``: variant download and extraction throughput.
+
+``--latency`` and ``--bandwidth`` shape every response of the server. The
+results are printed as JSON, with the settings and the git commit, and
+also written to ``--output`` to compare versions. ``--trace`` turns on
+``api.tracing``, adds its span summary to the results and writes the
+Chrome trace.
+
+The plugin keeps its session, key and caches in the home folder, so the
+suite sets ``HOME`` to a temporary folder before importing it and never
+touches the user's files. Run from the plugin root with a Python that has
+PySide2 and OpenCV::
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_suite \\
+        --latency 0.05 --bandwidth 20000000 --output results.json
+"""
+# Standard modules
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+import subprocess
+
+# Local modules
+from benchmarks.fake_api import FakeAPIServer, Fixtures
+
+
+TIMEOUT = 60.0
+EMAIL = "benchmark@example.com"
+PASSWORD = "benchmark"
+
+
+def git_commit():
+    """Return the commit of the plugin checkout, or None."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summary(times):
+    """Return the median, min and max of timings in ms."""
+    return {
+        "median_ms": round(statistics.median(times), 2),
+        "min_ms": round(min(times), 2),
+        "max_ms": round(max(times), 2),
+        "samples": len(times),
+    }
+
+
+def wait_for(app, condition, timeout=TIMEOUT):
+    """Process Qt events until ``condition()`` is true."""
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting for the plugin")
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def bench_authenticate(repeat):
+    from api import auth
+
+    times = []
+    for _ in range(repeat):
+        auth.delete_session()
+        start = time.perf_counter()
+        auth.authenticate(email=EMAIL, password=PASSWORD)
+        times.append(1000.0 * (time.perf_counter() - start))
+    return summary(times)
+
+
+def bench_load_scene(app, widget, repeat):
+    loaded = []
+    on_scene_loaded = widget.on_scene_loaded
+
+    def record(scene_data):
+        on_scene_loaded(scene_data)
+        loaded.append(time.perf_counter())
+    widget.on_scene_loaded = record
+
+    def load(scene_id):
+        count = len(loaded)
+        start = time.perf_counter()
+        widget.load_scene(scene_id)
+        wait_for(app, lambda: len(loaded) > count)
+        # Stop the preview prefetch so it does not share the bandwidth
+        widget.prefetcher.cancel()
+        return 1000.0 * (loaded[-1] - start)
+
+    cold = [load(1000 + index) for index in range(repeat)]
+    cached = [load(1000) for _ in range(repeat)]
+    del widget.on_scene_loaded
+    return {"cold": summary(cold), "cached": summary(cached),
+            "clips": widget.clip_list.model().rowCount()}
+
+
+def bench_detail_views(app, repeat):
+    from ui.ui_items_detail import (
+        FreeFootageDetailWidget, Collection_DetailWidget,
+        OwnershipDetailWidget)
+
+    views = {
+        "freefootage": (FreeFootageDetailWidget,
+                        lambda widget, item_id: widget.load_scene(item_id)),
+        "2d": (Collection_DetailWidget,
+               lambda widget, item_id: widget.load_item_by_slug(item_id)),
+        "ownership": (OwnershipDetailWidget,
+                      lambda widget, item_id: widget.load_item_by_slug(
+                          item_id)),
+    }
+    results = {}
+    for offset, (library, (view, load)) in enumerate(views.items()):
+        widget = view()
+        times = []
+        clips = 0
+        for index in range(repeat):
+            widget.clip_list.set_clips([])
+            start = time.perf_counter()
+            load(widget, 2000 + 100 * offset + index)
+            wait_for(app, lambda: widget.clip_list.model().rowCount())
+            times.append(1000.0 * (time.perf_counter() - start))
+            widget.prefetcher.cancel()
+            clips = widget.clip_list.model().rowCount()
+        widget.cancel_requests()
+        widget.close()
+        results[library] = dict(summary(times), clips=clips)
+    return results
+
+
+def bench_load_image(app, widget, server, repeat):
+    shown = []
+    on_poster_loaded = widget.on_poster_loaded
+
+    def record(poster_url, image):
+        on_poster_loaded(poster_url, image)
+        shown.append(time.perf_counter())
+    widget.on_poster_loaded = record
+
+    def load(url):
+        count = len(shown)
+        start = time.perf_counter()
+        widget.load_image(url)
+        wait_for(app, lambda: len(shown) > count)
+        return 1000.0 * (shown[-1] - start)
+
+    urls = [server.url(f"/media/posters/bench_{index}.png")
+            for index in range(repeat)]
+    cold = [load(url) for url in urls]
+    cached = [load(urls[0]) for _ in range(repeat)]
+    del widget.on_poster_loaded
+    return {"cold": summary(cold), "memory_cache": summary(cached)}
+
+
+def bench_video(app, widget, server, repeat, seconds):
+    frames = []
+    label = widget.video_label
+
+    def record(pixmap):
+        frames.append(time.perf_counter())
+        type(label).setPixmap(label, pixmap)
+    label.setPixmap = record
+
+    first_frame = []
+    shown_fps = []
+    clip_fps = 0.0
+    decode_ms = []
+    dropped = []
+    for index in range(repeat):
+        widget.video_url = server.url(f"/media/previews/bench_{index}.mp4")
+        del frames[:]
+        start = time.perf_counter()
+        widget.start_video()
+        wait_for(app, lambda: frames)
+        first_frame.append(1000.0 * (frames[0] - start))
+        playing = time.perf_counter()
+        wait_for(app, lambda: time.perf_counter() - playing > seconds or
+                 widget.decoder is None)
+        if len(frames) > 1:
+            shown_fps.append((len(frames) - 1) / (frames[-1] - frames[0]))
+        if widget.decoder is not None:
+            clip_fps = widget.decoder.fps
+            decode_ms.append(widget.decoder.average_frame_ms())
+            dropped.append(widget.dropped_frames())
+        widget.stop_video()
+    del label.setPixmap
+    return {
+        "first_frame": summary(first_frame),
+        "shown_fps": round(statistics.median(shown_fps), 2)
+        if shown_fps else 0.0,
+        "clip_fps": round(clip_fps, 2),
+        "decode_ms_per_frame": round(statistics.median(decode_ms), 2)
+        if decode_ms else None,
+        "dropped_frames": statistics.median(dropped) if dropped else None,
+    }
+
+
+def bench_download(directory, connections_list, repeat):
+    from api.downloader import variant_downloader
+
+    results = {}
+    variant_id = 1
+    for connections in connections_list:
+        speeds = []
+        times = []
+        for _ in range(repeat):
+            target = os.path.join(directory, f"download_{variant_id}")
+            os.makedirs(target)
+            downloader = variant_downloader(
+                {"id": variant_id}, target, connections=connections)
+            variant_id += 1
+            start = time.perf_counter()
+            downloader.run()
+            elapsed = time.perf_counter() - start
+            times.append(1000.0 * elapsed)
+            speeds.append(downloader.size / elapsed / 1024 ** 2)
+            shutil.rmtree(target)
+        results[f"connections_{connections}"] = dict(
+            summary(times),
+            mb_per_second=round(statistics.median(speeds), 1))
+    return results
+
+
+def run(args, directory):
+    from PySide2 import QtWidgets
+    from api import api_request, auth
+    from api.tracing import get_tracer
+    from ui.ui_items_detail import FreeFootageDetailWidget
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    fixtures = Fixtures(os.path.join(directory, "fixtures"),
+                        fixture_dir=args.fixture_dir,
+                        variant_bytes=args.variant_mb * 1024 * 1024)
+    fixtures.generate()
+    server = FakeAPIServer(fixtures, latency=args.latency,
+                           bandwidth=args.bandwidth).start()
+    api_request.API_ROOT = server.api_root
+    auth.API_URL = server.url("/api/v1/users/sign_in")
+    tracer = get_tracer()
+    if args.trace:
+        tracer.enable()
+
+    results = {}
+    try:
+        widget = FreeFootageDetailWidget()
+        widget.resize(1280, 900)
+        widget.show()
+        benches = {
+            "authenticate": lambda: bench_authenticate(args.repeat),
+            "load_scene": lambda: bench_load_scene(app, widget, args.repeat),
+            "detail_views": lambda: bench_detail_views(app, args.repeat),
+            "load_image": lambda: bench_load_image(
+                app, widget, server, args.repeat),
+            "video": lambda: bench_video(
+                app, widget, server, min(args.repeat, 3),
+                args.play_seconds),
+            "download": lambda: bench_download(
+                os.path.join(directory, "downloads"), args.connections,
+                min(args.repeat, 3)),
+        }
+        for name in args.only or benches:
+            print(f"[INFO] Benchmark {name}", file=sys.stderr)
+            results[name] = benches[name]()
+        widget.cancel_requests()
+        widget.stop_video()
+        widget.close()
+    finally:
+        server.close()
+    results["requests"] = dict(sorted(server.requests.items()))
+    if args.trace:
+        results["trace_summary"] = tracer.summary()
+        tracer.export_chrome_trace(args.trace)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds before each response starts")
+    parser.add_argument("--bandwidth", type=int, default=0,
+                        help="Bytes per second per connection, 0 unlimited")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--play-seconds", type=float, default=3.0)
+    parser.add_argument("--connections", type=int, nargs="+",
+                        default=[1, 4])
+    parser.add_argument("--variant-mb", type=int, default=64)
+    parser.add_argument("--fixture-dir", default=None,
+                        help="Folder of recorded JSON responses")
+    parser.add_argument("--only", nargs="+", default=None,
+                        choices=["authenticate", "load_scene",
+                                 "detail_views", "load_image", "video",
+                                 "download"])
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--trace", default=None,
+                        help="Write a Chrome trace of the run to this file")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="actionvfx_bench_")
+    home = os.path.join(directory, "home")
+    os.makedirs(home)
+    os.environ["HOME"] = os.environ["USERPROFILE"] = home
+    try:
+        # The plugin prints its progress, keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run(args, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "latency_s": args.latency,
+            "bandwidth_bytes_per_second": args.bandwidth,
+            "repeat": args.repeat,
+            "variant_mb": args.variant_mb,
+        },
+        "results": results,
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Benchmark of replaying a preview with reused captures and cached frames.
+
+Plays a local clip ``--loops`` times through ``ui.video_player.DecoderThread``
+the way the detail view loops a preview, with:
+
+- ``reopen``: a new capture and a full decode on every loop, as before.
+- ``capture_pool``: the capture kept open and rewound by seeking.
+- ``frame_cache``: the decoded frames replayed from memory, raw and
+  compressed.
+
+Frames are drained as fast as they arrive, so the results are the time to
+the first frame and to the whole clip of each loop after the first, not
+real time playback. Run from the plugin root::
+
+    python -m benchmarks.bench_video_loop --video clip.mp4
+"""
+# Standard modules
+import sys
+import json
+import time
+import argparse
+import statistics
+
+# Local modules
+from ui.video_player import (
+    DecoderThread, CapturePool, FrameCache, FrameRingBuffer)
+
+
+def play(video, size, capture_pool, frame_cache):
+    """Play ``video`` once; return the ms to the first and the last frame."""
+    decoder = DecoderThread(video, ring=FrameRingBuffer(), target_size=size,
+                            capture_pool=capture_pool,
+                            frame_cache=frame_cache)
+    start = time.perf_counter()
+    decoder.start()
+    first = None
+    while not decoder.is_exhausted():
+        if decoder.ring.pop() is None:
+            time.sleep(0.0005)
+        elif first is None:
+            first = time.perf_counter()
+    end = time.perf_counter()
+    decoder.stop(timeout=1.0)
+    if decoder.error is not None:
+        raise decoder.error
+    return 1000.0 * (first - start), 1000.0 * (end - start)
+
+
+def loop(video, size, loops, capture_pool=None, frame_cache=None):
+    first_frame = []
+    whole_clip = []
+    for index in range(loops):
+        first, whole = play(video, size, capture_pool, frame_cache)
+        # The first play opens and decodes in every mode
+        if index:
+            first_frame.append(first)
+            whole_clip.append(whole)
+    result = {
+        "first_frame_ms": round(statistics.median(first_frame), 2),
+        "whole_clip_ms": round(statistics.median(whole_clip), 2),
+    }
+    if capture_pool is not None:
+        result["capture_pool"] = capture_pool.stats()
+        capture_pool.clear()
+    if frame_cache is not None:
+        result["frame_cache"] = frame_cache.stats()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--video", required=True, help="Local preview file")
+    parser.add_argument("--loops", type=int, default=6)
+    parser.add_argument("--size", type=int, nargs=2, default=[640, 360],
+                        metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args(argv)
+
+    size = tuple(args.size)
+    results = {
+        "reopen": loop(args.video, size, args.loops),
+        "capture_pool": loop(args.video, size, args.loops,
+                             capture_pool=CapturePool()),
+        "frame_cache": loop(args.video, size, args.loops,
+                            frame_cache=FrameCache()),
+        "frame_cache_compressed": loop(args.video, size, args.loops,
+                                       frame_cache=FrameCache(compress=True)),
+    }
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
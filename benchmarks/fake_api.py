@@ -0,0 +1,438 @@
+"""Local stand-in for the ActionVFX API used by the benchmarks.
+
+``FakeAPIServer`` serves, on ``127.0.0.1``, the endpoints the plugin calls
+with fixture responses shaped like the real ones:
+
+- ``POST /api/v1/users/sign_in``
+- ``GET /api/v1/scenes/<id>/``
+- ``GET /api/v1/collections/<id>/products/``
+- ``POST /api/v1/variant_downloads/``
+
+and the files they point to: PNG posters under ``/media/posters/``, mp4
+previews under ``/media/previews/`` and zip variants under ``/files/``.
+Every response waits ``latency`` seconds before it starts, and bodies are
+sent at ``bandwidth`` bytes per second per connection (0 for unlimited).
+Byte ranges and keep-alive are supported like on the CDN.
+
+JSON responses can be replaced by recorded ones: a file
+``<fixture_dir>/scenes/12.json`` is sent for ``/api/v1/scenes/12/``.
+
+Run on its own to browse the fixtures::
+
+    python -m benchmarks.fake_api --port 8765 --latency 0.05
+"""
+# Standard modules
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import struct
+import zipfile
+import argparse
+import tempfile
+import threading
+import http.server
+
+
+# Constants
+API_PREFIX = "/api/v1/"
+TOKEN = "Bearer benchmark-token"
+CHUNK_SIZE = 64 * 1024
+POSTER_SIZE = (1920, 1080)
+PREVIEW_SIZE = (1280, 720)
+PREVIEW_FPS = 24.0
+PREVIEW_SECONDS = 4
+CLIPS_PER_SCENE = 12
+VARIANT_BYTES = 64 * 1024 * 1024
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def png_bytes(width, height):
+    """Return a ``width`` x ``height`` RGB gradient encoded as PNG."""
+    rows = []
+    for y in range(height):
+        shade = (y * 255) // max(1, height - 1)
+        rows.append(b"\x00" + bytes((shade, 96, 255 - shade)) * width)
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+            + chunk(b"IEND", b""))
+
+
+def write_preview(path, width, height, fps, seconds):
+    """Write a moving test pattern as an mp4 preview with OpenCV."""
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps,
+                             (width, height))
+    if not writer.isOpened():
+        raise RuntimeError("OpenCV cannot write mp4 previews")
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for index in range(int(fps * seconds)):
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[..., 0] = (x + index * 4) % 256
+        frame[..., 1] = (y + index * 2) % 256
+        frame[..., 2] = 128
+        writer.write(frame)
+    writer.release()
+
+
+def write_variant(path, size):
+    """Write a zip of about ``size`` bytes of incompressible frames."""
+    frames = max(1, size // (4 * 1024 * 1024))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for index in range(frames):
+            archive.writestr(f"frames/frame.{index:04d}.exr",
+                             os.urandom(size // frames))
+
+
+class Fixtures(object):
+    """Files and JSON bodies served by ``FakeAPIServer``.
+
+    One poster, one preview and one variant archive are generated into
+    ``directory`` on first use and served under every name of their kind,
+    so each URL is still a separate cache entry for the plugin.
+
+    Args:
+        directory (str): Folder of the generated media.
+        fixture_dir (str): Folder of recorded JSON responses, optional.
+        clips (int): Clips per scene.
+        variant_bytes (int): Size of each variant archive.
+    """
+
+    def __init__(self, directory, fixture_dir=None, clips=CLIPS_PER_SCENE,
+                 variant_bytes=VARIANT_BYTES):
+        self.directory = directory
+        self.fixture_dir = fixture_dir
+        self.clips = clips
+        self.variant_bytes = variant_bytes
+        self._lock = threading.Lock()
+        self.base_url = ""
+
+    def media_path(self, kind, name):
+        """Return the file served for ``<kind>/<name>``, or None.
+
+        Args:
+            kind (str): ``"posters"``, ``"previews"`` or ``"files"``.
+            name (str): File name, its extension must match the kind.
+        """
+        extension = {"posters": ".png", "previews": ".mp4",
+                     "files": ".zip"}.get(kind)
+        if extension is None or not name.endswith(extension):
+            return None
+        path = os.path.join(self.directory, kind + extension)
+        with self._lock:
+            if os.path.exists(path):
+                return path
+            os.makedirs(self.directory, exist_ok=True)
+            if kind == "posters":
+                with open(path, "wb") as file:
+                    file.write(png_bytes(*POSTER_SIZE))
+            elif kind == "previews":
+                write_preview(path, *PREVIEW_SIZE, PREVIEW_FPS,
+                              PREVIEW_SECONDS)
+            else:
+                write_variant(path, self.variant_bytes)
+            return path
+
+    def generate(self):
+        """Generate every media file now, so no request waits for it."""
+        for kind, name in (("posters", "poster.png"),
+                           ("previews", "preview.mp4"),
+                           ("files", "variant.zip")):
+            self.media_path(kind, name)
+
+    def recorded(self, path):
+        """Return a recorded JSON response for an API path, or None."""
+        if not self.fixture_dir:
+            return None
+        name = path[len(API_PREFIX):].strip("/")
+        file_path = os.path.join(self.fixture_dir, *name.split("/")) + ".json"
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def scene(self, scene_id):
+        media = f"{self.base_url}/media"
+        clips = []
+        for index in range(self.clips):
+            clip_id = scene_id * 100 + index
+            clips.append({
+                "id": clip_id,
+                "name": f"Clip {index + 1}",
+                "media": {
+                    "mp4": f"{media}/previews/preview_{clip_id}.mp4",
+                    "image": f"{media}/posters/poster_{clip_id}.png",
+                },
+                "collection_variants": [
+                    {"id": clip_id * 10 + offset, "resolution": resolution,
+                     "size": self.variant_bytes}
+                    for offset, resolution in enumerate(("2K", "4K"))],
+            })
+        return {
+            "id": scene_id,
+            "name": f"Benchmark Scene {scene_id}",
+            "slug": f"benchmark-scene-{scene_id}",
+            "description": "Scene served by the benchmark API.",
+            "poster": f"{media}/posters/poster_{scene_id}.png",
+            "free_for_subscriber": True,
+            "updated_at": "2026-01-01T00:00:00Z",
+            "clips": clips,
+        }
+
+    def products(self, collection_id):
+        return {"data": [self.scene(collection_id * 1000 + index)
+                         for index in range(4)]}
+
+    def sign_in(self, payload):
+        return {
+            "token": TOKEN,
+            "data": {
+                "username": payload.get("email", "benchmark").split("@")[0],
+                "first_name": "Bench",
+                "last_name": "Mark",
+                "free_subscriber": False,
+                "membership": {"tier": "Pro"},
+            },
+        }
+
+    def variant_download(self, payload):
+        variant_id = int(payload.get("variant_id") or 0)
+        return {"data": {
+            "url": f"{self.base_url}/files/variant_{variant_id}.zip",
+            "filename": f"variant_{variant_id}.zip",
+            "size": os.path.getsize(
+                self.media_path("files", f"variant_{variant_id}.zip")),
+        }}
+
+
+class FakeAPIHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler of ``FakeAPIServer``."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_POST(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body):
+        server = self.server
+        server.count(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if server.latency:
+            time.sleep(server.latency)
+
+        path = self.path.split("?", 1)[0]
+        if path.startswith(API_PREFIX):
+            try:
+                payload = json.loads(body.decode("utf-8")) if body else {}
+            except ValueError:
+                payload = {}
+            data = self._api_response(path, payload)
+            if data is None:
+                return self._send_bytes(404, b"{}", "application/json",
+                                        send_body)
+            headers = {"Authorization": TOKEN} if "sign_in" in path else {}
+            return self._send_bytes(200, json.dumps(data).encode("utf-8"),
+                                    "application/json", send_body, headers)
+
+        match = re.match(r"/(media/posters|media/previews|files)/([\w.]+)$",
+                         path)
+        file_path = server.fixtures.media_path(
+            match.group(1).rpartition("/")[2], match.group(2)) \
+            if match else None
+        if file_path is None:
+            return self._send_bytes(404, b"", "text/plain", send_body)
+        self._send_file(file_path, send_body)
+
+    def _api_response(self, path, payload):
+        fixtures = self.server.fixtures
+        recorded = fixtures.recorded(path)
+        if recorded is not None:
+            return recorded
+        parts = path[len(API_PREFIX):].strip("/").split("/")
+        if parts == ["users", "sign_in"]:
+            return fixtures.sign_in(payload)
+        if parts == ["variant_downloads"]:
+            return fixtures.variant_download(payload)
+        if len(parts) == 2 and parts[0] == "scenes" and parts[1].isdigit():
+            return fixtures.scene(int(parts[1]))
+        if len(parts) == 3 and parts[0] == "collections" and \
+                parts[1].isdigit() and parts[2] == "products":
+            return fixtures.products(int(parts[1]))
+        return None
+
+    def _send_bytes(self, status, data, content_type, send_body,
+                    headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self._write_shaped([data])
+
+    def _send_file(self, path, send_body):
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = RANGE.match(self.headers.get("Range") or "")
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) \
+                    if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+
+        def chunks():
+            with open(path, "rb") as file:
+                file.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    data = file.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+        self._write_shaped(chunks())
+
+    def _write_shaped(self, chunks):
+        """Write chunks at the server's bandwidth, per connection."""
+        bandwidth = self.server.bandwidth
+        start = time.monotonic()
+        sent = 0
+        try:
+            for data in chunks:
+                for offset in range(0, len(data), CHUNK_SIZE):
+                    piece = data[offset:offset + CHUNK_SIZE]
+                    self.wfile.write(piece)
+                    sent += len(piece)
+                    if bandwidth:
+                        delay = sent / bandwidth - (time.monotonic() - start)
+                        if delay > 0:
+                            time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class FakeAPIServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server replaying the ActionVFX API.
+
+    Args:
+        fixtures (Fixtures): What is served. By default media is generated
+            into a temporary folder removed by ``close``.
+        latency (float): Seconds before each response starts.
+        bandwidth (int): Bytes per second per connection, 0 for unlimited.
+        port (int): Port to listen on, 0 for any free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures=None, latency=0.0, bandwidth=0, port=0):
+        super(FakeAPIServer, self).__init__(("127.0.0.1", port),
+                                            FakeAPIHandler)
+        self._temp_dir = None
+        if fixtures is None:
+            self._temp_dir = tempfile.TemporaryDirectory()
+            fixtures = Fixtures(self._temp_dir.name)
+        self.fixtures = fixtures
+        self.fixtures.base_url = self.url("")
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = {}
+        self._requests_lock = threading.Lock()
+        self._thread = None
+
+    def url(self, path):
+        """Return the absolute URL of a path on this server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    @property
+    def api_root(self):
+        return self.url(API_PREFIX.rstrip("/"))
+
+    def handle_error(self, request, client_address):
+        # Cancelled downloads and prefetches reset their connections
+        if not isinstance(sys.exc_info()[1],
+                          (ConnectionResetError, BrokenPipeError)):
+            super(FakeAPIServer, self).handle_error(request, client_address)
+
+    def count(self, path):
+        with self._requests_lock:
+            key = path.split("?", 1)[0]
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def start(self):
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop serving and remove the generated media."""
+        self.shutdown()
+        self.server_close()
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, default=0)
+    parser.add_argument("--fixture-dir", default=None)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = FakeAPIServer(Fixtures(directory, args.fixture_dir),
+                               latency=args.latency,
+                               bandwidth=args.bandwidth, port=args.port)
+        print(f"[INFO] Serving the benchmark API on {server.api_root}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
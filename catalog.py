@@ -0,0 +1,579 @@
+"""Local catalog of ActionVFX collections and scenes.
+
+This module contains a SQLite index of the elements the plugin has seen:
+names, descriptions, tags, variant resolutions and sizes, and what the user
+owns. It is filled from the ``/collections/``, ``/scenes/`` and
+``/ownership/`` responses as they arrive, and answers searches and filters
+locally in milliseconds, also offline.
+
+Text search uses an FTS5 table ranked with BM25. SQLite builds without FTS5
+fall back to ``LIKE`` matching, which is slower but gives the same results.
+"""
+# Standard modules import
+import os
+import re
+import time
+import sqlite3
+import threading
+import urllib.parse
+
+
+# Constants
+CATALOG_FILE = os.path.join(
+    os.path.expanduser("~"), ".actionvfx_cache", "catalog.sqlite3")
+DEFAULT_LIMIT = 100
+# BM25 weights of the name, description and tags columns
+RANK = "bm25(items_fts, 10.0, 1.0, 5.0)"
+
+# Item kinds
+SCENE = "scene"
+COLLECTION = "collection"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS items ("
+    " id INTEGER PRIMARY KEY,"
+    " kind TEXT NOT NULL,"
+    " remote_id INTEGER NOT NULL,"
+    " name TEXT NOT NULL,"
+    " slug TEXT,"
+    " description TEXT,"
+    " tags TEXT,"
+    " poster TEXT,"
+    " free INTEGER NOT NULL DEFAULT 0,"
+    " updated_at REAL NOT NULL,"
+    " UNIQUE (kind, remote_id))",
+    "CREATE INDEX IF NOT EXISTS items_name"
+    " ON items (name COLLATE NOCASE)",
+    "CREATE TABLE IF NOT EXISTS variants ("
+    " item_id INTEGER NOT NULL,"
+    " variant_id INTEGER,"
+    " resolution TEXT COLLATE NOCASE,"
+    " size INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS variants_item ON variants (item_id)",
+    "CREATE INDEX IF NOT EXISTS variants_resolution"
+    " ON variants (resolution, item_id)",
+    "CREATE TABLE IF NOT EXISTS ownership ("
+    " user TEXT NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " remote_id INTEGER NOT NULL,"
+    " PRIMARY KEY (user, kind, remote_id))",
+    "CREATE TABLE IF NOT EXISTS sync_state ("
+    " endpoint TEXT PRIMARY KEY,"
+    " cursor TEXT,"
+    " last_id INTEGER,"
+    " url TEXT,"
+    " etag TEXT,"
+    " synced_at REAL,"
+    " full_synced_at REAL)",
+)
+SYNC_STATE_FIELDS = ("cursor", "last_id", "url", "etag", "synced_at",
+                     "full_synced_at")
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5("
+    "name, description, tags, tokenize='unicode61 remove_diacritics 2')")
+
+# Keys that hold the list of records in a paginated response
+LIST_KEYS = ("results", "data", "items", "scenes", "collections")
+
+
+def fts_query(text):
+    """Turn user input into an FTS5 query matching every word as a prefix.
+
+    Returns:
+        str: The query, or an empty string if ``text`` has no words.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text or ""))
+
+
+def records_of(data):
+    """Return the list of records in an API response."""
+    if isinstance(data, list):
+        return [record for record in data if isinstance(record, dict)]
+    if isinstance(data, dict):
+        for key in LIST_KEYS:
+            value = data.get(key)
+            if isinstance(value, (list, dict)):
+                return records_of(value)
+        if "id" in data:
+            return [data]
+    return []
+
+
+def _tags(record):
+    """Return the tag and category names of a record as one string."""
+    names = []
+    for tag in (record.get("tags") or []) + (record.get("categories") or []):
+        name = tag.get("name") if isinstance(tag, dict) else tag
+        if name:
+            names.append(str(name))
+    category = record.get("category")
+    if isinstance(category, dict):
+        category = category.get("name")
+    if category:
+        names.append(str(category))
+    return ", ".join(names)
+
+
+def _ownership_rows(records, user):
+    """Split ``/ownership/`` records into elements and ownership rows."""
+    owned = []
+    items = []
+    for record in records:
+        element = record.get("collection") or record.get("scene")
+        kind = SCENE if "scene" in record else COLLECTION
+        if isinstance(element, dict):
+            items.append((kind, element))
+            remote_id = element.get("id")
+        else:
+            remote_id = element or record.get("collection_id") \
+                or record.get("id")
+        if remote_id is not None:
+            owned.append((user or "", kind, int(remote_id)))
+    return items, owned
+
+
+def _variants(record):
+    """Return the variants of a record, or None if it lists none at all."""
+    if "collection_variants" not in record and "variants" not in record \
+            and "clips" not in record:
+        return None
+    variants = list(record.get("collection_variants")
+                    or record.get("variants") or [])
+    for clip in record.get("clips") or []:
+        variants.extend(clip.get("collection_variants") or [])
+    return variants
+
+
+class CatalogItem(object):
+    """A catalog search result.
+
+    Attributes:
+        id (int): The ID of the element in the API.
+        kind (str): ``SCENE`` or ``COLLECTION``.
+        name (str): The element name.
+        slug (str): The URL slug, if known.
+        description (str): The description, if known.
+        tags (list): Tag and category names.
+        poster (str): The poster image URL, if known.
+        free (bool): True for free footage.
+        resolutions (list): The resolutions of the element's variants.
+    """
+
+    def __init__(self, remote_id, kind, name, slug, description, tags,
+                 poster, free, resolutions):
+        self.id = remote_id
+        self.kind = kind
+        self.name = name
+        self.slug = slug
+        self.description = description or ""
+        self.tags = [tag for tag in (tags or "").split(", ") if tag]
+        self.poster = poster
+        self.free = bool(free)
+        self.resolutions = sorted(set((resolutions or "").split(","))
+                                  - {""})
+
+    def to_dict(self):
+        """Return the item in the shape the grids use for API items."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "slug": self.slug,
+            "description": self.description,
+            "tags": self.tags,
+            "poster": self.poster,
+            "resolutions": self.resolutions,
+        }
+
+
+class Catalog(object):
+    """SQLite index of collections and scenes with full text search."""
+
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self.fts = False
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        """Open the database on first use."""
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                db.execute(statement)
+            try:
+                db.execute(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                print("[WARNING] SQLite has no FTS5, catalog search "
+                      "falls back to LIKE")
+            db.commit()
+            self._db = db
+        return self._db
+
+    # ---------- Indexing ----------
+
+    def index_response(self, url, data, user=None):
+        """Index an API response according to its endpoint.
+
+        Responses of other endpoints are ignored.
+
+        Args:
+            url (str): The requested URL.
+            data: The parsed JSON.
+            user (str): The signed in user, for ``/ownership/``.
+        """
+        parts = [part for part in urllib.parse.urlsplit(url).path.split("/")
+                 if part]
+        if "ownership" in parts:
+            self.index_ownership(records_of(data), user)
+        elif "scenes" in parts:
+            self.index_items(SCENE, records_of(data))
+        elif "collections" in parts and "products" not in parts:
+            self.index_items(COLLECTION, records_of(data))
+
+    def index_items(self, kind, records):
+        """Insert or update elements of one kind.
+
+        Fields a record does not have, like the variants of a list entry,
+        keep their indexed value.
+
+        Returns:
+            int: The number of records indexed.
+        """
+        now = time.time()
+        count = 0
+        with self._lock:
+            db = self._connect()
+            with db:
+                for record in records:
+                    if self._index_item(db, kind, record, now):
+                        count += 1
+        return count
+
+    def index_ownership(self, records, user, replace=False):
+        """Add the elements of ``records`` to those ``user`` owns.
+
+        A response may be one page of the ownership list, so elements are
+        only added; the complete list replaces them in ``apply_sync``.
+
+        Args:
+            records (list): Ownership records.
+            user (str): The owning user.
+            replace (bool): ``records`` is the complete list, drop the
+                elements it does not have.
+
+        Returns:
+            int: The number of owned elements.
+        """
+        items, owned = _ownership_rows(records, user)
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            with db:
+                for kind, element in items:
+                    self._index_item(db, kind, element, now)
+                if replace:
+                    db.execute("DELETE FROM ownership WHERE user = ?",
+                               (user or "",))
+                db.executemany(
+                    "INSERT OR IGNORE INTO ownership (user, kind, remote_id)"
+                    " VALUES (?, ?, ?)", owned)
+        return len(owned)
+
+    def sync_state(self, endpoint):
+        """Return the saved sync cursor of an endpoint.
+
+        Returns:
+            dict: The ``SYNC_STATE_FIELDS`` values, empty if the endpoint
+                was never synced.
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT " + ", ".join(SYNC_STATE_FIELDS) +
+                " FROM sync_state WHERE endpoint = ?",
+                (endpoint,)).fetchone()
+        return dict(zip(SYNC_STATE_FIELDS, row)) if row else {}
+
+    def apply_sync(self, endpoint, kind, records, state, owner=None,
+                   full=False, started=None):
+        """Apply the records of a sync and save its cursor in one
+        transaction, so an interrupted sync leaves no half applied state.
+
+        Args:
+            endpoint (str): Name the cursor is saved under.
+            kind (str): Kind of the records, for element endpoints.
+            records (list): New or changed records.
+            state (dict): The new ``SYNC_STATE_FIELDS`` values.
+            owner (str): For ``/ownership/``, the user owning the records.
+            full (bool): ``records`` is the complete list. Ownership is
+                replaced, and elements of ``kind`` not seen since
+                ``started`` are dropped.
+            started (float): Time the sync started.
+
+        Returns:
+            int: The number of records applied.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            with db:
+                if owner is not None:
+                    items, owned = _ownership_rows(records, owner)
+                    for item_kind, element in items:
+                        self._index_item(db, item_kind, element, now)
+                    if full:
+                        db.execute("DELETE FROM ownership WHERE user = ?",
+                                   (owner,))
+                    db.executemany(
+                        "INSERT OR IGNORE INTO ownership"
+                        " (user, kind, remote_id) VALUES (?, ?, ?)", owned)
+                else:
+                    for record in records:
+                        self._index_item(db, kind, record, now)
+                    if full and started is not None:
+                        stale = db.execute(
+                            "SELECT id FROM items WHERE kind = ?"
+                            " AND updated_at < ?", (kind, started)).fetchall()
+                        for item_id, in stale:
+                            self._delete_rows(db, item_id)
+                db.execute(
+                    "INSERT OR REPLACE INTO sync_state (endpoint, " +
+                    ", ".join(SYNC_STATE_FIELDS) + ") VALUES (?" +
+                    ", ?" * len(SYNC_STATE_FIELDS) + ")",
+                    [endpoint] + [state.get(field)
+                                  for field in SYNC_STATE_FIELDS])
+        return len(records)
+
+    def remove(self, kind, remote_id):
+        """Drop an element from the catalog."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                row = db.execute(
+                    "SELECT id FROM items WHERE kind = ? AND remote_id = ?",
+                    (kind, remote_id)).fetchone()
+                if row is not None:
+                    self._delete_rows(db, row[0])
+
+    def clear(self):
+        """Drop the whole catalog."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute("DELETE FROM items")
+                db.execute("DELETE FROM variants")
+                db.execute("DELETE FROM ownership")
+                db.execute("DELETE FROM sync_state")
+                if self.fts:
+                    db.execute("DELETE FROM items_fts")
+
+    def _index_item(self, db, kind, record, now):
+        remote_id = record.get("id")
+        name = record.get("name") or record.get("title")
+        if remote_id is None or not name:
+            return False
+
+        description = record.get("description")
+        tags = _tags(record) if "tags" in record or "category" in record \
+            or "categories" in record else None
+        poster = record.get("poster") or \
+            (record.get("media") or {}).get("image")
+        free = record.get("free_for_subscriber", record.get("free"))
+
+        row = db.execute(
+            "SELECT id FROM items WHERE kind = ? AND remote_id = ?",
+            (kind, remote_id)).fetchone()
+        if row is None:
+            item_id = db.execute(
+                "INSERT INTO items (kind, remote_id, name, slug, description,"
+                " tags, poster, free, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, remote_id, name, record.get("slug"), description or "",
+                 tags or "", poster, int(bool(free)), now)).lastrowid
+        else:
+            item_id = row[0]
+            db.execute(
+                "UPDATE items SET name = ?,"
+                " slug = COALESCE(?, slug),"
+                " description = COALESCE(?, description),"
+                " tags = COALESCE(?, tags),"
+                " poster = COALESCE(?, poster),"
+                " free = COALESCE(?, free),"
+                " updated_at = ? WHERE id = ?",
+                (name, record.get("slug"), description, tags, poster,
+                 None if free is None else int(bool(free)), now, item_id))
+
+        variants = _variants(record)
+        if variants is not None:
+            db.execute("DELETE FROM variants WHERE item_id = ?", (item_id,))
+            db.executemany(
+                "INSERT INTO variants (item_id, variant_id, resolution, size)"
+                " VALUES (?, ?, ?, ?)",
+                [(item_id, variant.get("id"), variant.get("resolution"),
+                  variant.get("size") or 0) for variant in variants])
+
+        if self.fts:
+            text = db.execute(
+                "SELECT name, description, tags FROM items WHERE id = ?",
+                (item_id,)).fetchone()
+            db.execute("DELETE FROM items_fts WHERE rowid = ?", (item_id,))
+            db.execute(
+                "INSERT INTO items_fts (rowid, name, description, tags)"
+                " VALUES (?, ?, ?, ?)", (item_id,) + tuple(text))
+        return True
+
+    def _delete_rows(self, db, item_id):
+        db.execute("DELETE FROM items WHERE id = ?", (item_id,))
+        db.execute("DELETE FROM variants WHERE item_id = ?", (item_id,))
+        if self.fts:
+            db.execute("DELETE FROM items_fts WHERE rowid = ?", (item_id,))
+
+    # ---------- Queries ----------
+
+    def search(self, text="", kind=None, resolution=None, min_size=None,
+               max_size=None, free=None, owned_by=None,
+               limit=DEFAULT_LIMIT, offset=0):
+        """Search and filter the catalog.
+
+        Args:
+            text (str): Words to find in names, descriptions and tags. Each
+                word matches as a prefix; all of them must match.
+            kind (str): Only ``SCENE`` or ``COLLECTION`` elements.
+            resolution (str): Only elements with a variant of this
+                resolution, e.g. ``"4K"``.
+            min_size (int): Only elements with a variant at least this
+                many bytes.
+            max_size (int): Only elements with a variant at most this
+                many bytes.
+            free (bool): Only free, or only paid, elements.
+            owned_by (str): Only elements this user owns.
+            limit (int): Maximum number of results.
+            offset (int): Number of results to skip, for paging.
+
+        Returns:
+            list: ``CatalogItem`` objects, best match first when searching
+                text (name matches before tags, tags before descriptions),
+                by name otherwise.
+        """
+        joins, where, params, ranked = self._filters(
+            text, kind, resolution, min_size, max_size, free, owned_by)
+        order = RANK if ranked else "items.name COLLATE NOCASE"
+        sql = (
+            "SELECT items.remote_id, items.kind, items.name, items.slug,"
+            " items.description, items.tags, items.poster, items.free,"
+            " (SELECT group_concat(DISTINCT resolution) FROM variants"
+            "  WHERE variants.item_id = items.id)"
+            " FROM items" + joins + where +
+            f" ORDER BY {order} LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._connect().execute(
+                sql, params + [limit, offset]).fetchall()
+        return [CatalogItem(*row) for row in rows]
+
+    def count(self, text="", kind=None, resolution=None, min_size=None,
+              max_size=None, free=None, owned_by=None):
+        """Return the number of elements ``search`` would find."""
+        joins, where, params, _ = self._filters(
+            text, kind, resolution, min_size, max_size, free, owned_by)
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM items" + joins + where,
+                params).fetchone()[0]
+
+    def resolutions(self):
+        """Return ``(resolution, element count)`` pairs, for filter menus."""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT resolution, COUNT(DISTINCT item_id) FROM variants"
+                " WHERE resolution IS NOT NULL GROUP BY resolution"
+                " ORDER BY resolution").fetchall()
+
+    def stats(self):
+        """Return the number of indexed elements as a dictionary."""
+        with self._lock:
+            db = self._connect()
+            counts = dict(db.execute(
+                "SELECT kind, COUNT(*) FROM items GROUP BY kind").fetchall())
+            variants = db.execute(
+                "SELECT COUNT(*) FROM variants").fetchone()[0]
+        return {
+            "scenes": counts.get(SCENE, 0),
+            "collections": counts.get(COLLECTION, 0),
+            "variants": variants,
+            "full_text_search": self.fts,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _filters(self, text, kind, resolution, min_size, max_size, free,
+                 owned_by):
+        """Build the joins, WHERE clause and parameters of a query."""
+        joins = ""
+        where = []
+        params = []
+        ranked = False
+
+        query = fts_query(text)
+        if query and self.fts:
+            joins = " JOIN items_fts ON items_fts.rowid = items.id"
+            where.append("items_fts MATCH ?")
+            params.append(query)
+            ranked = True
+        elif query:
+            for word in re.findall(r"\w+", text):
+                where.append("(items.name LIKE ? OR items.description LIKE ?"
+                             " OR items.tags LIKE ?)")
+                params.extend([f"%{word}%"] * 3)
+
+        if kind:
+            where.append("items.kind = ?")
+            params.append(kind)
+        if free is not None:
+            where.append("items.free = ?")
+            params.append(int(bool(free)))
+
+        variant_filters = ["variants.item_id = items.id"]
+        if resolution:
+            variant_filters.append("variants.resolution = ?")
+            params.append(resolution)
+        if min_size:
+            variant_filters.append("variants.size >= ?")
+            params.append(min_size)
+        if max_size:
+            variant_filters.append("variants.size <= ?")
+            params.append(max_size)
+        if len(variant_filters) > 1:
+            where.append("EXISTS (SELECT 1 FROM variants WHERE "
+                         + " AND ".join(variant_filters) + ")")
+
+        if owned_by is not None:
+            where.append(
+                "EXISTS (SELECT 1 FROM ownership WHERE ownership.user = ?"
+                " AND ownership.kind = items.kind"
+                " AND ownership.remote_id = items.remote_id)")
+            params.append(owned_by)
+
+        where_sql = " WHERE " + " AND ".join(where) if where else ""
+        return joins, where_sql, params, ranked
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the process-wide catalog."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
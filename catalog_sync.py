@@ -0,0 +1,341 @@
+"""Incremental sync of the local catalog with the ActionVFX API.
+
+This module keeps ``api.catalog`` fresh without walking every page of
+``/collections/`` and ``/ownership/`` again. A high-water mark is saved per
+endpoint: the newest ``updated_at`` seen, or the highest ID when records
+have no timestamp. Later syncs ask for records newest first and changed
+since that mark, and stop at the first record older than it, or after the
+first page with nothing new when the server ignores the ordering, so a sync
+with nothing new costs one request, or a ``304`` when the server sends an
+ETag. Records sharing the mark's timestamp are fetched again, since more of
+them may have arrived after the last sync; applying one twice is harmless.
+
+The records of a sync are applied together with the new cursor in one
+transaction. A full walk runs once a day to pick up deletions.
+"""
+# Standard modules import
+import time
+import threading
+import urllib.parse
+
+# Local modules
+from api.api_request import api_url, http_client
+from api.catalog import COLLECTION, get_catalog, records_of
+
+
+# Constants
+SYNC_INTERVAL = 15 * 60
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+PAGE_SIZE = 200
+MAX_PAGES = 1000
+
+# Query parameters of the list endpoints
+UPDATED_SINCE_PARAM = "updated_since"
+ORDERING_PARAM = "ordering"
+PAGE_PARAM = "page"
+PAGE_SIZE_PARAM = "page_size"
+
+# Record fields used as the change cursor, first found wins
+CURSOR_FIELDS = ("updated_at", "modified_at", "modified", "created_at")
+
+
+def cursor_of(record):
+    """Return the change timestamp of a record, or None."""
+    for field in CURSOR_FIELDS:
+        if record.get(field):
+            return str(record[field])
+    return None
+
+
+def id_of(record):
+    """Return the integer ID of a record, or None."""
+    try:
+        return int(record.get("id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def next_page_url(data, url):
+    """Return the URL of the next page of a list response, or None."""
+    if not isinstance(data, dict):
+        return None
+    next_url = data.get("next") or (data.get("links") or {}).get("next")
+    if isinstance(next_url, str) and next_url:
+        return urllib.parse.urljoin(url, next_url)
+
+    meta = data.get("meta") or data.get("pagination") or {}
+    next_page = meta.get("next_page") or data.get("next_page")
+    if not next_page:
+        return None
+    parts = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parts.query))
+    query[PAGE_PARAM] = str(next_page)
+    return urllib.parse.urlunsplit(
+        parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def is_newer(record, state):
+    """Return True if a record changed at or after the saved cursor.
+
+    Records with the cursor's own timestamp count as newer: others with
+    the same timestamp may have been added since the last sync.
+    """
+    cursor = cursor_of(record)
+    if cursor and state.get("cursor"):
+        return cursor >= state["cursor"]
+    record_id = id_of(record)
+    if record_id is not None and state.get("last_id") is not None:
+        return record_id > state["last_id"]
+    return True
+
+
+def is_newest_first(records):
+    """Return True if a page is sorted newest first, so a sync can stop at
+    the first old record."""
+    keys = [cursor_of(record) or id_of(record) for record in records]
+    if None in keys:
+        return False
+    try:
+        return all(a >= b for a, b in zip(keys, keys[1:]))
+    except TypeError:
+        return False
+
+
+class SyncEndpoint(object):
+    """A list endpoint kept in sync.
+
+    Args:
+        name (str): Name the cursor is saved under.
+        path (str): API path, relative to ``/api/v1``.
+        kind (str): Catalog kind of the records.
+        per_user (bool): The records depend on the signed in user, as for
+            ``/ownership/``.
+    """
+
+    def __init__(self, name, path, kind=COLLECTION, per_user=False):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self.per_user = per_user
+
+
+ENDPOINTS = (
+    SyncEndpoint("collections", "collections/"),
+    SyncEndpoint("ownership", "ownership/", per_user=True),
+)
+
+
+class SyncResult(object):
+    """Outcome of syncing one endpoint.
+
+    Attributes:
+        endpoint (str): The endpoint name.
+        records (int): New or changed records applied.
+        requests (int): Requests sent.
+        full (bool): True for a full walk.
+        not_modified (bool): True if the server answered ``304``.
+    """
+
+    def __init__(self, endpoint, records=0, requests=0, full=False,
+                 not_modified=False):
+        self.endpoint = endpoint
+        self.records = records
+        self.requests = requests
+        self.full = full
+        self.not_modified = not_modified
+
+
+class CatalogSync(object):
+    """Keeps the catalog in sync on a background thread.
+
+    Listeners added with ``add_listener`` are called with every
+    ``SyncResult`` that changed the catalog, from the sync thread.
+    """
+
+    def __init__(self, catalog=None, client=None, endpoints=ENDPOINTS,
+                 interval=SYNC_INTERVAL, full_interval=FULL_SYNC_INTERVAL,
+                 page_size=PAGE_SIZE):
+        self.catalog = catalog or get_catalog()
+        self.client = client or http_client
+        self.endpoints = endpoints
+        self.interval = interval
+        self.full_interval = full_interval
+        self.page_size = page_size
+        self._listeners = []
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._sync_lock = threading.Lock()
+
+    # ---------- Schedule ----------
+
+    def start(self):
+        """Sync now and then every ``interval`` seconds."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background sync after the current one."""
+        self._stopped.set()
+        self._wake.set()
+
+    def sync_now(self):
+        """Wake the background thread for a sync right away."""
+        self._wake.set()
+
+    def add_listener(self, listener):
+        """Call ``listener(result)`` after a sync changed the catalog."""
+        self._listeners.append(listener)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.sync_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    # ---------- Sync ----------
+
+    def sync_all(self, full=None):
+        """Sync every endpoint; errors are logged, not raised.
+
+        Returns:
+            list: The ``SyncResult`` of the endpoints that synced.
+        """
+        results = []
+        for endpoint in self.endpoints:
+            try:
+                results.append(self.sync_endpoint(endpoint, full=full))
+            except Exception as e:
+                print(f"[WARNING] Catalog sync of {endpoint.name}: {e}")
+        return results
+
+    def sync_endpoint(self, endpoint, full=None):
+        """Fetch and apply what changed on one endpoint.
+
+        Args:
+            endpoint (SyncEndpoint): The endpoint.
+            full (bool): Force, or prevent, a full walk. By default a full
+                walk runs on the first sync and after ``full_interval``.
+
+        Returns:
+            SyncResult: What the sync did.
+        """
+        with self._sync_lock:
+            return self._sync_endpoint(endpoint, full)
+
+    def _sync_endpoint(self, endpoint, full):
+        user = self._user() if endpoint.per_user else None
+        key = f"{endpoint.name}:{user}" if user else endpoint.name
+        state = self.catalog.sync_state(key)
+        started = time.time()
+        if full is None:
+            full = not state or \
+                started - (state.get("full_synced_at") or 0) > \
+                self.full_interval
+
+        query = {PAGE_SIZE_PARAM: self.page_size,
+                 ORDERING_PARAM: "-updated_at"}
+        if not full and state.get("cursor"):
+            query[UPDATED_SINCE_PARAM] = state["cursor"]
+        url = api_url(endpoint.path) + "?" + urllib.parse.urlencode(query)
+        first_url = url
+
+        headers = None
+        if not full and state.get("etag") and state.get("url") == url:
+            headers = {"If-None-Match": state["etag"]}
+
+        result = SyncResult(endpoint.name, full=full)
+        records = []
+        # (id, cursor) of the records kept, pages can overlap while the
+        # list changes under the walk
+        seen = set()
+        etag = None
+        while url and result.requests < MAX_PAGES:
+            response = self.client.get(url, headers=headers)
+            result.requests += 1
+            if response.status == 304:
+                result.not_modified = True
+                state = dict(state, synced_at=started)
+                self.catalog.apply_sync(key, endpoint.kind, [], state)
+                return result
+            if result.requests == 1:
+                etag = response.headers.get("ETag")
+
+            data = response.json()
+            page = records_of(data)
+            # Newest first, the walk stops at the first old record
+            stop_early = not full and is_newest_first(page)
+            reached_old = False
+            page_has_new = False
+            for record in page:
+                if full or is_newer(record, state):
+                    page_has_new = True
+                    record_id = id_of(record)
+                    if record_id is not None:
+                        record_key = (record_id, cursor_of(record))
+                        if record_key in seen:
+                            continue
+                        seen.add(record_key)
+                    records.append(record)
+                elif stop_early:
+                    reached_old = True
+                    break
+            # Unordered, a page with nothing new ends the walk; the daily
+            # full walk catches anything further back
+            if reached_old or not page or not page_has_new:
+                break
+            url = next_page_url(data, url)
+            headers = None
+
+        cursors = [cursor_of(record) for record in records]
+        ids = [id_of(record) for record in records]
+        new_state = {
+            "cursor": max([cursor for cursor in cursors if cursor]
+                          + ([state["cursor"]] if state.get("cursor")
+                             else []), default=None),
+            "last_id": max([record_id for record_id in ids
+                            if record_id is not None]
+                           + ([state["last_id"]]
+                              if state.get("last_id") is not None else []),
+                           default=None),
+            "url": first_url,
+            "etag": etag,
+            "synced_at": started,
+            "full_synced_at": started if full
+            else state.get("full_synced_at"),
+        }
+        result.records = self.catalog.apply_sync(
+            key, endpoint.kind, records, new_state,
+            owner=(user or "") if endpoint.per_user else None,
+            full=full, started=started)
+        if result.records:
+            self._notify(result)
+        return result
+
+    def _user(self):
+        from api.auth import load_session
+        session = load_session() or {}
+        return session.get("username")
+
+    def _notify(self, result):
+        for listener in list(self._listeners):
+            try:
+                listener(result)
+            except Exception as e:
+                print(f"[ERROR] catalog sync listener: {e}")
+
+
+_catalog_sync = None
+_catalog_sync_lock = threading.Lock()
+
+
+def get_catalog_sync():
+    """Return the process-wide catalog sync."""
+    global _catalog_sync
+    with _catalog_sync_lock:
+        if _catalog_sync is None:
+            _catalog_sync = CatalogSync()
+        return _catalog_sync
@@ -0,0 +1,382 @@
+"""Persistent download queue for ActionVFX variants.
+
+This module contains the queue behind the dashboard Download button. Jobs
+run on a bounded pool of worker threads, highest priority first, and share
+a global bandwidth limit. The queue is saved to disk on every state change
+so queued and partial jobs survive a Nuke restart; partial jobs resume from
+their segment map.
+"""
+# Standard modules import
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+
+# Local modules
+from api.downloader import (BandwidthThrottle, DownloadCancelled,
+                            variant_downloader)
+
+
+# Constants
+QUEUE_FILE = os.path.join(
+    os.path.expanduser("~"), ".actionvfx_download_queue.json")
+DEFAULT_MAX_CONCURRENT = 3
+SAVE_INTERVAL = 5.0
+# Seconds shutdown waits for the running jobs to stop
+SHUTDOWN_TIMEOUT = 5.0
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class DownloadJob(object):
+    """One variant download in the queue.
+
+    Attributes:
+        job_id (str): Unique ID of the job.
+        name (str): Text shown in the queue view.
+        variant (dict): The variant as listed in ``collection_variants``.
+        directory (str): Folder the file is saved into.
+        priority (int): Higher runs first.
+        state (str): One of the job states.
+        total (int): File size in bytes, 0 until known.
+        done (int): Bytes on disk.
+        speed (float): Bytes per second.
+        eta (float): Seconds left, or None.
+        path (str): The downloaded file, or the folder it was extracted
+            into, once done.
+        error (str): The error message, if the job failed.
+    """
+
+    FIELDS = ("job_id", "name", "variant", "directory", "priority", "state",
+              "total", "done", "path", "error", "created_at")
+
+    def __init__(self, variant, directory, name="", priority=0, job_id=None,
+                 state=QUEUED, total=0, done=0, path=None, error=None,
+                 created_at=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.name = name or str(variant.get("resolution", variant.get("id")))
+        self.variant = variant
+        self.directory = directory
+        self.priority = priority
+        self.state = state
+        self.total = total or variant.get("size", 0)
+        self.done = done
+        self.path = path
+        self.error = error
+        self.created_at = created_at or time.time()
+        self.speed = 0.0
+        self.eta = None
+        self.downloader = None
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data.get(field) for field in cls.FIELDS
+                      if field in data})
+
+
+class DownloadQueue(object):
+    """Bounded pool of download workers with priorities and a bandwidth cap.
+
+    Listeners added with ``add_listener`` are called with the changed job
+    from worker threads; UI code must forward them to the GUI thread.
+    """
+
+    def __init__(self, path=QUEUE_FILE, max_concurrent=DEFAULT_MAX_CONCURRENT,
+                 bandwidth_limit=0):
+        self.path = path
+        self.max_concurrent = max_concurrent
+        self.throttle = BandwidthThrottle(bandwidth_limit)
+        self.jobs = []
+        self._listeners = []
+        self._condition = threading.Condition()
+        # Serializes writing the queue file across threads
+        self._save_lock = threading.Lock()
+        self._workers = []
+        self._running = 0
+        self._stopped = False
+        self._last_save = 0.0
+        self._load()
+
+    # ---------- Public API ----------
+
+    def start(self):
+        """Start the worker threads."""
+        with self._condition:
+            self._stopped = False
+            missing = self.max_concurrent - len(
+                [worker for worker in self._workers if worker.is_alive()])
+            for _ in range(max(0, missing)):
+                worker = threading.Thread(target=self._worker, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop the workers; running jobs are paused and saved as queued.
+
+        Args:
+            timeout (float): Seconds to wait for the running downloads to
+                save their segment maps.
+        """
+        with self._condition:
+            self._stopped = True
+            running = [job for job in self.jobs if job.state == RUNNING]
+            workers = list(self._workers)
+            self._condition.notify_all()
+        for job in running:
+            if job.downloader is not None:
+                job.downloader.cancel()
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+        self.save()
+
+    def add(self, variant, directory, name="", priority=0):
+        """Queue a variant download.
+
+        Returns:
+            DownloadJob: The new job.
+        """
+        job = DownloadJob(variant, directory, name=name, priority=priority)
+        with self._condition:
+            self.jobs.append(job)
+            self._condition.notify()
+        self._changed(job, save=True)
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            for job in self.jobs:
+                if job.job_id == job_id:
+                    return job
+        return None
+
+    def pause(self, job_id):
+        """Pause a queued or running job; its partial file is kept."""
+        self._stop_job(job_id, PAUSED)
+
+    def cancel(self, job_id):
+        """Cancel a job. Its partial file is kept until it is retried."""
+        self._stop_job(job_id, CANCELLED)
+
+    def resume(self, job_id):
+        """Queue a paused, failed or cancelled job again."""
+        job = self.get(job_id)
+        if job is None or job.state not in (PAUSED, FAILED, CANCELLED):
+            return
+        with self._condition:
+            job.state = QUEUED
+            job.error = None
+            self._condition.notify()
+        self._changed(job, save=True)
+
+    def remove(self, job_id):
+        """Forget a finished job."""
+        with self._condition:
+            self.jobs = [job for job in self.jobs
+                         if job.job_id != job_id or job.state == RUNNING]
+        self._changed(None, save=True)
+
+    def set_priority(self, job_id, priority):
+        """Change the priority of a job that has not started yet.
+
+        Jobs that are running or finished are left as they are.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return
+        with self._condition:
+            if job.state != QUEUED:
+                return
+            job.priority = priority
+        self._changed(job, save=True)
+
+    def set_bandwidth_limit(self, bytes_per_second):
+        """Cap the total bandwidth of all downloads; 0 removes the cap."""
+        self.throttle.set_rate(bytes_per_second)
+
+    def set_max_concurrent(self, max_concurrent):
+        """Change how many downloads run at the same time."""
+        with self._condition:
+            self.max_concurrent = max(1, max_concurrent)
+            self._condition.notify_all()
+        self.start()
+
+    def add_listener(self, listener):
+        """Call ``listener(job)`` whenever a job changes."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Stop calling a listener added with ``add_listener``."""
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def snapshot(self):
+        """Return the list of jobs, in queue order."""
+        with self._condition:
+            return list(self.jobs)
+
+    # ---------- Persistence ----------
+
+    def save(self):
+        """Write the queue to disk."""
+        with self._condition:
+            data = {"jobs": [job.to_dict() for job in self.jobs]}
+        temp_path = self.path + ".tmp"
+        with self._save_lock:
+            try:
+                with open(temp_path, "w") as file:
+                    json.dump(data, file)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"[WARNING] Could not save download queue: {e}")
+            self._last_save = time.monotonic()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except OSError:
+            return
+        except ValueError as e:
+            # Keep the damaged file for a look instead of dropping it
+            backup_path = self.path + ".bak"
+            print(f"[ERROR] Download queue {self.path} is damaged ({e}), "
+                  f"moved to {backup_path}")
+            try:
+                os.replace(self.path, backup_path)
+            except OSError:
+                pass
+            return
+        for item in data.get("jobs", []):
+            try:
+                job = DownloadJob.from_dict(item)
+            except TypeError:
+                continue
+            # Jobs running when Nuke closed resume from their segment map
+            if job.state == RUNNING:
+                job.state = QUEUED
+            self.jobs.append(job)
+
+    # ---------- Workers ----------
+
+    def _next_job(self):
+        """Wait for the highest priority queued job and mark it running."""
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                queued = [job for job in self.jobs if job.state == QUEUED]
+                if queued and self._running < self.max_concurrent:
+                    job = max(queued,
+                              key=lambda job: (job.priority, -job.created_at))
+                    job.state = RUNNING
+                    self._running += 1
+                    return job
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self._changed(job, save=True)
+            try:
+                self._run_job(job)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    job.downloader = None
+                    self._condition.notify()
+                self._changed(job, save=True)
+
+    def _run_job(self, job):
+        def on_progress(progress):
+            job.total = progress.total or job.total
+            job.done = progress.done
+            job.speed = progress.speed
+            job.eta = progress.eta
+            self._changed(job, save=False)
+
+        try:
+            downloader = variant_downloader(
+                job.variant, job.directory, progress_callback=on_progress,
+                throttle=self.throttle)
+            with self._condition:
+                if job.state != RUNNING:
+                    return
+                job.downloader = downloader
+            path = downloader.run()
+            with self._condition:
+                # A pause or cancel during the last chunk wins
+                if job.state != RUNNING:
+                    return
+                job.path = path
+                job.state = DONE
+                job.speed = 0.0
+                job.eta = None
+        except DownloadCancelled:
+            with self._condition:
+                # Paused/cancelled by the user, or by shutdown
+                if job.state == RUNNING:
+                    job.state = QUEUED
+        except Exception as e:
+            print(f"[ERROR] download {job.name}: {e}")
+            with self._condition:
+                job.state = FAILED
+                job.error = str(e)
+
+    def _stop_job(self, job_id, state):
+        job = self.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return
+        with self._condition:
+            job.state = state
+            job.speed = 0.0
+            job.eta = None
+            downloader = job.downloader
+        if downloader is not None:
+            downloader.cancel()
+        self._changed(job, save=True)
+
+    def _changed(self, job, save):
+        if save or time.monotonic() - self._last_save > SAVE_INTERVAL:
+            self.save()
+        for listener in list(self._listeners):
+            try:
+                listener(job)
+            except Exception as e:
+                print(f"[ERROR] download queue listener: {e}")
+
+
+_download_queue = None
+_download_queue_lock = threading.Lock()
+
+
+def get_download_queue():
+    """Return the process-wide download queue, started on first use."""
+    global _download_queue
+    with _download_queue_lock:
+        if _download_queue is None:
+            _download_queue = DownloadQueue()
+            _download_queue.start()
+            # Pause and save the running jobs instead of killing them
+            atexit.register(_download_queue.shutdown)
+        return _download_queue
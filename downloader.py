@@ -0,0 +1,652 @@
+"""Module for downloading ActionVFX variants.
+
+This module contains the download engine used by the dashboard. A variant
+is resolved through ``/variant_downloads/`` and the file is fetched in
+parallel byte-range segments over several connections, written into a
+preallocated ``.part`` file. The segment map is saved next to it so an
+interrupted download resumes where it stopped instead of starting over.
+
+While the segments arrive, ``PrefixReader`` follows the contiguous start of
+the ``.part`` file: the bytes are hashed and archives are extracted as they
+land, so a download is verified and unpacked when its last byte arrives
+instead of reading the file back twice afterwards.
+"""
+# Standard modules import
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import urllib.error
+import urllib.parse
+from collections import deque
+
+# Local modules
+from api.api_request import api_url, http_client, open_url
+from api.archive_stream import (StreamingUnsupported, archive_stem,
+                                archive_type, extract_archive,
+                                extract_stream)
+
+
+# Constants
+DEFAULT_CONNECTIONS = 4
+DEFAULT_SEGMENT_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+SEGMENT_RETRIES = 3
+PROGRESS_INTERVAL = 0.5
+STATE_INTERVAL = 2.0
+SPEED_WINDOW = 5.0
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".segments.json"
+EXTRACTING_SUFFIX = ".extracting"
+
+# Checksum algorithms by hex digest length
+CHECKSUM_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+
+class DownloadCancelled(Exception):
+    """Raised when a download is cancelled before it finished."""
+
+
+class IntegrityError(ValueError):
+    """Raised when a download does not match its expected size or checksum."""
+
+
+def checksum_hasher(checksum):
+    """Return a hash object for a server checksum.
+
+    Args:
+        checksum (str): A hex digest, optionally prefixed with its
+            algorithm, e.g. ``"sha256:..."``.
+
+    Returns:
+        tuple: The hash object and the expected hex digest, or
+            ``(None, None)`` if the checksum is missing or not recognised.
+    """
+    if not checksum:
+        return None, None
+    algorithm, _, digest = checksum.rpartition(":")
+    digest = digest.strip().lower()
+    algorithm = algorithm.lower().replace("-", "") or \
+        CHECKSUM_ALGORITHMS.get(len(digest))
+    try:
+        return hashlib.new(algorithm), digest
+    except (TypeError, ValueError):
+        print(f"[WARNING] Unknown checksum format: {checksum}")
+        return None, None
+
+
+def resolve_variant_download(variant_id):
+    """Ask the API for the download of a collection variant.
+
+    Args:
+        variant_id (int): The ID of the variant to download.
+
+    Returns:
+        dict: The download details. ``url`` is always set; ``size``,
+            ``filename`` and ``checksum`` are set when the API sends them.
+    """
+    response = http_client.post_json(
+        api_url("variant_downloads/"), {"variant_id": variant_id})
+    data = response.json()
+    data = data.get("data", data)
+
+    url = data.get("url") or data.get("download_url")
+    if not url:
+        raise ValueError("No download URL found in response.")
+
+    filename = data.get("filename") or os.path.basename(
+        urllib.parse.unquote(urllib.parse.urlsplit(url).path))
+    return {
+        "url": url,
+        "size": data.get("size") or 0,
+        "filename": filename or f"variant_{variant_id}",
+        "checksum": data.get("checksum") or data.get("md5"),
+    }
+
+
+class BandwidthThrottle(object):
+    """Token bucket shared by downloads to cap their total bandwidth.
+
+    A rate of 0 means unlimited. Consumers may overdraw the bucket and then
+    sleep for their debt, so concurrent downloads share the rate fairly.
+    """
+
+    def __init__(self, bytes_per_second=0):
+        self.rate = bytes_per_second
+        self._tokens = float(bytes_per_second)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, bytes_per_second):
+        """Change the limit; 0 removes it."""
+        with self._lock:
+            self.rate = bytes_per_second
+            self._tokens = min(self._tokens, float(bytes_per_second))
+
+    def consume(self, nbytes, cancel_event=None):
+        """Account for ``nbytes`` and sleep if over the rate."""
+        with self._lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self._tokens = min(float(self.rate),
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            (cancel_event or threading.Event()).wait(wait)
+
+
+class PrefixReader(object):
+    """File-like reader of the downloaded start of a ``.part`` file.
+
+    ``read`` blocks until the next bytes are on disk and returns an empty
+    string once the download ended. The bytes were just written, so they
+    normally come from the OS page cache rather than the disk.
+
+    Args:
+        downloader (SegmentedDownloader): The running download.
+        hasher: Hash object updated with every byte read, or None.
+    """
+
+    def __init__(self, downloader, hasher=None):
+        self.downloader = downloader
+        self.hasher = hasher
+        self.position = 0
+        self._file = open(downloader.part_path, "rb")
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(CHUNK_SIZE), b""))
+        available = self.downloader.wait_for_prefix(self.position + 1)
+        if available <= self.position:
+            return b""
+        data = self._file.read(min(size, available - self.position))
+        self.position += len(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return data
+
+    def drain(self):
+        """Read, and hash, whatever is left of the file."""
+        while self.read(CHUNK_SIZE):
+            pass
+
+    def close(self):
+        self._file.close()
+
+
+class Segment(object):
+    """A byte range of the file and how much of it is on disk."""
+
+    def __init__(self, start, end, done=0):
+        self.start = start
+        self.end = end
+        self.done = done
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+    @property
+    def complete(self):
+        return self.done >= self.length
+
+    def to_list(self):
+        return [self.start, self.end, self.done]
+
+
+class DownloadProgress(object):
+    """Snapshot of a download reported to the UI.
+
+    Attributes:
+        total (int): File size in bytes, 0 if unknown.
+        done (int): Bytes on disk.
+        speed (float): Bytes per second over the last seconds.
+        eta (float): Seconds left, or None if unknown.
+        connections (int): Segments downloading right now.
+    """
+
+    def __init__(self, total, done, speed, eta, connections):
+        self.total = total
+        self.done = done
+        self.speed = speed
+        self.eta = eta
+        self.connections = connections
+
+    @property
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+
+class SegmentedDownloader(object):
+    """Download a file over parallel byte-range requests, with resume.
+
+    Args:
+        url (str): The file URL.
+        dest (str): The final path of the file.
+        size (int): Expected size, checked against the server's.
+        connections (int): Number of parallel connections.
+        segment_size (int): Size of the byte ranges workers pick up.
+        progress_callback (callable): Called with a ``DownloadProgress``
+            from the thread running ``run``.
+        throttle (BandwidthThrottle): Shared bandwidth limit.
+        checksum (str): Expected checksum of the file, see
+            ``checksum_hasher``.
+        extract_dir (str): Extract the archive into this folder while it
+            downloads. Ignored for files that are not archives.
+        keep_archive (bool): Keep the archive once it was extracted.
+    """
+
+    def __init__(self, url, dest, size=0, connections=DEFAULT_CONNECTIONS,
+                 segment_size=DEFAULT_SEGMENT_SIZE, progress_callback=None,
+                 throttle=None, checksum=None, extract_dir=None,
+                 keep_archive=False):
+        self.url = url
+        self.dest = dest
+        self.part_path = dest + PART_SUFFIX
+        self.state_path = dest + STATE_SUFFIX
+        self.size = size
+        self.expected_size = size
+        self.connections = max(1, connections)
+        self.segment_size = segment_size
+        self.progress_callback = progress_callback
+        self.throttle = throttle
+        self.checksum = checksum
+        self.archive_type = archive_type(dest) if extract_dir else None
+        self.extract_dir = extract_dir if self.archive_type else None
+        self.keep_archive = keep_archive
+
+        self.segments = []
+        self.accepts_ranges = False
+        self.error = None
+        self.extracted_path = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._pending = deque()
+        self._active = 0
+        self._samples = deque()
+        self._prefix = 0
+        self._prefix_index = 0
+        self._finished = False
+        self._hasher = None
+        self._digest = None
+        self._extract_error = None
+
+    # ---------- Public API ----------
+
+    def run(self):
+        """Download the file, blocking until it is complete.
+
+        Returns:
+            str: The path of the downloaded file, or of the folder it was
+                extracted into.
+        """
+        self._probe()
+        self._prepare()
+
+        processor = None
+        if self.checksum or self.extract_dir:
+            processor = threading.Thread(target=self._process, daemon=True)
+            processor.start()
+
+        workers = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(min(self.connections,
+                                      len(self._pending)) or 1)]
+        for worker in workers:
+            worker.start()
+
+        last_state = time.monotonic()
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(PROGRESS_INTERVAL / len(workers))
+            self._report()
+            if time.monotonic() - last_state > STATE_INTERVAL:
+                self._save_state()
+                last_state = time.monotonic()
+
+        with self._written:
+            self._finished = True
+            self._written.notify_all()
+        if processor is not None:
+            processor.join()
+
+        self._save_state()
+        self._report()
+        if self._cancel_event.is_set():
+            raise DownloadCancelled(self.dest)
+        if self.error is not None:
+            raise self.error
+        if not all(segment.complete for segment in self.segments):
+            raise ValueError(f"Download incomplete: {self.dest}")
+
+        self._verify()
+        os.replace(self.part_path, self.dest)
+        self._remove(self.state_path)
+        if self.extract_dir:
+            return self._finish_extraction()
+        return self.dest
+
+    def cancel(self):
+        """Stop the download; the segment map is kept for a resume."""
+        self._cancel_event.set()
+        with self._written:
+            self._written.notify_all()
+
+    def bytes_done(self):
+        with self._lock:
+            return sum(segment.done for segment in self.segments)
+
+    def wait_for_prefix(self, wanted, timeout=PROGRESS_INTERVAL):
+        """Wait until the first ``wanted`` bytes are on disk.
+
+        Returns:
+            int: The number of contiguous bytes from the start of the file,
+                which is less than ``wanted`` once the download ended.
+
+        Raises:
+            DownloadCancelled: If the download was cancelled.
+        """
+        with self._written:
+            while self._prefix < wanted and not self._finished:
+                if self._cancel_event.is_set():
+                    raise DownloadCancelled(self.dest)
+                self._written.wait(timeout)
+            return self._prefix
+
+    # ---------- Setup ----------
+
+    def _probe(self):
+        """Find the file size and whether the server accepts ranges."""
+        with open_url(self.url, headers={"Range": "bytes=0-0"},
+                      auth=False) as response:
+            if response.status == 206:
+                content_range = response.headers.get("Content-Range", "")
+                total = content_range.rpartition("/")[2]
+                self.accepts_ranges = total.isdigit()
+                size = int(total) if total.isdigit() else 0
+            else:
+                size = int(response.headers.get("Content-Length") or 0)
+
+        if self.expected_size and size and self.expected_size != size:
+            raise IntegrityError(
+                f"{os.path.basename(self.dest)}: the variant is "
+                f"{self.expected_size} bytes, the server sends {size}")
+        self.size = size or self.size
+        if not self.size:
+            # Unknown size: a single stream to the end
+            self.accepts_ranges = False
+
+    def _prepare(self):
+        """Load or create the segment map and preallocate the file."""
+        state = self._load_state()
+        if state and state.get("size") == self.size and \
+                os.path.exists(self.part_path):
+            self.segments = [Segment(*item) for item in state["segments"]]
+        elif self.accepts_ranges:
+            self.segments = [
+                Segment(start, min(start + self.segment_size, self.size) - 1)
+                for start in range(0, self.size, self.segment_size)]
+        else:
+            self.segments = [Segment(0, max(self.size, 1) - 1)]
+
+        directory = os.path.dirname(self.dest)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        mode = "r+b" if os.path.exists(self.part_path) else "wb"
+        with open(self.part_path, mode) as file:
+            if self.size and os.path.getsize(self.part_path) != self.size:
+                file.truncate(self.size)
+
+        if not self.accepts_ranges:
+            # Without ranges a resume has to start from the beginning
+            for segment in self.segments:
+                segment.done = 0
+        self._pending = deque(
+            segment for segment in self.segments if not segment.complete)
+        with self._lock:
+            self._advance_prefix()
+        self._save_state()
+
+    # ---------- Workers ----------
+
+    def _next_segment(self):
+        with self._lock:
+            if self._cancel_event.is_set() or self.error is not None \
+                    or not self._pending:
+                return None
+            self._active += 1
+            return self._pending.popleft()
+
+    def _worker(self):
+        with open(self.part_path, "r+b") as file:
+            while True:
+                segment = self._next_segment()
+                if segment is None:
+                    return
+                try:
+                    self._download_segment(file, segment)
+                except DownloadCancelled:
+                    return
+                except Exception as e:
+                    with self._lock:
+                        if self.error is None:
+                            self.error = e
+                    return
+                finally:
+                    with self._lock:
+                        self._active -= 1
+
+    def _download_segment(self, file, segment):
+        """Fetch one segment, retrying from where it stopped.
+
+        Without range support a retry would restart at byte 0 while the
+        hasher and the extraction already read the bytes written so far, so
+        the download fails instead once any byte was written; the next run
+        starts over from the beginning.
+        """
+        for attempt in range(SEGMENT_RETRIES + 1):
+            try:
+                self._fetch_range(file, segment)
+                return
+            except (urllib.error.URLError, OSError) as e:
+                if attempt == SEGMENT_RETRIES or \
+                        (not self.accepts_ranges and segment.done):
+                    raise
+                print(f"[WARNING] Segment {segment.start}: {e}, retrying")
+                time.sleep(2 ** attempt)
+
+    def _fetch_range(self, file, segment):
+        headers = None
+        if self.accepts_ranges:
+            headers = {"Range": f"bytes={segment.start + segment.done}-"
+                                f"{segment.end}"}
+        with open_url(self.url, headers=headers, auth=False) as response:
+            if self.accepts_ranges and response.status != 206:
+                raise ValueError("Server ignored the byte range request")
+            offset = segment.start + segment.done
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if self._cancel_event.is_set():
+                    raise DownloadCancelled(self.dest)
+                if self.size:
+                    # Never write past the segment, whatever the server sends
+                    chunk = chunk[:segment.length - segment.done]
+                    if not chunk:
+                        break
+                if self.throttle is not None:
+                    self.throttle.consume(len(chunk), self._cancel_event)
+                file.seek(offset)
+                file.write(chunk)
+                # Make the bytes visible to the prefix reader
+                file.flush()
+                offset += len(chunk)
+                with self._written:
+                    segment.done += len(chunk)
+                    if not self.size:
+                        segment.end = max(segment.end, offset - 1)
+                    self._advance_prefix()
+                    self._written.notify_all()
+        if self.size and not segment.complete:
+            raise urllib.error.URLError("Connection closed early")
+        if not self.size:
+            with self._written:
+                segment.done = segment.length
+                self._advance_prefix()
+                self._written.notify_all()
+
+    def _advance_prefix(self):
+        """Update the contiguous byte count. Called with the lock held."""
+        while self._prefix_index < len(self.segments) and \
+                self.segments[self._prefix_index].complete:
+            self._prefix_index += 1
+        if self._prefix_index < len(self.segments):
+            segment = self.segments[self._prefix_index]
+            self._prefix = segment.start + segment.done
+        elif self.segments:
+            self._prefix = self.segments[-1].end + 1
+
+    # ---------- Hashing and extraction ----------
+
+    def _process(self):
+        """Hash and extract the file as its start arrives. Runs on a thread."""
+        self._hasher, self._digest = checksum_hasher(self.checksum)
+        reader = PrefixReader(self, self._hasher)
+        try:
+            if self.extract_dir:
+                try:
+                    extract_stream(reader, self.extract_dir + EXTRACTING_SUFFIX,
+                                   self.archive_type)
+                except StreamingUnsupported as e:
+                    # Extracted from the complete file in _finish_extraction
+                    print(f"[INFO] Extracting after the download: {e}")
+                    self._extract_error = e
+                except DownloadCancelled:
+                    raise
+                except Exception as e:
+                    self._extract_error = e
+            # Hash what the extractor did not need, like the zip directory
+            reader.drain()
+        except DownloadCancelled:
+            pass
+        finally:
+            reader.close()
+
+    def _verify(self):
+        """Check the file against the expected size and checksum."""
+        size = os.path.getsize(self.part_path)
+        error = None
+        if self.expected_size and size != self.expected_size:
+            error = (f"Expected {self.expected_size} bytes, "
+                     f"downloaded {size}")
+        elif self._hasher is not None and \
+                self._hasher.hexdigest() != self._digest:
+            error = (f"Checksum mismatch: expected {self._digest}, "
+                     f"got {self._hasher.hexdigest()}")
+        if error is None:
+            return
+
+        # Start from scratch next time
+        self._remove(self.part_path)
+        self._remove(self.state_path)
+        if self.extract_dir:
+            shutil.rmtree(self.extract_dir + EXTRACTING_SUFFIX,
+                          ignore_errors=True)
+        raise IntegrityError(f"{os.path.basename(self.dest)}: {error}")
+
+    def _finish_extraction(self):
+        """Move the verified extraction in place and drop the archive."""
+        staging = self.extract_dir + EXTRACTING_SUFFIX
+        if self._extract_error is not None:
+            if not isinstance(self._extract_error, StreamingUnsupported):
+                raise self._extract_error
+            extract_archive(self.dest, staging)
+
+        target = self.extract_dir
+        counter = 1
+        while os.path.exists(target):
+            target = f"{self.extract_dir} ({counter})"
+            counter += 1
+        os.replace(staging, target)
+        if not self.keep_archive:
+            self._remove(self.dest)
+        self.extracted_path = target
+        return target
+
+    # ---------- State and progress ----------
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self):
+        with self._lock:
+            state = {
+                "url": self.url,
+                "size": self.size,
+                "segments": [segment.to_list() for segment in self.segments],
+            }
+        temp_path = self.state_path + ".tmp"
+        try:
+            with open(temp_path, "w") as file:
+                json.dump(state, file)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            print(f"[WARNING] Could not save download state: {e}")
+
+    def _report(self):
+        done = self.bytes_done()
+        now = time.monotonic()
+        self._samples.append((now, done))
+        while len(self._samples) > 2 and \
+                now - self._samples[0][0] > SPEED_WINDOW:
+            self._samples.popleft()
+
+        first_time, first_done = self._samples[0]
+        elapsed = now - first_time
+        speed = (done - first_done) / elapsed if elapsed > 0 else 0.0
+        eta = (self.size - done) / speed if speed > 0 and self.size else None
+
+        if self.progress_callback:
+            self.progress_callback(DownloadProgress(
+                self.size, done, speed, eta, self._active))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def variant_downloader(variant, directory, connections=DEFAULT_CONNECTIONS,
+                       progress_callback=None, throttle=None, extract=True):
+    """Resolve a collection variant and return its downloader.
+
+    Args:
+        variant (dict): The variant as listed in ``collection_variants``.
+        directory (str): Folder the file is saved into.
+        connections (int): Number of parallel connections.
+        progress_callback (callable): Called with ``DownloadProgress``.
+        throttle (BandwidthThrottle): Shared bandwidth limit.
+        extract (bool): Extract archives next to the download while they
+            arrive, and delete the archive afterwards.
+
+    Returns:
+        SegmentedDownloader: The downloader, not started yet.
+    """
+    details = resolve_variant_download(variant["id"])
+    dest = os.path.join(directory, details["filename"])
+    extract_dir = os.path.join(directory, archive_stem(dest)) \
+        if extract else None
+    return SegmentedDownloader(
+        details["url"], dest, size=details["size"] or variant.get("size", 0),
+        connections=connections, progress_callback=progress_callback,
+        throttle=throttle, checksum=details["checksum"],
+        extract_dir=extract_dir)
@@ -0,0 +1,447 @@
+"""Two-tier cache for posters and clip thumbnails.
+
+This module contains the image cache used by the detail views. Encoded image
+bytes are kept in a size-capped directory on disk, and decoded images that
+were already scaled to their display size are kept in a memory LRU bounded by
+a byte budget. Downloading, decoding and scaling run on a worker pool; only
+the final ``QImage`` to ``QPixmap`` conversion happens on the GUI thread.
+
+``SpriteSheetCache`` keeps the hover-scrub sprite sheets of clip previews
+the same way, in their own directory and memory budget. A missing sheet is
+built from the preview in the local proxy cache by
+``api.sprite_sheets.SpriteSheetBuilder``. ``SpriteSheetCache.prefetch``
+builds the sheets of a scene when it opens, so the first hover already has
+one.
+"""
+# Standard modules import
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Third-party modules
+from PySide2 import QtGui, QtCore
+
+# Local modules
+from api.api_request import http_client
+from api.preview_cache import get_preview_cache
+from api.sprite_sheets import (
+    get_sprite_builder, sprite_key, sprite_tile, SPRITE_FRAMES,
+    SPRITE_TILE_WIDTH)
+from api.tracing import get_tracer
+from ui.ui_workers import Worker, decode_pool, sprite_pool
+
+
+# Constants
+IMAGE_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".actionvfx_cache", "images")
+DEFAULT_DISK_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_BYTES = 96 * 1024 * 1024
+
+# Sprite sheet settings
+SPRITE_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".actionvfx_cache", "sprites")
+DEFAULT_SPRITE_DISK_BYTES = 128 * 1024 * 1024
+DEFAULT_SPRITE_MEMORY_BYTES = 32 * 1024 * 1024
+# Longest wait for the complete preview of a sheet, checked every slice
+SPRITE_DOWNLOAD_TIMEOUT = 120.0
+SPRITE_WAIT_SLICE = 0.25
+
+
+def _image_nbytes(image):
+    """Return the memory used by a QImage."""
+    if hasattr(image, "sizeInBytes"):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+class DiskImageStore(object):
+    """Size-capped directory of encoded image bytes, evicted by LRU."""
+
+    def __init__(self, directory=IMAGE_CACHE_DIR,
+                 max_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, url):
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def _scan(self):
+        """Read the size of every stored file on first use."""
+        if self._sizes is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._sizes = {}
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".part"):
+                    self._sizes[entry.path] = entry.stat().st_size
+
+    def get(self, url):
+        """Return the stored bytes for ``url`` or None."""
+        path = self._path(url)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            # Touch the file so eviction sees it as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, url, data):
+        """Store ``data`` for ``url`` and evict old files if over budget."""
+        path = self._path(url)
+        with self._lock:
+            self._scan()
+            temp_path = f"{path}.{threading.get_ident()}.part"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+            self._sizes[path] = len(data)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        by_age = []
+        for path in self._sizes:
+            try:
+                by_age.append((os.path.getmtime(path), path))
+            except OSError:
+                by_age.append((0, path))
+        for _, path in sorted(by_age):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.evictions += 1
+
+
+class MemoryImageCache(object):
+    """LRU of decoded, pre-scaled QImages bounded by a byte budget."""
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the image stored under ``key`` or None."""
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        """Store ``image`` and evict the least recently used ones."""
+        nbytes = _image_nbytes(image)
+        with self._lock:
+            if key in self._images:
+                self._bytes -= _image_nbytes(self._images.pop(key))
+            self._images[key] = image
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, old = self._images.popitem(last=False)
+                self._bytes -= _image_nbytes(old)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+    def nbytes(self):
+        return self._bytes
+
+
+def load_scaled_image(url, width, height, disk_store):
+    """Fetch, decode and scale an image. Runs on a worker thread.
+
+    Args:
+        url (str): The image URL.
+        width (int): Target width, or 0 to keep the source size.
+        height (int): Target height, or 0 to keep the source size.
+        disk_store (DiskImageStore): The disk tier.
+
+    Returns:
+        QtGui.QImage: The decoded image scaled to fit the target size.
+    """
+    tracer = get_tracer()
+    with tracer.span("image.fetch", "image", url=url) as span:
+        data = disk_store.get(url)
+        span.set(source="disk" if data is not None else "network")
+        if data is None:
+            data = http_client.get(url).body
+            disk_store.put(url, data)
+        span.set(bytes=len(data))
+
+    image = QtGui.QImage()
+    with tracer.span("image.decode", "image", url=url):
+        if not image.loadFromData(data):
+            raise ValueError(f"Could not decode image: {url}")
+    if width > 0 and height > 0:
+        with tracer.span("image.scale", "image", width=image.width(),
+                         height=image.height()):
+            image = image.scaled(width, height, QtCore.Qt.KeepAspectRatio,
+                                 QtCore.Qt.SmoothTransformation)
+    return image
+
+
+def load_sprite_sheet(video_url, frames, tile_width, disk_store, builder,
+                      previews, cancelled=None):
+    """Return the sprite sheet of a preview, building it if needed. Runs
+    on a worker thread.
+
+    Args:
+        video_url (str): URL or local path of the preview.
+        frames (int): Number of tiles.
+        tile_width (int): Width of each tile.
+        disk_store (DiskImageStore): The disk tier of sprite sheets.
+        builder (SpriteSheetBuilder): Builds missing sheets.
+        previews (PreviewCache): Local proxies of remote previews.
+        cancelled (threading.Event): Stops waiting for the preview.
+
+    Returns:
+        QtGui.QImage: The decoded sheet.
+    """
+    tracer = get_tracer()
+    key = sprite_key(video_url, frames, tile_width)
+    data = disk_store.get(key)
+    if data is None:
+        path = video_url
+        if video_url.startswith(("http://", "https://")):
+            # Tiles cover the whole clip, wait for the complete preview
+            download = previews.fetch(video_url)
+            deadline = time.monotonic() + SPRITE_DOWNLOAD_TIMEOUT
+            while not download.done:
+                if cancelled is not None and cancelled.is_set():
+                    raise ValueError("Sprite sheet cancelled")
+                if time.monotonic() > deadline:
+                    raise ValueError("Timed out downloading the preview")
+                download.wait_ready(float("inf"), SPRITE_WAIT_SLICE)
+            if not download.complete:
+                raise ValueError(
+                    f"Could not download the preview: {download.error}")
+            path = download.path
+        with tracer.span("sprite.build", "image", url=video_url):
+            data = builder.build(path, frames, tile_width)
+        disk_store.put(key, data)
+
+    image = QtGui.QImage()
+    with tracer.span("image.decode", "image", url=key):
+        if not image.loadFromData(data):
+            raise ValueError(f"Could not decode sprite sheet: {video_url}")
+    return image
+
+
+class ImageCache(QtCore.QObject):
+    """Memory and disk cache for posters and thumbnails.
+
+    Requests for an image that is already being loaded share the same
+    worker, and the callbacks are always called on the GUI thread.
+    """
+
+    # Name of the span timing each load
+    span_name = "image.request"
+
+    def __init__(self, memory=None, disk=None, pool=None, parent=None):
+        super(ImageCache, self).__init__(parent)
+        self.memory = memory or MemoryImageCache()
+        self.disk = disk or DiskImageStore()
+        self.pool = pool or decode_pool()
+        self._pending = {}
+        self._workers = {}
+        # Start time of each load, for the image.request span
+        self._started = {}
+
+    def cached(self, url, size):
+        """Return ``url`` scaled to fit ``size`` if it is in memory, or
+        None. Never starts a request."""
+        return self.memory.get((url, size.width(), size.height()))
+
+    def request(self, url, size, on_result, on_error=None):
+        """Get ``url`` scaled to fit ``size`` and pass it to ``on_result``.
+
+        A memory hit calls ``on_result`` immediately.
+
+        Args:
+            url (str): The image URL.
+            size (QtCore.QSize): The size the image will be displayed at.
+            on_result (callable): Called with the ``QImage``.
+            on_error (callable): Called with the error message.
+        """
+        key = (url, size.width(), size.height())
+        self._load(key, on_result, on_error, load_scaled_image, url,
+                   size.width(), size.height(), self.disk)
+
+    def _load(self, key, on_result, on_error, fn, *args):
+        """Pass the image of ``key`` to ``on_result``, from memory or by
+        running ``fn(*args)`` on the pool."""
+        image = self.memory.get(key)
+        if image is not None:
+            on_result(image)
+            return
+
+        callbacks = self._pending.get(key)
+        if callbacks is not None:
+            callbacks.append((on_result, on_error))
+            return
+        self._pending[key] = [(on_result, on_error)]
+        self._started[key] = time.perf_counter()
+
+        worker = Worker(fn, *args)
+        worker.signals.result.connect(
+            lambda result: self._on_loaded(key, result))
+        worker.signals.error.connect(
+            lambda message: self._on_failed(key, message))
+        # Keep the Python wrapper alive while the pool runs it
+        self._workers[key] = worker
+        self.pool.start(worker)
+
+    def stats(self):
+        """Return the counters of both tiers."""
+        return {
+            "memory_hits": self.memory.hits,
+            "memory_misses": self.memory.misses,
+            "memory_evictions": self.memory.evictions,
+            "memory_bytes": self.memory.nbytes(),
+            "disk_hits": self.disk.hits,
+            "disk_misses": self.disk.misses,
+            "disk_evictions": self.disk.evictions,
+        }
+
+    def _on_loaded(self, key, image):
+        self._workers.pop(key, None)
+        get_tracer().record(self.span_name, self._started.pop(key),
+                            time.perf_counter(), "image", url=key[0])
+        self.memory.put(key, image)
+        for on_result, _ in self._pending.pop(key, []):
+            on_result(image)
+
+    def _on_failed(self, key, message):
+        self._workers.pop(key, None)
+        get_tracer().record(self.span_name, self._started.pop(key),
+                            time.perf_counter(), "image", url=key[0],
+                            error=message)
+        for _, on_error in self._pending.pop(key, []):
+            if on_error:
+                on_error(message)
+
+
+class SpriteSheetCache(ImageCache):
+    """Memory and disk cache of the hover-scrub sprite sheets of previews.
+
+    Sheets are keyed by preview URL. Missing ones wait for the preview on
+    the sprite pool and are built in the sprite sheet builder's processes.
+    """
+
+    span_name = "sprite.request"
+
+    def __init__(self, frames=SPRITE_FRAMES, tile_width=SPRITE_TILE_WIDTH,
+                 builder=None, previews=None, memory=None, disk=None,
+                 pool=None, parent=None):
+        super(SpriteSheetCache, self).__init__(
+            memory=memory or MemoryImageCache(DEFAULT_SPRITE_MEMORY_BYTES),
+            disk=disk or DiskImageStore(SPRITE_CACHE_DIR,
+                                        DEFAULT_SPRITE_DISK_BYTES),
+            pool=pool or sprite_pool(), parent=parent)
+        self.frames = frames
+        self.tile_width = tile_width
+        self.builder = builder or get_sprite_builder()
+        self.previews = previews or get_preview_cache()
+        # Set to drop the prefetched sheets still waiting for a preview
+        self._prefetch_cancelled = threading.Event()
+
+    def cached(self, video_url):
+        """Return the sheet of ``video_url`` if it is in memory, or None.
+        Never starts a request."""
+        return self.memory.get((video_url, self.frames, self.tile_width))
+
+    def request(self, video_url, on_result, on_error=None):
+        """Get the sprite sheet of ``video_url`` and pass it to
+        ``on_result``; a memory hit calls it immediately."""
+        key = (video_url, self.frames, self.tile_width)
+        self._load(key, on_result, on_error, load_sprite_sheet, video_url,
+                   self.frames, self.tile_width, self.disk, self.builder,
+                   self.previews)
+
+    def prefetch(self, video_urls):
+        """Build the sheets of ``video_urls`` ahead of the first hover.
+
+        The sheets of the previous call that still wait for their preview
+        are dropped.
+        """
+        self.cancel_prefetch()
+        cancelled = self._prefetch_cancelled
+        for video_url in video_urls:
+            if self.cached(video_url) is not None:
+                continue
+            key = (video_url, self.frames, self.tile_width)
+            self._load(key, _ignore, _ignore, load_sprite_sheet, video_url,
+                       self.frames, self.tile_width, self.disk,
+                       self.builder, self.previews, cancelled)
+
+    def cancel_prefetch(self):
+        """Stop waiting for the previews of prefetched sheets."""
+        self._prefetch_cancelled.set()
+        self._prefetch_cancelled = threading.Event()
+
+    def tile_rect(self, sheet, fraction):
+        """Return the rect in ``sheet`` of the tile shown at ``fraction``
+        (0 to 1) of a thumbnail's width."""
+        width = sheet.width() // self.frames
+        tile = sprite_tile(fraction, self.frames)
+        return QtCore.QRect(tile * width, 0, width, sheet.height())
+
+
+def _ignore(value):
+    """Callback of prefetched sheets, kept in the cache for later."""
+
+
+_image_cache = None
+_sprite_cache = None
+
+
+def get_image_cache():
+    """Return the image cache shared by every detail view."""
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache()
+    return _image_cache
+
+
+def get_sprite_cache():
+    """Return the sprite sheet cache shared by every thumbnail."""
+    global _sprite_cache
+    if _sprite_cache is None:
+        _sprite_cache = SpriteSheetCache()
+    return _sprite_cache
@@ -0,0 +1,418 @@
+"""Local cache of clip preview videos.
+
+This module contains the on-disk proxy cache used by the preview player.
+Previews are downloaded in the background into a size-capped directory and
+evicted least recently used first. Playback can start from the partial file
+as soon as enough bytes have arrived, and later plays read entirely from
+disk instead of streaming the mp4 again.
+
+A download writes straight into its final file and is marked incomplete by
+a ``.incomplete`` file next to it, so nothing is renamed while a player may
+still have the file open (which fails on Windows). Partial files are kept
+and resumed with a ``Range`` request.
+
+``PreviewPrefetcher`` warms the first bytes of every clip of a scene in the
+background, so switching clips starts playback from disk.
+"""
+# Standard modules import
+import os
+import time
+import hashlib
+import threading
+import urllib.error
+from collections import deque
+
+# Local modules
+from api.api_request import open_url
+
+
+# Constants
+PREVIEW_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".actionvfx_cache", "previews")
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+READY_BYTES = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+INCOMPLETE_SUFFIX = ".incomplete"
+
+# Prefetch settings
+PREFETCH_CLIP_BYTES = 2 * 1024 * 1024
+PREFETCH_BUDGET = 48 * 1024 * 1024
+PREFETCH_CONCURRENCY = 2
+
+
+class PreviewDownload(object):
+    """State of one preview file, complete or still downloading.
+
+    Attributes:
+        url (str): The remote preview URL.
+        path (str): The local file.
+        received (int): Bytes written so far.
+        total (int): Expected size, or 0 if unknown.
+        complete (bool): True once the whole file is on disk.
+        error (Exception): The download error, if any.
+        max_bytes (int): Stop after this many bytes, None for the whole
+            file. Used by the prefetcher.
+        truncated (bool): True if the download stopped at ``max_bytes``.
+    """
+
+    def __init__(self, url, path, complete=False, received=0,
+                 max_bytes=None):
+        self.url = url
+        self.path = path
+        self.received = os.path.getsize(path) if complete else received
+        self.total = self.received if complete else 0
+        self.complete = complete
+        self.error = None
+        self.cancelled = False
+        self.max_bytes = max_bytes
+        self.truncated = False
+        self._condition = threading.Condition()
+
+    @property
+    def done(self):
+        """True once the download finished, failed or was stopped."""
+        return (self.complete or self.truncated or self.cancelled
+                or self.error is not None)
+
+    def limit_reached(self):
+        """Return True if a prefetch download has all the bytes it wants."""
+        return self.max_bytes is not None and self.received >= self.max_bytes
+
+    def wait_ready(self, min_bytes=READY_BYTES, timeout=None):
+        """Wait until ``min_bytes`` are on disk or the download ended.
+
+        Returns:
+            bool: True if playback can start from ``path``.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.received < min_bytes and not self.done:
+                remaining = None if deadline is None \
+                    else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self.error is None and (
+                self.complete or self.received >= min_bytes)
+
+    def wait_for_more(self, received, timeout=None):
+        """Wait until more than ``received`` bytes are on disk."""
+        with self._condition:
+            if self.received <= received and not self.done:
+                self._condition.wait(timeout)
+            return self.received > received
+
+    def cancel(self):
+        """Stop the download; the partial file is kept for a later resume."""
+        with self._condition:
+            self.cancelled = True
+            self._condition.notify_all()
+
+    def _progress(self, received=None, total=None, complete=None,
+                  error=None, truncated=None):
+        with self._condition:
+            if received is not None:
+                self.received = received
+            if total is not None:
+                self.total = total
+            if complete is not None:
+                self.complete = complete
+            if error is not None:
+                self.error = error
+            if truncated is not None:
+                self.truncated = truncated
+            self._condition.notify_all()
+
+
+class PreviewCache(object):
+    """Size-capped LRU directory of downloaded clip previews."""
+
+    def __init__(self, directory=PREVIEW_CACHE_DIR,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._downloads = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_downloaded = 0
+
+    def path_for(self, url):
+        """Return the local file used for ``url``."""
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        extension = os.path.splitext(url.split("?")[0])[1] or ".mp4"
+        return os.path.join(self.directory, name + extension)
+
+    def cached_path(self, url):
+        """Return the local file of a fully downloaded preview, or None."""
+        path = self.path_for(url)
+        if os.path.exists(path) and \
+                not os.path.exists(path + INCOMPLETE_SUFFIX):
+            return path
+        return None
+
+    def partial_size(self, url):
+        """Return the bytes already on disk of an unfinished preview."""
+        path = self.path_for(url)
+        if not os.path.exists(path + INCOMPLETE_SUFFIX):
+            return 0
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def fetch(self, url, max_bytes=None):
+        """Return the download of ``url``, starting it if needed.
+
+        A preview already on disk returns a complete download at once.
+        Concurrent calls for the same URL share the same download, and a
+        full fetch lifts the limit of a prefetch still in progress.
+
+        Args:
+            url (str): The preview URL.
+            max_bytes (int): Only download the first bytes (prefetch).
+
+        Returns:
+            PreviewDownload: The download state.
+        """
+        with self._lock:
+            download = self._downloads.get(url)
+            if download is not None and not (
+                    download.error or download.cancelled):
+                if max_bytes is None and download.max_bytes is not None:
+                    download.max_bytes = None
+                return download
+
+            path = self.cached_path(url)
+            if path is not None:
+                self.hits += 1
+                try:
+                    # Touch the file so eviction sees it as recently used
+                    os.utime(path)
+                except OSError:
+                    pass
+                return PreviewDownload(url, path, complete=True)
+
+            received = self.partial_size(url)
+            if max_bytes is not None and received >= max_bytes:
+                # Already prefetched
+                download = PreviewDownload(url, self.path_for(url),
+                                           received=received,
+                                           max_bytes=max_bytes)
+                download.truncated = True
+                return download
+
+            self.misses += 1
+            os.makedirs(self.directory, exist_ok=True)
+            download = PreviewDownload(url, self.path_for(url),
+                                       received=received,
+                                       max_bytes=max_bytes)
+            self._downloads[url] = download
+
+        thread = threading.Thread(
+            target=self._download, args=(download,), daemon=True)
+        thread.start()
+        return download
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_downloaded": self.bytes_downloaded,
+                "active_downloads": len(self._downloads),
+            }
+
+    def _download(self, download):
+        """Download a preview into its cache file. Runs on a thread."""
+        marker = download.path + INCOMPLETE_SUFFIX
+        start = download.received
+        received = start
+        try:
+            open(marker, "ab").close()
+            headers = {"Range": f"bytes={start}-"} if start else None
+            try:
+                response = open_url(download.url, headers=headers,
+                                    auth=False)
+            except urllib.error.HTTPError as e:
+                if e.code != 416 or not start:
+                    raise
+                # The partial file already holds the whole preview
+                os.remove(marker)
+                download._progress(complete=True)
+                return
+
+            with response:
+                if response.status != 206:
+                    # The server ignored the range, start over
+                    start = received = 0
+                length = int(response.headers.get("Content-Length") or 0)
+                download._progress(received=received,
+                                   total=start + length if length else 0)
+
+                chunks = response.iter_content(CHUNK_SIZE)
+                with open(download.path, "ab" if start else "wb") as file:
+                    while not download.cancelled:
+                        if download.limit_reached():
+                            # Checked under the lock fetch() uses to lift
+                            # the limit, so a late full fetch is not lost
+                            with self._lock:
+                                if download.limit_reached():
+                                    del self._downloads[download.url]
+                                    download._progress(truncated=True)
+                                    break
+                            continue
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        file.write(chunk)
+                        # Make the bytes visible to the player right away
+                        file.flush()
+                        received += len(chunk)
+                        download._progress(received=received)
+
+            if not (download.cancelled or download.truncated):
+                os.remove(marker)
+                download._progress(complete=True)
+        except Exception as e:
+            print(f"[ERROR] preview download: {e}")
+            download._progress(error=e)
+        finally:
+            with self._lock:
+                self.bytes_downloaded += received - start
+                if self._downloads.get(download.url) is download:
+                    del self._downloads[download.url]
+            self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Delete least recently used previews until under the cap."""
+        with self._lock:
+            active = {download.path for download in self._downloads.values()}
+        entries = []
+        total = 0
+        try:
+            scanned = list(os.scandir(self.directory))
+        except OSError:
+            return
+        names = {entry.name for entry in scanned}
+        for entry in scanned:
+            if entry.name.endswith(INCOMPLETE_SUFFIX):
+                continue
+            stat = entry.stat()
+            total += stat.st_size
+            incomplete = entry.name + INCOMPLETE_SUFFIX in names
+            if entry.path not in active:
+                # Leftovers of interrupted downloads go first
+                entries.append((not incomplete, stat.st_mtime, entry.path,
+                                stat.st_size))
+
+        for _, _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            self._remove(path + INCOMPLETE_SUFFIX)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+
+class PreviewPrefetcher(object):
+    """Warm the first bytes of a scene's previews in list order.
+
+    Runs at most ``concurrency`` prefetches at a time and stops once
+    ``budget`` bytes were requested. ``cancel`` stops the queue and every
+    prefetch still in progress; the partial files stay in the cache.
+    """
+
+    def __init__(self, cache=None, clip_bytes=PREFETCH_CLIP_BYTES,
+                 budget=PREFETCH_BUDGET, concurrency=PREFETCH_CONCURRENCY):
+        self.cache = cache or get_preview_cache()
+        self.clip_bytes = clip_bytes
+        self.budget = budget
+        self.concurrency = concurrency
+        self._queue = deque()
+        self._active = set()
+        self._threads = []
+        self._generation = 0
+        self._remaining = 0
+        self._lock = threading.Lock()
+
+    def start(self, urls):
+        """Cancel the previous scene and prefetch ``urls`` in order."""
+        self.cancel()
+        with self._lock:
+            self._queue.extend(urls)
+            self._remaining = self.budget
+            generation = self._generation
+            self._threads = [
+                threading.Thread(target=self._run, args=(generation,),
+                                 daemon=True)
+                for _ in range(min(self.concurrency, len(urls)))]
+            threads = list(self._threads)
+        for thread in threads:
+            thread.start()
+
+    def cancel(self):
+        """Stop prefetching the current scene."""
+        with self._lock:
+            self._generation += 1
+            self._queue.clear()
+            active = list(self._active)
+            self._active.clear()
+        for download in active:
+            # Leave downloads a player asked for in full alone
+            if download.max_bytes is not None:
+                download.cancel()
+
+    def _next(self, generation):
+        with self._lock:
+            if generation != self._generation or not self._queue:
+                return None
+            if self._remaining < self.clip_bytes:
+                self._queue.clear()
+                return None
+            self._remaining -= self.clip_bytes
+            return self._queue.popleft()
+
+    def _run(self, generation):
+        while True:
+            url = self._next(generation)
+            if url is None:
+                return
+            if self.cache.cached_path(url):
+                continue
+
+            download = self.cache.fetch(url, max_bytes=self.clip_bytes)
+            with self._lock:
+                if generation != self._generation:
+                    if download.max_bytes is not None:
+                        download.cancel()
+                    return
+                self._active.add(download)
+            download.wait_ready(self.clip_bytes)
+            with self._lock:
+                self._active.discard(download)
+
+
+_preview_cache = None
+_preview_cache_lock = threading.Lock()
+
+
+def get_preview_cache():
+    """Return the process-wide preview cache."""
+    global _preview_cache
+    with _preview_cache_lock:
+        if _preview_cache is None:
+            _preview_cache = PreviewCache()
+        return _preview_cache
@@ -0,0 +1,299 @@
+"""Module for caching ActionVFX API responses on disk.
+
+This module contains a small SQLite backed cache for JSON responses such as
+``/scenes/{id}/`` and ``/collections/{id}/products/``. Entries are keyed by
+URL and user, expire after a configurable TTL and are revalidated with
+``If-None-Match``/``If-Modified-Since`` once stale. The total size is capped
+and the least recently used entries are evicted first.
+
+Access times of cache hits are kept in memory and written in batches, so a
+hit does not commit to disk.
+"""
+# Standard modules import
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+
+
+# Constants
+CACHE_FILE = os.path.join(
+    os.path.expanduser("~"), ".actionvfx_cache", "api_responses.sqlite3")
+DEFAULT_TTL = 10 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Pending access times are written after this many seconds or hits
+ACCESS_FLUSH_INTERVAL = 30.0
+ACCESS_FLUSH_COUNT = 256
+
+# Response headers kept with every entry
+STORED_HEADERS = ("ETag", "Last-Modified", "Content-Type", "Date")
+# Headers a ``304 Not Modified`` updates
+REVALIDATED_HEADERS = ("ETag", "Last-Modified", "Date")
+
+
+def cache_key(url, user=None):
+    """Return the cache key for a URL requested by ``user``."""
+    return hashlib.sha1(f"{user or ''}\n{url}".encode("utf-8")).hexdigest()
+
+
+class CacheEntry(object):
+    """A cached response.
+
+    Attributes:
+        key (str): The cache key.
+        url (str): The requested URL.
+        headers (dict): The stored response headers.
+        body (bytes): The response body.
+        stored_at (float): Time the entry was stored or revalidated.
+    """
+
+    def __init__(self, key, url, headers, body, stored_at):
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+
+    def is_fresh(self, ttl, now=None):
+        """Return True if the entry is younger than ``ttl`` seconds."""
+        now = time.time() if now is None else now
+        return now - self.stored_at < ttl
+
+    def conditional_headers(self):
+        """Return the headers to revalidate this entry with the server."""
+        headers = {}
+        if self.headers.get("ETag"):
+            headers["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+
+class ResponseCache(object):
+    """Disk cache of API responses with TTL, size cap and LRU eviction."""
+
+    def __init__(self, path=CACHE_FILE, ttl=DEFAULT_TTL,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = None
+        # key -> last access time not yet written
+        self._accessed = {}
+        self._flushed_at = time.monotonic()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self.bytes_from_cache = 0
+        self.bytes_from_network = 0
+
+    def _connect(self):
+        """Open the database on first use."""
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " url TEXT NOT NULL,"
+                " headers TEXT NOT NULL,"
+                " body BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_lru"
+                " ON responses (last_access)")
+            self._db.commit()
+        return self._db
+
+    def configure(self, ttl=None, max_bytes=None):
+        """Change the TTL (seconds) and/or the size cap (bytes)."""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+                self._evict(self._connect())
+
+    def lookup(self, key):
+        """Return the entry stored under ``key`` or None."""
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT url, headers, body, stored_at FROM responses"
+                " WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= ACCESS_FLUSH_COUNT or \
+                    time.monotonic() - self._flushed_at > \
+                    ACCESS_FLUSH_INTERVAL:
+                self._flush_access(db)
+                db.commit()
+        url, headers, body, stored_at = row
+        return CacheEntry(key, url, json.loads(headers), bytes(body),
+                          stored_at)
+
+    def store(self, key, url, headers, body):
+        """Store a response body and its validators.
+
+        Args:
+            key (str): The cache key.
+            url (str): The requested URL.
+            headers: Mapping with the response headers.
+            body (bytes): The response body.
+        """
+        kept = {name: headers.get(name) for name in STORED_HEADERS
+                if headers.get(name)}
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, url, headers, body, size, stored_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, json.dumps(kept), sqlite3.Binary(body),
+                 len(body), now, now))
+            self._evict(db)
+            db.commit()
+
+    def refresh(self, key, headers=None):
+        """Mark an entry as fresh again after a ``304 Not Modified``.
+
+        Args:
+            key (str): The cache key.
+            headers: Mapping with the headers of the ``304``; the validators
+                it sends replace the stored ones.
+        """
+        now = time.time()
+        updated = {name: headers.get(name) for name in REVALIDATED_HEADERS
+                   if headers is not None and headers.get(name)}
+        with self._lock:
+            db = self._connect()
+            self._accessed.pop(key, None)
+            if updated:
+                row = db.execute("SELECT headers FROM responses WHERE key = ?",
+                                 (key,)).fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE responses SET headers = ? WHERE key = ?",
+                        (json.dumps(dict(json.loads(row[0]), **updated)),
+                         key))
+            db.execute(
+                "UPDATE responses SET stored_at = ?, last_access = ?"
+                " WHERE key = ?", (now, now, key))
+            db.commit()
+
+    def delete(self, key):
+        """Remove one entry."""
+        with self._lock:
+            self._accessed.pop(key, None)
+            db = self._connect()
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            db.commit()
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._accessed.clear()
+            db = self._connect()
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+    def size(self):
+        """Return the total size in bytes of the stored bodies."""
+        with self._lock:
+            return self._total_size(self._connect())
+
+    def record_hit(self, entry):
+        """Count a response served without touching the network."""
+        with self._lock:
+            self.hits += 1
+            self.bytes_from_cache += len(entry.body)
+
+    def record_revalidated(self, entry):
+        """Count a stale response confirmed by a ``304 Not Modified``."""
+        with self._lock:
+            self.revalidated += 1
+            self.bytes_from_cache += len(entry.body)
+
+    def record_miss(self, nbytes):
+        """Count a response downloaded in full."""
+        with self._lock:
+            self.misses += 1
+            self.bytes_from_network += nbytes
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        size = self.size()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "bytes_from_cache": self.bytes_from_cache,
+            "bytes_from_network": self.bytes_from_network,
+            "size": size,
+            "ttl": self.ttl,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            if self._db is not None:
+                self._flush_access(self._db)
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def _total_size(self, db):
+        return db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _flush_access(self, db):
+        """Write the pending access times; the caller commits."""
+        if self._accessed:
+            db.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+        self._flushed_at = time.monotonic()
+
+    def _evict(self, db):
+        """Drop least recently used entries until under ``max_bytes``."""
+        total = self._total_size(db)
+        if total <= self.max_bytes:
+            return
+        # The LRU order needs the access times of recent hits
+        self._flush_access(db)
+        rows = db.execute(
+            "SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
@@ -0,0 +1,202 @@
+"""Hover-scrub sprite sheets of clip previews.
+
+This module contains the extraction side of hover scrubbing. A sprite sheet
+is one JPEG holding ``frames`` evenly spaced frames of a preview side by
+side, each ``tile_width`` pixels wide, so a thumbnail can show the motion of
+a clip by drawing one tile of an image instead of opening a video stream.
+
+Sheets are built with OpenCV in a process pool, so extraction never holds
+the GIL of the host application. Inside Nuke ``sys.executable`` is the Nuke
+binary, so the workers are started with the Python interpreter shipped next
+to it; if none is found the pool falls back to threads.
+
+``cv2``, ``numpy`` and ``multiprocessing`` are only imported when the first
+sheet is built.
+"""
+# Standard modules import
+import os
+import sys
+import threading
+
+
+# Constants
+SPRITE_FRAMES = 12
+SPRITE_TILE_WIDTH = 160
+SPRITE_QUALITY = 80
+SPRITE_PROCESSES = 2
+
+
+def sprite_key(video_url, frames=SPRITE_FRAMES, tile_width=SPRITE_TILE_WIDTH):
+    """Return the cache key of the sprite sheet of ``video_url``."""
+    return f"{video_url}#sprite-{frames}x{tile_width}"
+
+
+def sprite_tile(fraction, frames=SPRITE_FRAMES):
+    """Return the tile shown at ``fraction`` (0 to 1) of a thumbnail."""
+    return min(frames - 1, max(0, int(fraction * frames)))
+
+
+def build_sprite_sheet(video_path, frames=SPRITE_FRAMES,
+                       tile_width=SPRITE_TILE_WIDTH, quality=SPRITE_QUALITY):
+    """Extract evenly spaced frames of a video into one JPEG sprite sheet.
+
+    Runs in a worker process.
+
+    Args:
+        video_path (str): Local path of the preview.
+        frames (int): Number of tiles.
+        tile_width (int): Width of each tile; the height keeps the aspect.
+        quality (int): JPEG quality.
+
+    Returns:
+        bytes: The encoded sheet, ``frames`` tiles in one row.
+    """
+    import cv2
+    import numpy as np
+
+    cap = cv2.VideoCapture(video_path)
+    tiles = []
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count <= 0:
+            # Containers without a frame count, count them once
+            while cap.grab():
+                count += 1
+            cap.release()
+            cap = cv2.VideoCapture(video_path)
+        for tile in range(frames):
+            index = int((tile + 0.5) * count / frames)
+            if index:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            tiles.append(frame)
+    finally:
+        cap.release()
+    if not tiles:
+        raise ValueError(f"No frames in video: {video_path}")
+
+    height, width = tiles[0].shape[:2]
+    tile_height = max(1, int(round(height * tile_width / width)))
+    sheet = np.empty((tile_height, tile_width * frames, 3), np.uint8)
+    for tile in range(frames):
+        # Short clips repeat their frames to fill every tile
+        frame = tiles[tile * len(tiles) // frames]
+        left = tile * tile_width
+        sheet[:, left:left + tile_width] = cv2.resize(
+            frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+
+    ok, data = cv2.imencode(".jpg", sheet,
+                            [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Could not encode the sprite sheet: {video_path}")
+    return data.tobytes()
+
+
+def python_executable():
+    """Return the Python interpreter for the worker processes, or None.
+
+    Inside Nuke ``sys.executable`` is the Nuke binary; the interpreter
+    ships in the same folder.
+    """
+    executable = sys.executable or ""
+    if os.path.basename(executable).lower().startswith("python"):
+        return executable
+    folder = os.path.dirname(executable)
+    for name in ("python.exe", "python3", "python"):
+        candidate = os.path.join(folder, name)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+class SpriteSheetBuilder(object):
+    """Build sprite sheets in a pool of worker processes.
+
+    The pool is started on the first build and shared by every caller.
+
+    Args:
+        processes (int): Worker processes.
+    """
+
+    def __init__(self, processes=SPRITE_PROCESSES):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # Counters
+        self.built = 0
+        self.failed = 0
+
+    def executor(self):
+        """Return the pool, starting it on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._start_pool()
+            return self._executor
+
+    def _start_pool(self):
+        executable = python_executable()
+        if executable is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            print("[WARNING] No Python interpreter for the sprite sheet "
+                  "workers, building them on threads")
+            return ThreadPoolExecutor(max_workers=self.processes,
+                                      thread_name_prefix="actionvfx-sprites")
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Spawned workers only import this module, never the host's UI
+        context = multiprocessing.get_context("spawn")
+        context.set_executable(executable)
+        return ProcessPoolExecutor(max_workers=self.processes,
+                                   mp_context=context)
+
+    def build(self, video_path, frames=SPRITE_FRAMES,
+              tile_width=SPRITE_TILE_WIDTH, quality=SPRITE_QUALITY):
+        """Build the sprite sheet of a local video, waiting for the result.
+
+        Returns:
+            bytes: The encoded sheet.
+        """
+        future = self.executor().submit(build_sprite_sheet, video_path,
+                                        frames, tile_width, quality)
+        try:
+            data = future.result()
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.built += 1
+        return data
+
+    def stats(self):
+        """Return the builder counters as a dictionary."""
+        with self._lock:
+            return {"built": self.built, "failed": self.failed}
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+_sprite_builder = None
+_sprite_builder_lock = threading.Lock()
+
+
+def get_sprite_builder():
+    """Return the process-wide sprite sheet builder."""
+    global _sprite_builder
+    with _sprite_builder_lock:
+        if _sprite_builder is None:
+            _sprite_builder = SpriteSheetBuilder()
+        return _sprite_builder
@@ -0,0 +1,243 @@
+"""Lightweight tracing of the plugin's slow paths.
+
+This module contains the span layer used to time sign in, API requests,
+image loading and preview playback. Tracing is off unless the
+``ACTIONVFX_TRACE`` environment variable is set to ``1``; while it is off a
+span is a shared no-op object, so instrumented code costs one attribute
+check.
+
+When it is on, every finished span is kept in a bounded buffer and added to
+a rolling per-name summary (count, mean, p50, p95, max). The buffer exports
+as Chrome trace JSON, to open in ``chrome://tracing`` or Perfetto; set
+``ACTIONVFX_TRACE_FILE`` to write it when Nuke exits::
+
+    ACTIONVFX_TRACE=1 ACTIONVFX_TRACE_FILE=/tmp/actionvfx.json nuke
+"""
+# Standard modules import
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+from collections import deque
+
+
+# Constants
+TRACE_ENV = "ACTIONVFX_TRACE"
+TRACE_FILE_ENV = "ACTIONVFX_TRACE_FILE"
+MAX_EVENTS = 100000
+SUMMARY_WINDOW = 512
+
+
+class Span(object):
+    """A timed section, recorded when the ``with`` block exits.
+
+    Use ``set`` to attach values known only inside the block, such as a
+    status code or a byte count.
+    """
+
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter(),
+                           self.category, **self.args)
+        return False
+
+
+class _NullSpan(object):
+    """Span returned while tracing is off."""
+
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """Collects spans from every thread.
+
+    Args:
+        enabled (bool): Record spans.
+        max_events (int): Spans kept for the Chrome trace, oldest dropped.
+        window (int): Durations per name kept for the summary percentiles.
+    """
+
+    def __init__(self, enabled=False, max_events=MAX_EVENTS,
+                 window=SUMMARY_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._events = deque(maxlen=max_events)
+        self._stats = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, category="plugin", **args):
+        """Return a context manager timing its block as ``name``."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def record(self, name, start, end, category="plugin", **args):
+        """Record a span measured by the caller.
+
+        Args:
+            name (str): Span name, e.g. ``"http.ttfb"``.
+            start (float): ``time.perf_counter()`` at the start.
+            end (float): ``time.perf_counter()`` at the end.
+            category (str): Chrome trace category.
+            **args: Values shown with the span.
+        """
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        duration = end - start
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+            self._events.append(
+                (name, category, start, duration, thread.ident, args))
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    "count": 0, "total": 0.0, "max": 0.0,
+                    "recent": deque(maxlen=self.window)}
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            stats["recent"].append(duration)
+
+    def summary(self):
+        """Return the rolling summary of every span name.
+
+        Returns:
+            dict: ``{name: {"count", "mean_ms", "p50_ms", "p95_ms",
+                "max_ms"}}``. Percentiles cover the last ``window`` spans.
+        """
+        with self._lock:
+            items = [(name, dict(stats, recent=sorted(stats["recent"])))
+                     for name, stats in self._stats.items()]
+        summary = {}
+        for name, stats in sorted(items):
+            recent = stats["recent"]
+            summary[name] = {
+                "count": stats["count"],
+                "mean_ms": round(1000.0 * stats["total"] / stats["count"],
+                                 3),
+                "p50_ms": round(1000.0 * recent[len(recent) // 2], 3),
+                "p95_ms": round(
+                    1000.0 * recent[min(len(recent) - 1,
+                                        int(len(recent) * 0.95))], 3),
+                "max_ms": round(1000.0 * stats["max"], 3),
+            }
+        return summary
+
+    def chrome_trace(self):
+        """Return the recorded spans in the Chrome trace event format."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                  "args": {"name": name}}
+                 for tid, name in threads.items()]
+        for name, category, start, duration, tid, args in events:
+            trace.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round(1e6 * (start - self._origin), 1),
+                "dur": round(1e6 * duration, 1),
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            })
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        """Write the Chrome trace JSON to ``path``."""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.chrome_trace(), file, default=str)
+
+    def clear(self):
+        """Drop every recorded span and the summary."""
+        with self._lock:
+            self._events.clear()
+            self._stats.clear()
+
+
+def traced(name, category="plugin"):
+    """Decorator timing every call of a function as ``name``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with Span(tracer, name, category, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the process-wide tracer, enabled by ``ACTIONVFX_TRACE``."""
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(
+                enabled=os.environ.get(TRACE_ENV, "") in ("1", "true"))
+            path = os.environ.get(TRACE_FILE_ENV)
+            if _tracer.enabled and path:
+                atexit.register(_export_at_exit, _tracer, path)
+        return _tracer
+
+
+def _export_at_exit(tracer, path):
+    try:
+        tracer.export_chrome_trace(path)
+        print(f"[INFO] Trace written to {path}")
+    except OSError as e:
+        print(f"[ERROR] Could not write the trace to {path}: {e}")
+
+
+def span(name, category="plugin", **args):
+    """Shortcut for ``get_tracer().span(...)``."""
+    return get_tracer().span(name, category, **args)
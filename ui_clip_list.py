@@ -0,0 +1,302 @@
+"""Virtualized list of the clips of a scene.
+
+This module contains the clip list of the detail views. Clips are rows of a
+``ClipListModel`` drawn by a ``ClipDelegate`` in a ``ClipListView``, so a
+scene with hundreds of clips costs no widget per clip: only the visible rows
+are painted, and a thumbnail is only requested from the image cache the
+first time its row is painted. The same model and view are reused for every
+scene.
+
+Hovering a row scrubs through the clip: the thumbnail is replaced by the
+tile of the clip's sprite sheet under the mouse. The sheet is requested
+from the sprite cache the first time the row is hovered; no video is
+opened on the GUI thread.
+"""
+# Third-party modules
+from functools import partial
+from PySide2 import QtWidgets, QtGui, QtCore
+
+# Local modules
+from api.sprite_sheets import sprite_tile
+from ui.image_cache import get_image_cache, get_sprite_cache
+
+
+# Size of the clip thumbnails
+THUMBNAIL_SIZE = QtCore.QSize(160, 90)
+NAME_HEIGHT = 20
+ROW_SPACING = 6
+
+# Colours of the clip rows
+ROW_COLOR = QtGui.QColor("#2D2D2D")
+SELECTED_COLOR = QtGui.QColor("#3ad1ff")
+PLACEHOLDER_COLOR = QtGui.QColor("#1E1E1E")
+TEXT_COLOR = QtGui.QColor("white")
+
+# Data roles of the clip dictionary and of its sprite sheet
+ClipRole = QtCore.Qt.UserRole
+SpriteRole = QtCore.Qt.UserRole + 1
+
+
+class ClipListModel(QtCore.QAbstractListModel):
+    """Clips of the current scene.
+
+    Each clip is the dictionary built by ``populate_ui_from_scene``, with
+    ``name``, ``video``, ``poster``, ``thumbnail`` and ``variants`` keys.
+    ``DecorationRole`` returns the clip thumbnail once it is in the memory
+    tier of the image cache and requests it otherwise; ``dataChanged`` is
+    emitted for its rows when it arrives. ``SpriteRole`` does the same with
+    the sprite sheet of the clip's preview.
+    """
+
+    def __init__(self, image_cache=None, sprite_cache=None, parent=None):
+        super(ClipListModel, self).__init__(parent)
+        self.image_cache = image_cache or get_image_cache()
+        self.sprite_cache = sprite_cache or get_sprite_cache()
+        self._clips = []
+        self._rows_by_thumbnail = {}
+        self._rows_by_video = {}
+        self._requested = set()
+        # Thumbnails of a previous scene arriving late are ignored
+        self._generation = 0
+
+    def set_clips(self, clips):
+        """Replace the clips; thumbnail requests in flight are forgotten."""
+        self.beginResetModel()
+        self._generation += 1
+        self._clips = list(clips)
+        self._requested = set()
+        self._rows_by_thumbnail = {}
+        self._rows_by_video = {}
+        for row, clip in enumerate(self._clips):
+            if clip.get("thumbnail"):
+                self._rows_by_thumbnail.setdefault(
+                    clip["thumbnail"], []).append(row)
+            if clip.get("video"):
+                self._rows_by_video.setdefault(clip["video"], []).append(row)
+        self.endResetModel()
+
+    def clip(self, row):
+        """Return the clip at ``row``, or None."""
+        if 0 <= row < len(self._clips):
+            return self._clips[row]
+        return None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._clips)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        clip = self.clip(index.row()) if index.isValid() else None
+        if clip is None:
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return clip.get("name", "")
+        if role == QtCore.Qt.ToolTipRole:
+            return clip.get("name", "")
+        if role == ClipRole:
+            return clip
+        if role == QtCore.Qt.DecorationRole:
+            return self.thumbnail(clip.get("thumbnail"))
+        if role == SpriteRole:
+            return self.sprite(clip.get("video"))
+        return None
+
+    def thumbnail(self, url):
+        """Return the cached thumbnail ``QImage`` of ``url``, or None after
+        requesting it."""
+        if not url:
+            return None
+        image = self.image_cache.cached(url, THUMBNAIL_SIZE)
+        if image is None and url not in self._requested:
+            self._requested.add(url)
+            self.image_cache.request(
+                url, THUMBNAIL_SIZE,
+                partial(self._on_thumbnail_loaded, self._generation, url),
+                partial(self._on_thumbnail_failed, self._generation, url))
+        return image
+
+    def sprite(self, video_url):
+        """Return the cached sprite sheet of ``video_url``, or None after
+        requesting it."""
+        if not video_url:
+            return None
+        sheet = self.sprite_cache.cached(video_url)
+        key = ("sprite", video_url)
+        if sheet is None and key not in self._requested:
+            self._requested.add(key)
+            self.sprite_cache.request(
+                video_url,
+                partial(self._on_sprite_loaded, self._generation, key),
+                partial(self._on_sprite_failed, self._generation, key))
+        return sheet
+
+    def _on_sprite_loaded(self, generation, key, sheet):
+        if generation != self._generation:
+            return
+        self._requested.discard(key)
+        for row in self._rows_by_video.get(key[1], []):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [SpriteRole])
+
+    def _on_sprite_failed(self, generation, key, message):
+        if generation != self._generation:
+            return
+        # Rows of a clip without a sheet keep their thumbnail
+        print(f"[WARNING] Clip sprite sheet {key[1]}: {message}")
+
+    def _on_thumbnail_loaded(self, generation, url, image):
+        if generation != self._generation:
+            return
+        # Requested again if the memory tier evicts it later
+        self._requested.discard(url)
+        for row in self._rows_by_thumbnail.get(url, []):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def _on_thumbnail_failed(self, generation, url, message):
+        if generation != self._generation:
+            return
+        # Kept in _requested so a broken thumbnail is not retried on every
+        # repaint of its row
+        print(f"[WARNING] Clip thumbnail {url}: {message}")
+
+
+class ClipDelegate(QtWidgets.QStyledItemDelegate):
+    """Paints a clip row: its thumbnail above its name.
+
+    The row under the mouse shows the tile of its sprite sheet instead of
+    the thumbnail, once the sheet is loaded.
+    """
+
+    def __init__(self, parent=None):
+        super(ClipDelegate, self).__init__(parent)
+        self.name_option = QtGui.QTextOption(QtCore.Qt.AlignCenter)
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(THUMBNAIL_SIZE.width() + 2 * ROW_SPACING,
+                            THUMBNAIL_SIZE.height() + NAME_HEIGHT
+                            + 2 * ROW_SPACING)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(0, 0, 0, -ROW_SPACING)
+        # Read from the view, QStyle.State flags do not convert to bool in
+        # every PySide2 build
+        view = option.widget
+        selected = view is not None and \
+            view.selectionModel().isSelected(index)
+        painter.fillRect(rect, SELECTED_COLOR if selected else ROW_COLOR)
+
+        thumbnail_rect = QtCore.QRect(
+            QtCore.QPoint(0, 0), THUMBNAIL_SIZE)
+        thumbnail_rect.moveCenter(QtCore.QPoint(
+            rect.center().x(),
+            rect.top() + ROW_SPACING + THUMBNAIL_SIZE.height() // 2))
+        sheet = None
+        if view is not None and getattr(view, "hover_row", -1) == index.row():
+            sheet = index.data(SpriteRole)
+        image = index.data(QtCore.Qt.DecorationRole)
+        if isinstance(sheet, QtGui.QImage) and not sheet.isNull():
+            source = index.model().sprite_cache.tile_rect(
+                sheet, view.hover_fraction)
+            size = source.size().scaled(THUMBNAIL_SIZE,
+                                        QtCore.Qt.KeepAspectRatio)
+            target = QtCore.QRect(QtCore.QPoint(0, 0), size)
+            target.moveCenter(thumbnail_rect.center())
+            painter.drawImage(target, sheet, source)
+        elif isinstance(image, QtGui.QImage) and not image.isNull():
+            # The image cache already scaled it to fit THUMBNAIL_SIZE
+            target = QtCore.QRect(QtCore.QPoint(0, 0), image.size())
+            target.moveCenter(thumbnail_rect.center())
+            painter.drawImage(target, image)
+        else:
+            painter.fillRect(thumbnail_rect, PLACEHOLDER_COLOR)
+
+        font = QtGui.QFont(option.font)
+        font.setPixelSize(10)
+        painter.setFont(font)
+        painter.setPen(TEXT_COLOR)
+        text_rect = QtCore.QRect(rect.left(), thumbnail_rect.bottom(),
+                                 rect.width(), NAME_HEIGHT)
+        name = QtGui.QFontMetrics(font).elidedText(
+            index.data(QtCore.Qt.DisplayRole) or "", QtCore.Qt.ElideRight,
+            rect.width() - 2 * ROW_SPACING)
+        painter.drawText(QtCore.QRectF(text_rect), name, self.name_option)
+        painter.restore()
+
+
+class ClipListView(QtWidgets.QListView):
+    """List view of a ``ClipListModel``.
+
+    Signals:
+        clipActivated (int): Row of the clip the user selected.
+
+    Attributes:
+        hover_row (int): Row under the mouse, -1 if none.
+        hover_fraction (float): Position of the mouse across the hovered
+            thumbnail, from 0 to 1.
+    """
+
+    clipActivated = QtCore.Signal(int)
+
+    def __init__(self, parent=None):
+        super(ClipListView, self).__init__(parent)
+        self.setModel(ClipListModel(parent=self))
+        self.setItemDelegate(ClipDelegate(self))
+        # Every row has the same size, the view only lays out what it shows
+        self.setUniformItemSizes(True)
+        self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setMinimumWidth(THUMBNAIL_SIZE.width() + 4 * ROW_SPACING)
+        self.setStyleSheet("QListView { background-color: #232323; }")
+        self.clicked.connect(self._on_clicked)
+
+        # Hover scrubbing
+        self.setMouseTracking(True)
+        self.hover_row = -1
+        self.hover_fraction = 0.0
+
+    def set_clips(self, clips):
+        """Show ``clips``, with the list scrolled back to the top."""
+        self.hover_row = -1
+        self.model().set_clips(clips)
+        self.scrollToTop()
+
+    def clip(self, row):
+        """Return the clip at ``row``, or None."""
+        return self.model().clip(row)
+
+    def mouseMoveEvent(self, event):
+        super(ClipListView, self).mouseMoveEvent(event)
+        index = self.indexAt(event.pos())
+        row = index.row() if index.isValid() else -1
+        fraction = 0.0
+        if row >= 0:
+            left = self.visualRect(index).center().x() \
+                - THUMBNAIL_SIZE.width() / 2.0
+            fraction = min(1.0, max(
+                0.0, (event.pos().x() - left) / THUMBNAIL_SIZE.width()))
+        self._set_hover(row, fraction)
+
+    def leaveEvent(self, event):
+        self._set_hover(-1, 0.0)
+        super(ClipListView, self).leaveEvent(event)
+
+    def _set_hover(self, row, fraction):
+        """Repaint the rows whose scrub tile changed."""
+        frames = self.model().sprite_cache.frames
+        if row == self.hover_row and sprite_tile(fraction, frames) == \
+                sprite_tile(self.hover_fraction, frames):
+            return
+        previous = self.hover_row
+        self.hover_row = row
+        self.hover_fraction = fraction
+        for changed in {previous, row}:
+            if changed >= 0:
+                self.update(self.model().index(changed))
+
+    def _on_clicked(self, index):
+        if index.isValid():
+            self.clipActivated.emit(index.row())
@@ -0,0 +1,207 @@
+"""Download queue view for the ActionVFX dashboard.
+
+This module contains the Qt model and widget showing the persistent download
+queue of ``api.download_queue``: one row per job with its state, progress,
+speed and ETA, and controls for pausing, resuming, cancelling, priorities,
+the number of parallel downloads and the bandwidth limit.
+"""
+# Third-party modules
+from PySide2 import QtWidgets, QtCore
+
+# Local modules
+from api.download_queue import get_download_queue, RUNNING, FINISHED_STATES
+
+
+def format_bytes(nbytes):
+    """Return a size in MB or GB."""
+    if nbytes >= 1024 ** 3:
+        return f"{nbytes / 1024 ** 3:.1f} GB"
+    return f"{nbytes / 1024 ** 2:.0f} MB"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class QueueSignals(QtCore.QObject):
+    """Forwards queue notifications from worker threads to the GUI."""
+    jobChanged = QtCore.Signal(object)
+
+
+class DownloadQueueModel(QtCore.QAbstractTableModel):
+    """Table model of the download queue."""
+
+    COLUMNS = ("Name", "Status", "Progress", "Speed", "ETA", "Priority")
+
+    def __init__(self, queue=None, parent=None):
+        super(DownloadQueueModel, self).__init__(parent)
+        self.queue = queue or get_download_queue()
+        self.jobs = self.queue.snapshot()
+
+        self.signals = QueueSignals(self)
+        self.signals.jobChanged.connect(self.on_job_changed)
+        listener = self.signals.jobChanged.emit
+        self.queue.add_listener(listener)
+        # The queue outlives the dashboard, stop notifying a deleted model
+        queue = self.queue
+        self.destroyed.connect(lambda: queue.remove_listener(listener))
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.jobs)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and \
+                role == QtCore.Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        job = self.jobs[index.row()]
+        if role == QtCore.Qt.UserRole:
+            return job.job_id
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        column = index.column()
+        if column == 0:
+            return job.name
+        if column == 1:
+            return job.error if job.error else job.state.capitalize()
+        if column == 2:
+            if job.total:
+                return (f"{job.fraction * 100:.0f}% "
+                        f"({format_bytes(job.done)}/{format_bytes(job.total)})")
+            return format_bytes(job.done)
+        if column == 3:
+            if job.state == RUNNING:
+                return f"{job.speed / 1024 ** 2:.1f} MB/s"
+            return ""
+        if column == 4:
+            return format_eta(job.eta) if job.state == RUNNING else ""
+        if column == 5:
+            return str(job.priority)
+        return None
+
+    def job_at(self, row):
+        return self.jobs[row] if 0 <= row < len(self.jobs) else None
+
+    def on_job_changed(self, job):
+        row = self.jobs.index(job) if job in self.jobs else -1
+        if row < 0 or len(self.jobs) != len(self.queue.jobs):
+            # A job was added or removed
+            self.beginResetModel()
+            self.jobs = self.queue.snapshot()
+            self.endResetModel()
+            return
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, len(self.COLUMNS) - 1))
+
+
+class DownloadQueueWidget(QtWidgets.QWidget):
+    """Queue view with job controls and queue settings."""
+
+    def __init__(self, queue=None, parent=None):
+        super(DownloadQueueWidget, self).__init__(parent)
+        self.queue = queue or get_download_queue()
+        self.model = DownloadQueueModel(self.queue, self)
+
+        layout = QtWidgets.QVBoxLayout(self)
+
+        title = QtWidgets.QLabel("Downloads")
+        title.setStyleSheet(
+            "font-size: 18px; font-weight: bold; color: white;")
+        layout.addWidget(title)
+
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(
+            QtWidgets.QAbstractItemView.SingleSelection)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setSectionResizeMode(
+            0, QtWidgets.QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        layout.addWidget(self.table)
+
+        # Job controls
+        controls_layout = QtWidgets.QHBoxLayout()
+        for text, slot in (("Pause", self.pause_selected),
+                           ("Resume", self.resume_selected),
+                           ("Cancel", self.cancel_selected),
+                           ("Remove", self.remove_selected),
+                           ("Priority +", lambda: self.bump_priority(1)),
+                           ("Priority -", lambda: self.bump_priority(-1))):
+            button = QtWidgets.QPushButton(text)
+            button.clicked.connect(slot)
+            controls_layout.addWidget(button)
+        controls_layout.addStretch()
+        layout.addLayout(controls_layout)
+
+        # Queue settings
+        settings_layout = QtWidgets.QHBoxLayout()
+        settings_layout.addWidget(QtWidgets.QLabel("Parallel downloads:"))
+        self.concurrent_spin = QtWidgets.QSpinBox()
+        self.concurrent_spin.setRange(1, 8)
+        self.concurrent_spin.setValue(self.queue.max_concurrent)
+        self.concurrent_spin.valueChanged.connect(
+            self.queue.set_max_concurrent)
+        settings_layout.addWidget(self.concurrent_spin)
+
+        settings_layout.addWidget(QtWidgets.QLabel("Bandwidth limit:"))
+        self.bandwidth_spin = QtWidgets.QDoubleSpinBox()
+        self.bandwidth_spin.setRange(0, 10000)
+        self.bandwidth_spin.setSuffix(" MB/s")
+        self.bandwidth_spin.setSpecialValueText("Unlimited")
+        self.bandwidth_spin.setValue(self.queue.throttle.rate / 1024 ** 2)
+        self.bandwidth_spin.valueChanged.connect(
+            lambda value: self.queue.set_bandwidth_limit(
+                int(value * 1024 ** 2)))
+        settings_layout.addWidget(self.bandwidth_spin)
+        settings_layout.addStretch()
+        layout.addLayout(settings_layout)
+
+        # Back button
+        self.back_button = QtWidgets.QPushButton("Back")
+        self.back_button.setStyleSheet(
+            "background-color: gray; color: white; padding: 6px;")
+        layout.addWidget(self.back_button)
+
+    def selected_job(self):
+        rows = self.table.selectionModel().selectedRows()
+        return self.model.job_at(rows[0].row()) if rows else None
+
+    def pause_selected(self):
+        job = self.selected_job()
+        if job:
+            self.queue.pause(job.job_id)
+
+    def resume_selected(self):
+        job = self.selected_job()
+        if job:
+            self.queue.resume(job.job_id)
+
+    def cancel_selected(self):
+        job = self.selected_job()
+        if job:
+            self.queue.cancel(job.job_id)
+
+    def remove_selected(self):
+        job = self.selected_job()
+        if job and job.state in FINISHED_STATES:
+            self.queue.remove(job.job_id)
+
+    def bump_priority(self, step):
+        job = self.selected_job()
+        if job:
+            self.queue.set_priority(job.job_id, job.priority + step)
@@ -0,0 +1,146 @@
+"""Hover scrubbing of thumbnail widgets.
+
+This module contains the event filter that lets a thumbnail, a ``QLabel``
+showing a pixmap or a ``QAbstractButton`` showing an icon, scrub through its
+clip on mouse hover. The thumbnail is replaced by the tile of the clip's
+sprite sheet under the mouse and restored when the mouse leaves; the sheet
+comes from the sprite cache, so no video is opened.
+
+The detail view installs it on its preview label, which scrubs the selected
+clip while no preview is playing. The clip list of the detail view scrubs
+through its own delegate, see ``ui.ui_clip_list``.
+"""
+# Standard modules import
+from functools import partial
+
+# Third-party modules
+from PySide2 import QtWidgets, QtGui, QtCore
+
+# Local modules
+from api.sprite_sheets import sprite_tile
+from ui.image_cache import get_sprite_cache
+
+
+class HoverScrubFilter(QtCore.QObject):
+    """Scrub a thumbnail widget through the sprite sheet of a preview.
+
+    The filter is parented to the widget and removed with it. The sheet is
+    requested the first time the mouse enters the widget, unless it was
+    prefetched.
+
+    Args:
+        widget (QtWidgets.QWidget): A ``QLabel`` or ``QAbstractButton``.
+        video_url (str): URL or local path of the clip preview, or None to
+            not scrub until ``set_video_url``.
+        sprite_cache (SpriteSheetCache): Cache of the sprite sheets.
+    """
+
+    def __init__(self, widget, video_url, sprite_cache=None):
+        super(HoverScrubFilter, self).__init__(widget)
+        self.widget = widget
+        self.video_url = video_url
+        self.sprite_cache = sprite_cache or get_sprite_cache()
+        self.sheet = None
+        self.active = True
+        self._original = None
+        self._hovering = False
+        self._tile = None
+        self._fraction = 0.0
+        widget.setMouseTracking(True)
+        widget.installEventFilter(self)
+
+    def set_video_url(self, video_url):
+        """Scrub through another clip; the current thumbnail is restored."""
+        if video_url == self.video_url:
+            return
+        hovering = self._hovering
+        self._leave()
+        self.video_url = video_url
+        self.sheet = None
+        if hovering and self.active:
+            self._enter()
+
+    def set_active(self, active):
+        """Turn scrubbing on or off, e.g. while a preview plays in the
+        widget; turning it off restores the thumbnail."""
+        if not active:
+            self._leave()
+        self.active = active
+
+    def eventFilter(self, watched, event):
+        if watched is self.widget and self.active and self.video_url:
+            event_type = event.type()
+            if event_type == QtCore.QEvent.Enter:
+                self._enter()
+            elif event_type == QtCore.QEvent.MouseMove and self._hovering:
+                self._fraction = event.pos().x() / max(1, self.widget.width())
+                self._show_tile()
+            elif event_type == QtCore.QEvent.Leave:
+                self._leave()
+        return super(HoverScrubFilter, self).eventFilter(watched, event)
+
+    def _enter(self):
+        self._hovering = True
+        self._tile = None
+        if isinstance(self.widget, QtWidgets.QAbstractButton):
+            self._original = self.widget.icon()
+        else:
+            # pixmap() points at the label's own pixmap, keep a copy
+            pixmap = self.widget.pixmap()
+            self._original = QtGui.QPixmap(pixmap) if pixmap else None
+        if self.sheet is None:
+            self.sprite_cache.request(
+                self.video_url,
+                partial(self._on_sheet_loaded, self.video_url),
+                partial(self._on_sheet_failed, self.video_url))
+
+    def _leave(self):
+        if not self._hovering:
+            return
+        self._hovering = False
+        if self._tile is None:
+            return
+        self._tile = None
+        if isinstance(self.widget, QtWidgets.QAbstractButton):
+            self.widget.setIcon(self._original)
+        elif self._original is not None:
+            self.widget.setPixmap(self._original)
+        self._original = None
+
+    def _show_tile(self):
+        if self.sheet is None:
+            return
+        tile = sprite_tile(self._fraction, self.sprite_cache.frames)
+        if tile == self._tile:
+            return
+        self._tile = tile
+        pixmap = QtGui.QPixmap.fromImage(self.sheet.copy(
+            self.sprite_cache.tile_rect(self.sheet, self._fraction)))
+        if isinstance(self.widget, QtWidgets.QAbstractButton):
+            self.widget.setIcon(QtGui.QIcon(pixmap))
+            return
+        # Keep the size of the thumbnail the label was showing
+        size = self._original.size() if self._original is not None \
+            else self.widget.size()
+        self.widget.setPixmap(pixmap.scaled(
+            size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation))
+
+    def _on_sheet_loaded(self, video_url, sheet):
+        # Ignore sheets of a clip the widget no longer shows
+        if video_url != self.video_url:
+            return
+        self.sheet = sheet
+        if self._hovering:
+            self._show_tile()
+
+    def _on_sheet_failed(self, video_url, message):
+        print(f"[WARNING] Sprite sheet {video_url}: {message}")
+
+
+def install_hover_scrub(widget, video_url, sprite_cache=None):
+    """Make ``widget`` scrub through ``video_url`` on hover.
+
+    Returns:
+        HoverScrubFilter: The installed filter.
+    """
+    return HoverScrubFilter(widget, video_url, sprite_cache)
@@ -1,29 +1,65 @@
 
 
 # Third-party modules
-import urllib.request
-import json
+import math
+import time
+from collections import deque
 from functools import partial
-import cv2
-import numpy as np
 from PySide2 import QtWidgets, QtGui, QtCore
 
 # Local modules
-from api.auth import load_session
+from api.api_request import api_url, get_cached_json, fetch_scene
+from api.catalog import records_of
+from api.preview_cache import get_preview_cache, PreviewPrefetcher
+from api.tracing import get_tracer, traced
+from ui.ui_workers import RequestRunner
+from ui.image_cache import get_image_cache, get_sprite_cache
+from ui.ui_hover_scrub import install_hover_scrub
+from ui.video_player import (
+    DecoderThread, PlaybackClock, get_capture_pool, get_frame_cache)
+from ui.ui_clip_list import ClipListView
+
+
+# Qt >= 5.14 can wrap OpenCV's BGR frames without a colour conversion
+BGR_FORMAT = getattr(QtGui.QImage, "Format_BGR888", None)
+
+# How often playback checks for frames while the preview buffers, in ms
+BUFFERING_POLL_MS = 5
 
 
 class ItemDetailWidget(QtWidgets.QScrollArea):
     def __init__(self, parent=None):
         super(ItemDetailWidget, self).__init__(parent)
 
-        self.cap = None
+        self.decoder = None
         self.video_url = None
+        # When the current preview was started, for the first frame span
+        self.video_started_at = None
+        # QScrollArea sends its widget's events to eventFilter as soon as
+        # setWidget() is called, before the preview label exists
+        self.video_label = None
+        # Frames are scheduled one at a time against the playback clock
+        self.clock = PlaybackClock()
         self.video_timer = QtCore.QTimer()
+        self.video_timer.setSingleShot(True)
+        self.video_timer.setTimerType(QtCore.Qt.PreciseTimer)
         self.video_timer.timeout.connect(self.play_video_frame)
+        # Late frames the GUI did not show, and when the last ones were shown
+        self.frames_dropped = 0
+        self.shown_times = deque()
 
         self.video_path_list = []
-        self.selected_button = None
-        self.button_list = []
+        self.is_pro_user = False
+
+        # Scene/collection requests run off the GUI thread
+        self.request_runner = RequestRunner(parent=self)
+
+        # Warms the start of every clip preview of the current scene
+        self.prefetcher = PreviewPrefetcher()
+
+        # Posters and thumbnails are decoded off the GUI thread
+        self.image_cache = get_image_cache()
+        self.poster_url = None
 
         self.scroll_content = QtWidgets.QWidget()
         self.setWidget(self.scroll_content)
@@ -49,16 +85,24 @@ class ItemDetailWidget(QtWidgets.QScrollArea):
         self.video_label.setMinimumSize(640, 360)
         self.video_label.setAlignment(QtCore.Qt.AlignCenter)
         self.video_label.setStyleSheet("background-color: black;")
+        self.video_label.installEventFilter(self)
         self.left_layout.addWidget(self.video_label)
+        # Hovering the stopped preview scrubs through the selected clip
+        self.hover_scrub = install_hover_scrub(self.video_label, None)
 
-        self.right_scroll = QtWidgets.QScrollArea()
-        self.right_scroll.setWidgetResizable(True)
-        self.thumbnail_container = QtWidgets.QWidget()
-        self.thumbnail_layout = QtWidgets.QVBoxLayout(self.thumbnail_container)
-        self.right_scroll.setWidget(self.thumbnail_container)
+        # Playback rate overlay, shown with the fps button
+        self.fps_overlay = QtWidgets.QLabel(self.video_label)
+        self.fps_overlay.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 160); color: white; "
+            "font-size: 10px; padding: 2px 4px;")
+        self.fps_overlay.move(8, 8)
+        self.fps_overlay.hide()
+
+        # Clip thumbnails, only the visible rows are painted and loaded
+        self.clip_list = ClipListView()
 
         self.horizontal_layout.addWidget(self.left_widget, stretch=4)
-        self.horizontal_layout.addWidget(self.right_scroll, stretch=1)
+        self.horizontal_layout.addWidget(self.clip_list, stretch=1)
         self.main_layout.addLayout(self.horizontal_layout)
 
         # Play/Pause/Stop controls
@@ -69,12 +113,29 @@ class ItemDetailWidget(QtWidgets.QScrollArea):
             btn.setFixedSize(40, 40)
             btn.setStyleSheet(
                 "font-size: 18px; background-color: #3ad1ff; color: white; border-radius: 5px;")
+        self.loop_btn = QtWidgets.QPushButton("⟳")
+        self.loop_btn.setCheckable(True)
+        self.loop_btn.setChecked(True)
+        self.loop_btn.setFixedSize(40, 40)
+        self.loop_btn.setToolTip("Loop the preview")
+        self.fps_btn = QtWidgets.QPushButton("fps")
+        self.fps_btn.setCheckable(True)
+        self.fps_btn.setFixedSize(40, 40)
+        self.fps_btn.setToolTip("Show the playback frame rate")
+        for btn, font_size in [(self.loop_btn, 18), (self.fps_btn, 11)]:
+            btn.setStyleSheet(
+                f"QPushButton {{ font-size: {font_size}px; "
+                "background-color: #3E3E3E; color: white; "
+                "border-radius: 5px; } "
+                "QPushButton:checked { background-color: #3ad1ff; }")
 
         controls_layout = QtWidgets.QHBoxLayout()
         controls_layout.addStretch()
         controls_layout.addWidget(self.play_btn)
         controls_layout.addWidget(self.pause_btn)
         controls_layout.addWidget(self.stop_btn)
+        controls_layout.addWidget(self.loop_btn)
+        controls_layout.addWidget(self.fps_btn)
         controls_layout.addStretch()
         self.main_layout.addLayout(controls_layout)
 
@@ -96,6 +157,21 @@ class ItemDetailWidget(QtWidgets.QScrollArea):
         self.play_btn.clicked.connect(self.start_video)
         self.pause_btn.clicked.connect(self.pause_video)
         self.stop_btn.clicked.connect(self.stop_video)
+        self.fps_btn.toggled.connect(self.show_fps_overlay)
+        self.back_button.clicked.connect(self.cancel_requests)
+
+    def eventFilter(self, watched, event):
+        # Frames are decoded at the preview size, update it on resize only
+        if watched is self.video_label and \
+                event.type() == QtCore.QEvent.Resize and self.decoder:
+            size = event.size()
+            self.decoder.set_target_size(size.width(), size.height())
+        return super(ItemDetailWidget, self).eventFilter(watched, event)
+
+    def selected_variant(self):
+        """Return the variant selected in the resolution combo, or None."""
+        variant = self.variant_combo.currentData(QtCore.Qt.UserRole)
+        return variant if isinstance(variant, dict) else None
 
     def clear_layout(self, layout):
         while layout.count():
@@ -103,42 +179,97 @@ class ItemDetailWidget(QtWidgets.QScrollArea):
             if child.widget():
                 child.widget().deleteLater()
 
+    def fetch_json(self, url, on_result, label):
+        """Request ``url`` on a worker thread and pass the JSON to a slot.
+
+        Any request still in flight for this widget is discarded.
+
+        Args:
+            url (str): The API URL to request.
+            on_result (callable): Called on the GUI thread with the data.
+            label (str): Name used in error messages.
+        """
+        self.fetch(get_cached_json, url, on_result=on_result, label=label)
+
+    def fetch_scene(self, scene_id, on_result, label):
+        """Like ``fetch_json`` for a scene, shared with other requests for
+        the same scene still in flight."""
+        self.fetch(fetch_scene, scene_id, on_result=on_result, label=label)
+
+    def fetch(self, fn, *args, on_result, label):
+        self.video_label.setText("Loading preview...")
+        self.request_runner.start(
+            fn, *args,
+            on_result=on_result,
+            on_error=lambda message: print(f"[ERROR] {label}: {message}"))
+
+    def cancel_requests(self):
+        """Discard the scene/collection request, preview prefetches and
+        sprite sheets still waiting for their preview."""
+        self.request_runner.cancel()
+        self.prefetcher.cancel()
+        get_sprite_cache().cancel_prefetch()
+
     def load_image(self, poster_url):
-        session = load_session()
-        token = session.get("Authorization", "")
-        token = token if not token.startswith("Bearer ") else token
-        headers = {"Authorization": token, "User-Agent": "Mozilla/5.0"}
+        """Show the poster, scaled to the preview size, from the cache."""
+        self.poster_url = poster_url
+        self.image_cache.request(
+            poster_url, self.video_label.size(),
+            partial(self.on_poster_loaded, poster_url),
+            partial(self.on_poster_failed, poster_url))
+
+    def on_poster_loaded(self, poster_url, image):
+        # Ignore posters of items the user already left
+        if poster_url != self.poster_url:
+            return
+        self.video_label.setPixmap(QtGui.QPixmap.fromImage(image))
 
-        try:
-            request = urllib.request.Request(poster_url, headers=headers)
-            with urllib.request.urlopen(request) as response:
-                data = response.read()
-                image = QtGui.QImage()
-                image.loadFromData(data)
-                pixmap = QtGui.QPixmap.fromImage(image)
-                self.video_label.setPixmap(pixmap.scaled(
-                    self.video_label.size(),
-                    QtCore.Qt.KeepAspectRatio,
-                    QtCore.Qt.SmoothTransformation
-                ))
-        except Exception as e:
-            self.video_label.setText(f"Error al cargar imagen:\n{e}")
+    def on_poster_failed(self, poster_url, message):
+        if poster_url != self.poster_url:
+            return
+        self.video_label.setText(f"Error al cargar imagen:\n{message}")
 
+    @traced("video.start", "video")
     def start_video(self):
         if not self.video_url:
             return
 
+        # Resume a paused preview instead of opening it again
+        decoder = self.decoder
+        if (decoder and decoder.video_url == self.video_url
+                and not decoder.is_exhausted() and decoder.error is None):
+            if not self.video_timer.isActive():
+                self.clock.resume()
+                self.video_timer.start(0)
+            return
+
         try:
             # Stop previous video
             self.stop_video()
-
-            self.cap = cv2.VideoCapture(self.video_url)
-            if not self.cap.isOpened():
-                raise Exception("Could not open video")
-
-            fps = self.cap.get(cv2.CAP_PROP_FPS)
-            delay = int(1000 / fps) if fps > 0 else 33
-            self.video_timer.start(delay)
+            self.hover_scrub.set_active(False)
+
+            # The capture is opened and read on the decoder thread
+            # Remote previews play from the local proxy cache
+            download = None
+            if self.video_url.startswith(("http://", "https://")):
+                download = get_preview_cache().fetch(self.video_url)
+
+            size = self.video_label.size()
+            self.video_started_at = time.perf_counter()
+            self.frames_dropped = 0
+            self.shown_times.clear()
+            # The clock starts with the first frame, once the fps is known.
+            # Replays reuse the open capture or the decoded frames
+            self.decoder = DecoderThread(
+                self.video_url,
+                target_size=(size.width(), size.height()),
+                convert_rgb=BGR_FORMAT is None,
+                download=download,
+                clock=self.clock,
+                capture_pool=get_capture_pool(),
+                frame_cache=get_frame_cache())
+            self.decoder.start()
+            self.video_timer.start(BUFFERING_POLL_MS)
 
         except Exception as e:
             print(f"[ERROR] start_video: {e}")
@@ -146,32 +277,118 @@ class ItemDetailWidget(QtWidgets.QScrollArea):
 
     def pause_video(self):
         self.video_timer.stop()
+        self.clock.pause()
 
     def stop_video(self):
         self.video_timer.stop()
-        if self.cap:
-            self.cap.release()
-            self.cap = None
+        self.clock.reset()
+        if self.decoder:
+            self.decoder.stop()
+            self.decoder = None
+        self.hover_scrub.set_active(True)
+
+    def schedule_frame(self, index):
+        """Run ``play_video_frame`` when frame ``index`` is due."""
+        wait = self.clock.time_until(index)
+        self.video_timer.start(max(0, math.ceil(1000 * wait)))
+
+    def achieved_fps(self):
+        """Return the frames shown per second over the last second."""
+        times = self.shown_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def dropped_frames(self):
+        """Return the late frames dropped by the GUI or skipped by the
+        decoder for the current preview."""
+        skipped = self.decoder.frames_skipped if self.decoder else 0
+        return self.frames_dropped + skipped
+
+    def show_fps_overlay(self, visible):
+        self.fps_overlay.setVisible(visible)
+        if visible:
+            self.update_fps_overlay()
+            self.fps_overlay.raise_()
+
+    def update_fps_overlay(self):
+        fps = self.decoder.fps if self.decoder else self.clock.fps
+        self.fps_overlay.setText(
+            f"{self.achieved_fps():.1f} / {fps:.1f} fps, "
+            f"{self.dropped_frames()} dropped")
+        self.fps_overlay.adjustSize()
 
     def play_video_frame(self):
-        if not self.cap:
+        if not self.decoder:
             return
 
-        ret, frame = self.cap.read()
-        if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = frame.shape
-            bytes_per_line = ch * w
-            qimage = QtGui.QImage(
-                frame.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-            pixmap = QtGui.QPixmap.fromImage(qimage)
-            self.video_label.setPixmap(pixmap.scaled(
-                self.video_label.size(),
-                QtCore.Qt.KeepAspectRatio,
-                QtCore.Qt.SmoothTransformation
-            ))
-        else:
+        if self.decoder.error is not None:
+            print(f"[ERROR] start_video: {self.decoder.error}")
+            self.video_label.setText(" Error in loading video")
             self.stop_video()
+            return
+
+        decoder = self.decoder
+        clock = self.clock
+        ring = decoder.ring
+        if ring.peek() is None:
+            # Still buffering, or the clip ended
+            if decoder.is_exhausted():
+                self.stop_video()
+                if self.loop_btn.isChecked():
+                    self.start_video()
+                return
+            if clock.running and decoder.stalled:
+                # Waiting for the download, hold the clock so playback
+                # carries on from here instead of skipping what it missed
+                clock.pause()
+            self.video_timer.start(BUFFERING_POLL_MS)
+            return
+
+        if not clock.started:
+            # The decoder opened the clip, its fps is known now
+            clock.start(ring.peek()[0], decoder.fps)
+        elif not clock.running:
+            clock.resume()
+
+        index = ring.peek()[0]
+        if clock.time_until(index) > 0:
+            self.schedule_frame(index)
+            return
+
+        # Show the latest frame that is due, drop the older late ones
+        due = clock.due_index()
+        index, frame = ring.pop()
+        while True:
+            queued = ring.peek()
+            if queued is None or queued[0] > due:
+                break
+            index, frame = ring.pop()
+            self.frames_dropped += 1
+
+        # The frame is already display sized, wrap it without a copy
+        tracer = get_tracer()
+        with tracer.span("video.display_frame", "video"):
+            h, w, ch = frame.shape
+            bytes_per_line = frame.strides[0]
+            image_format = BGR_FORMAT or QtGui.QImage.Format_RGB888
+            qimage = QtGui.QImage(frame.data, w, h, bytes_per_line,
+                                  image_format)
+            self.video_label.setPixmap(QtGui.QPixmap.fromImage(qimage))
+        now = time.perf_counter()
+        if self.video_started_at is not None:
+            tracer.record("video.first_frame", self.video_started_at, now,
+                          "video", url=self.video_url)
+            self.video_started_at = None
+
+        self.shown_times.append(now)
+        while now - self.shown_times[0] > 1.0:
+            self.shown_times.popleft()
+        if self.fps_overlay.isVisible():
+            self.update_fps_overlay()
+
+        queued = ring.peek()
+        self.schedule_frame(queued[0] if queued else index + 1)
 
 
 # ---------- SUBCLASSES FOR SPECIALIZED VIEWS ----------
@@ -179,6 +396,7 @@ class ItemDetailWidget(QtWidgets.QScrollArea):
 class FreeFootageDetailWidget(ItemDetailWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.clip_list.clipActivated.connect(self.on_clip_activated)
 
     def load_scene(self, scene_id):
         """Load a scene by its ID and populate the UI.
@@ -188,39 +406,22 @@ class FreeFootageDetailWidget(ItemDetailWidget):
 
         """
 
-        session = load_session()
-        token = session.get("Authorization", "")
-        token = token if token.startswith("Bearer ") else f"Bearer {token}"
-        headers = {"User-Agent": "MyApp/1.0", "Authorization": token}
+        print(f"[INFO] Requesting scene: {scene_id}")
+        self.fetch_scene(scene_id, self.on_scene_loaded, "load_scene")
 
-        try:
-            # Request the scene with the given ID incluiding header
-            url = f"https://backend.actionvfx.com/api/v1/scenes/{scene_id}/"
-            print(f"[INFO] Requesting scene: {url}")
-            req = urllib.request.Request(url, headers=headers, method="GET")
-            with urllib.request.urlopen(req) as response:
-                if response.getcode() == 200:
-                    scene_data = json.loads(response.read().decode("utf-8"))
-
-                    is_pro_user = scene_data.get("free_for_subscriber", False)
-                    self.populate_ui_from_scene(scene_data, is_pro_user)
-                else:
-                    print(f"[ERROR] HTTP status: {response.getcode()}")
-        except Exception as e:
-            print(f"[ERROR] load_scene: {e}")
+    def on_scene_loaded(self, scene_data):
+        """Populate the UI once the scene request finished."""
+        is_pro_user = scene_data.get("free_for_subscriber", False)
+        self.populate_ui_from_scene(scene_data, is_pro_user)
 
+    @traced("ui.populate_scene", "ui")
     def populate_ui_from_scene(self, scene_data, is_pro_user):
-        self.clear_layout(self.thumbnail_layout)
+        self.is_pro_user = is_pro_user
         self.video_path_list = []
-        self.button_list = []
+        rows = []
         self.variant_combo.clear()
         self.variant_combo.addItem("Select Resolution")
 
-        session = load_session()
-        token = session.get("Authorization", "")
-        token = token if token.startswith("Bearer ") else f"Bearer {token}"
-        headers = {"Authorization": token, "User-Agent": "Mozilla/5.0"}
-
         clips = scene_data.get("clips", [])
 
         for i, clip in enumerate(clips):
@@ -245,9 +446,30 @@ class FreeFootageDetailWidget(ItemDetailWidget):
                 "variants": variants
             }
 
-    def on_thumbnail_clicked(self, button, item, is_pro_user):
+            rows.append(clip_data)
+            self.video_path_list.append(video_url)
+
+        # Rows and their thumbnails are only built when they are painted
+        self.clip_list.set_clips(rows)
+
+        # Warm the first seconds of each preview, in list order
+        remote_urls = [
+            url for url in self.video_path_list
+            if url and url.startswith(("http://", "https://"))]
+        self.prefetcher.start(remote_urls)
+        # Then build their hover-scrub sprite sheets in the background
+        get_sprite_cache().prefetch(remote_urls)
+
+    def on_clip_activated(self, row):
+        """Show the clip the user selected in the clip list."""
+        clip = self.clip_list.clip(row)
+        if clip is not None:
+            self.on_thumbnail_clicked(clip, self.is_pro_user)
+
+    def on_thumbnail_clicked(self, item, is_pro_user):
         self.stop_video()
         self.video_url = item.get("video")
+        self.hover_scrub.set_video_url(self.video_url)
         self.name_label.setText(item.get("name", ""))
         self.description_label.setText(item.get("description", ""))
 
@@ -256,14 +478,6 @@ class FreeFootageDetailWidget(ItemDetailWidget):
         else:
             self.load_image(item.get("poster"))
 
-        # Visual feedback en botones
-        for btn in self.button_list:
-            btn.setStyleSheet(
-                "background-color: #2D2D2D; color: white; text-align: bottom center; font-size: 10px;")
-        button.setStyleSheet(
-            "background-color: #3ad1ff; color: white; text-align: bottom center; font-size: 10px;")
-        self.selected_button = button
-
         # Load resolutions for the selected clip
         self.variant_combo.clear()
         self.variant_combo.addItem("Select Resolution")
@@ -276,43 +490,36 @@ class FreeFootageDetailWidget(ItemDetailWidget):
             size_str = f"{size_mb} MB" if size_bytes > 0 else "?? MB"
             text = f"{res} - {size_str}" + (" 🔒" if not is_pro_user else "")
             item_model = QtGui.QStandardItem(text)
+            item_model.setData(var, QtCore.Qt.UserRole)
             item_model.setEnabled(is_pro_user)
             model.appendRow(item_model)
 
         self.variant_combo.setModel(model)
 
 
-class Collection_DetailWidget(ItemDetailWidget):
+class Collection_DetailWidget(FreeFootageDetailWidget):
     def load_item_by_slug(self, collection_id, item_type="collection_by_id"):
-        session = load_session()
-        token = session.get("Authorization", "")
-        token = token if token.startswith("Bearer ") else f"Bearer {token}"
-        headers = {"Authorization": token, "User-Agent": "MyApp/1.0"}
-
-        try:
-            url = f"https://backend.actionvfx.com/api/v1/scenes/{collection_id}/"
-            req = urllib.request.Request(url, headers=headers, method="GET")
-            with urllib.request.urlopen(req) as response:
-                if response.getcode() == 200:
-                    data = json.loads(response.read().decode("utf-8"))
-                    self.populate_ui(data)
-        except Exception as e:
-            print(f"[ERROR] load 2D collection: {e}")
+        """Load a 2D collection, served as a scene, and populate the UI."""
+        self.fetch_scene(collection_id, self.on_scene_loaded,
+                         "load 2D collection")
 
 
-class OwnershipDetailWidget(ItemDetailWidget):
+class OwnershipDetailWidget(FreeFootageDetailWidget):
     def load_item_by_slug(self, collection_id, item_type="collection_by_id"):
-        session = load_session()
-        token = session.get("Authorization", "")
-        token = token if token.startswith("Bearer ") else f"Bearer {token}"
-        headers = {"Authorization": token, "User-Agent": "MyApp/1.0"}
-
-        try:
-            url = f"https://backend.actionvfx.com/api/v1/collections/{collection_id}/products/"
-            req = urllib.request.Request(url, headers=headers, method="GET")
-            with urllib.request.urlopen(req) as response:
-                if response.getcode() == 200:
-                    data = json.loads(response.read().decode("utf-8"))
-                    self.populate_ui(data)
-        except Exception as e:
-            print(f"[ERROR] load Ownership collection: {e}")
+        """Load the products of an owned collection and populate the UI."""
+        url = api_url(f"collections/{collection_id}/products/")
+        self.fetch_json(url, self.on_products_loaded,
+                        "load Ownership collection")
+
+    def on_products_loaded(self, data):
+        """Show the clips of every product as one list."""
+        products = records_of(data)
+        first = products[0] if products else {}
+        scene_data = {
+            "description": first.get("description", ""),
+            "poster": first.get("poster"),
+            "clips": [clip for product in products
+                      for clip in product.get("clips", [])],
+        }
+        # The user owns these products, every variant can be downloaded
+        self.populate_ui_from_scene(scene_data, True)
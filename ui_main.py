@@ -14,7 +14,8 @@ import nuke
 from PySide2 import QtWidgets, QtGui, QtCore
 
 # Local modules
-from api.auth import authenticate, load_session, save_session, SESSION_FILE
+from api.auth import authenticate, valid_session, save_session, delete_session
+from api.auth import get_token_refresher
 from ui.ui_container_base import ImageGridWidget, FreeFootageWidget
 from ui.ui_container_base import OwnershipWidget
 from ui.ui_items_detail import ItemDetailWidget
@@ -22,6 +23,9 @@ from ui.ui_items_detail import ItemDetailWidget
 from ui.ui_items_detail_freefootage import FreeFootageDetailWidget
 
 from ui.ui_items_detail import FreeFootageDetailWidget, Collection_DetailWidget, OwnershipDetailWidget
+from ui.ui_download_queue import DownloadQueueWidget
+from api.download_queue import get_download_queue
+from api.catalog_sync import get_catalog_sync
 
 # Constants for the login UI
 # File to store the authentication token
@@ -30,6 +34,19 @@ TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".actionvfx_token.json")
 image_path = os.path.join(os.path.dirname(os.path.dirname(
     __file__)), "assets", "img", "logo_01.png")
 
+# Dashboard views by library, built on first navigation
+GRID_VIEWS = {
+    "2d": ImageGridWidget,
+    "freefootage": FreeFootageWidget,
+    "ownership": OwnershipWidget,
+}
+DETAIL_VIEWS = {
+    "2d": Collection_DetailWidget,
+    "freefootage": FreeFootageDetailWidget,
+    "ownership": OwnershipDetailWidget,
+}
+DEFAULT_LIBRARY = "2d"
+
 # Global variables
 ACTIONVFX_URL = "https://www.actionvfx.com/"
 login_window = None
@@ -155,9 +172,29 @@ class DashboardWindow(QtWidgets.QMainWindow):
 
         self.current_widget = None
         self.previous_widget = None
+        self.current_library = None
+        self.views = {}
+        self.services_started = False
 
         self.setup_ui(user_session)
 
+    def paintEvent(self, event):
+        super(DashboardWindow, self).paintEvent(event)
+        if not self.services_started:
+            # Background services wait until the window was painted once
+            self.services_started = True
+            QtCore.QTimer.singleShot(0, self.start_background_services)
+
+    def start_background_services(self):
+        """Start the catalog sync and the token refresher."""
+        # Logged out before the window was shown
+        if not self.isVisible():
+            return
+        # Keep the local catalog fresh in the background
+        get_catalog_sync().start()
+        # Renew the session token before it expires
+        get_token_refresher().start()
+
     def setup_ui(self, user_session):
         """Set up the UI for the dashboard window."""
         # --- Central Widget Layout ---
@@ -250,6 +287,15 @@ class DashboardWindow(QtWidgets.QMainWindow):
         self.create_button_download.clicked.connect(self.download)
         left_panel.addWidget(self.create_button_download)
 
+        self.create_button_queue = QtWidgets.QPushButton("Downloads")
+        self.create_button_queue.setStyleSheet(buttons_style)
+        self.create_button_queue.clicked.connect(self.show_download_queue)
+        left_panel.addWidget(self.create_button_queue)
+
+        self.download_status = QtWidgets.QLabel("")
+        self.download_status.setWordWrap(True)
+        left_panel.addWidget(self.download_status)
+
         # --- RIGHT PANEL ---
         right_panel = QtWidgets.QVBoxLayout()
 
@@ -260,43 +306,10 @@ class DashboardWindow(QtWidgets.QMainWindow):
         top_row.addWidget(self.logout_button)
         right_panel.addLayout(top_row)
 
-        # Widgets container
+        # Widgets container, views are added by view() on first use
         self.widget_container = QtWidgets.QWidget()
-        container_layout = QtWidgets.QVBoxLayout(self.widget_container)
-
-        self.grid_2d_elements = ImageGridWidget()
-        self.grid_freefootage_elements = FreeFootageWidget()
-        self.grid_ownership_elements = OwnershipWidget()
-
-        self.detail_widget_freefootage = FreeFootageDetailWidget()
-        self.detail_widget_2d = Collection_DetailWidget()
-        self.detail_widget_ownership = OwnershipDetailWidget()
-
-        self.grid_2d_elements.itemSelected.connect(self.show_item_detail)
-        self.grid_freefootage_elements.itemSelected.connect(
-            self.show_item_detail)
-        self.grid_ownership_elements.itemSelected.connect(
-            self.show_item_detail)
-
-        self.detail_widget_freefootage.back_button.clicked.connect(
-            self.go_back)
-        self.detail_widget_2d.back_button.clicked.connect(self.go_back)
-        self.detail_widget_ownership.back_button.clicked.connect(self.go_back)
-
-        container_layout.addWidget(self.grid_2d_elements)
-        container_layout.addWidget(self.grid_freefootage_elements)
-        container_layout.addWidget(self.grid_ownership_elements)
-        container_layout.addWidget(self.detail_widget_freefootage)
-        container_layout.addWidget(self.detail_widget_2d)
-        container_layout.addWidget(self.detail_widget_ownership)
-
-        self.grid_freefootage_elements.hide()
-        self.grid_ownership_elements.hide()
-        self.detail_widget_freefootage.hide()
-        self.detail_widget_2d.hide()
-        self.detail_widget_ownership.hide()
-
-        self.current_widget = self.grid_2d_elements
+        self.container_layout = QtWidgets.QVBoxLayout(self.widget_container)
+        self.show_library(DEFAULT_LIBRARY)
 
         right_panel.addWidget(self.widget_container, 1)
 
@@ -310,14 +323,58 @@ class DashboardWindow(QtWidgets.QMainWindow):
         main_layout.addWidget(vertical_separator)
         main_layout.addLayout(right_panel, 4)
 
+    def view(self, name):
+        """Return a dashboard view, building it on first use.
+
+        Grids start loading their items when they are built, so a library
+        the artist never opens costs nothing.
+
+        Args:
+            name (str): ``"grid_<library>"``, ``"detail_<library>"`` or
+                ``"downloads"``.
+
+        Returns:
+            QtWidgets.QWidget: The view, added to the container and hidden.
+        """
+        widget = self.views.get(name)
+        if widget is not None:
+            return widget
+
+        kind, _, library = name.partition("_")
+        if kind == "grid":
+            widget = GRID_VIEWS[library]()
+            widget.itemSelected.connect(self.show_item_detail)
+        elif kind == "detail":
+            widget = DETAIL_VIEWS[library]()
+            widget.back_button.clicked.connect(self.go_back)
+        else:
+            widget = DownloadQueueWidget()
+            widget.back_button.clicked.connect(self.go_back)
+
+        widget.hide()
+        self.container_layout.addWidget(widget)
+        self.views[name] = widget
+        return widget
+
+    def show_library(self, library):
+        """Show the grid of a library."""
+        self.current_library = library
+        self.switch_widget(self.view(f"grid_{library}"))
+
     def show_2d_elements(self):
-        self.switch_widget(self.grid_2d_elements)
+        self.show_library("2d")
 
     def show_freefootage_elements(self):
-        self.switch_widget(self.grid_freefootage_elements)
+        self.show_library("freefootage")
 
     def show_ownership_elements(self):
-        self.switch_widget(self.grid_ownership_elements)
+        self.show_library("ownership")
+
+    def show_download_queue(self):
+        download_queue_widget = self.view("downloads")
+        if self.current_widget is not download_queue_widget:
+            self.previous_widget = self.current_widget
+        self.switch_widget(download_queue_widget)
 
     def switch_widget(self, new_widget):
         if self.current_widget:
@@ -326,52 +383,62 @@ class DashboardWindow(QtWidgets.QMainWindow):
         self.current_widget = new_widget
 
     def detail_widget_for_current_type(self):
-        if self.current_widget == self.grid_freefootage_elements:
-            return self.detail_widget_free
-        elif self.current_widget == self.grid_ownership_elements:
-            return self.detail_widget_ownership
-        elif self.current_widget == self.grid_2d_elements:
-            return self.detail_widget_2d
-        return None
+        if self.current_library is None:
+            return None
+        return self.view(f"detail_{self.current_library}")
 
     def show_item_detail(self, item):
         self.previous_widget = self.current_widget
+        detail_widget = self.detail_widget_for_current_type()
+        if detail_widget is None:
+            return
 
-        if self.current_widget == self.grid_freefootage_elements:
-            scene_id = item.get("id")
-            if scene_id:
-                self.detail_widget_free.load_scene(scene_id)
-            else:
-                print("[⚠️]No Id found in item")
-
-        elif self.current_widget == self.grid_ownership_elements or self.current_widget == self.grid_2d_elements:
-            item_id = item.get("id")
-            if item_id:
-                detail_widget = self.detail_widget_for_current_type()
-                if detail_widget:
-                    detail_widget.load_item_by_slug(
-                        item_id, item_type="collection_by_id")
-            else:
-                print("[⚠️] No Id found in item")
+        item_id = item.get("id")
+        if not item_id:
+            print("[⚠️] No Id found in item")
+        elif self.current_library == "freefootage":
+            detail_widget.load_scene(item_id)
+        else:
+            detail_widget.load_item_by_slug(
+                item_id, item_type="collection_by_id")
 
         # Cambiar vista al detalle correspondiente
-        self.switch_widget(self.detail_widget_for_current_type())
+        self.switch_widget(detail_widget)
 
     def go_back(self):
         if hasattr(self, 'previous_widget') and self.previous_widget:
             self.switch_widget(self.previous_widget)
 
     def download(self):
+        """Download the variant selected in the current detail view."""
+        variant = None
+        if isinstance(self.current_widget, ItemDetailWidget):
+            variant = self.current_widget.selected_variant()
+        if not variant:
+            nuke.message("Please select a resolution to download.")
+            return
+
+        download_dir = self.path_input.text().strip()
+        if not download_dir:
+            nuke.message("Please enter a download path.")
+            return
+
+        name = self.current_widget.name_label.text()
+        resolution = variant.get("resolution")
+        if resolution:
+            name = f"{name} - {resolution}"
 
-        nuke.message("Downloading...")
+        job = get_download_queue().add(variant, download_dir, name=name)
+        self.download_status.setText(f"Queued: {job.name}")
 
     def logout(self):
         """Logout and return to login screen."""
         global login_window, dashboard_window
 
         # Delete the saved session
-        if os.path.exists(SESSION_FILE):
-            os.remove(SESSION_FILE)
+        delete_session()
+        get_catalog_sync().stop()
+        get_token_refresher().stop()
 
         # Close dashboard window
         if dashboard_window:
@@ -398,8 +465,8 @@ def show_login():
         dashboard_window.deleteLater()
         dashboard_window = None
 
-    # Check if there is a saved session
-    user_session = load_session()
+    # Check if there is a saved session, renewed if its token expired
+    user_session = valid_session()
     if user_session:
         # Auto-login if there is a saved session
         dashboard_window = DashboardWindow(user_session)
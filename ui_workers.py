@@ -0,0 +1,166 @@
+"""Background workers for the ActionVFX UI.
+
+This module contains the helpers used to run blocking work (network requests,
+JSON parsing) on a ``QThreadPool`` and deliver the results back to the GUI
+thread through Qt signals.
+"""
+# Third-party modules
+from PySide2 import QtCore
+
+
+# Threads used for API requests and image decoding, kept apart from
+# Nuke's global pool
+MAX_NETWORK_THREADS = 4
+MAX_DECODE_THREADS = 2
+MAX_SPRITE_THREADS = 2
+
+_network_pool = None
+_decode_pool = None
+_sprite_pool = None
+
+
+def network_pool():
+    """Return the thread pool used for API requests."""
+    global _network_pool
+    if _network_pool is None:
+        _network_pool = QtCore.QThreadPool()
+        _network_pool.setMaxThreadCount(MAX_NETWORK_THREADS)
+    return _network_pool
+
+
+def decode_pool():
+    """Return the thread pool used to download and decode images."""
+    global _decode_pool
+    if _decode_pool is None:
+        _decode_pool = QtCore.QThreadPool()
+        _decode_pool.setMaxThreadCount(MAX_DECODE_THREADS)
+    return _decode_pool
+
+
+def sprite_pool():
+    """Return the thread pool waiting on preview downloads and sprite
+    sheet builds, so they never hold up posters."""
+    global _sprite_pool
+    if _sprite_pool is None:
+        _sprite_pool = QtCore.QThreadPool()
+        _sprite_pool.setMaxThreadCount(MAX_SPRITE_THREADS)
+    return _sprite_pool
+
+
+class WorkerSignals(QtCore.QObject):
+    """Signals emitted by ``Worker`` on the thread that created it."""
+    result = QtCore.Signal(object)
+    error = QtCore.Signal(str)
+    # Emitted last, cancelled or not
+    finished = QtCore.Signal()
+
+
+class Worker(QtCore.QRunnable):
+    """Run a function on a thread pool and report back through signals.
+
+    A cancelled worker never emits, so late results from a request the user
+    already navigated away from are discarded.
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super(Worker, self).__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        # Created on the GUI thread so the slots run there
+        self.signals = WorkerSignals()
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        """Discard the result of this worker."""
+        self.cancelled = True
+
+    def run(self):
+        try:
+            self._run()
+        finally:
+            self.signals.finished.emit()
+
+    def _run(self):
+        if self.cancelled:
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.error.emit(str(e))
+            return
+        if not self.cancelled:
+            self.signals.result.emit(result)
+
+
+class RequestRunner(QtCore.QObject):
+    """Run one request at a time for a widget, cancelling the previous one.
+
+    Starting a new request or calling ``cancel`` discards whatever request
+    is still in flight.
+    """
+
+    def __init__(self, pool=None, parent=None):
+        super(RequestRunner, self).__init__(parent)
+        self.pool = pool or network_pool()
+        self.current = None
+        self._current_id = None
+        # Workers kept alive while the pool has them, by ID; the signal
+        # slots only hold the ID so no worker references itself
+        self._workers = {}
+        self._next_id = 0
+
+    def start(self, fn, *args, on_result=None, on_error=None, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool.
+
+        Args:
+            fn (callable): The blocking function to run.
+            on_result (callable): Slot called with the return value.
+            on_error (callable): Slot called with the error message.
+
+        Returns:
+            Worker: The started worker.
+        """
+        self.cancel()
+
+        self._next_id += 1
+        worker_id = self._next_id
+        worker = Worker(fn, *args, **kwargs)
+        worker.signals.result.connect(
+            lambda result: self._finish(worker_id, on_result, result))
+        worker.signals.error.connect(
+            lambda message: self._finish(worker_id, on_error, message))
+        worker.signals.finished.connect(lambda: self._release(worker_id))
+        self._workers[worker_id] = worker
+        self.current = worker
+        self._current_id = worker_id
+        self.pool.start(worker)
+        return worker
+
+    def cancel(self):
+        """Discard the request in flight, if any."""
+        if self.current is not None:
+            self.current.cancel()
+            if self.pool.tryTake(self.current):
+                # Never started, so it will not emit finished
+                self._release(self._current_id)
+            self.current = None
+            self._current_id = None
+
+    def is_running(self):
+        """Return True while a request is in flight."""
+        return self.current is not None
+
+    def _finish(self, worker_id, callback, value):
+        # Ignore signals queued before the worker was replaced
+        if worker_id != self._current_id or self.current.cancelled:
+            return
+        self.current = None
+        self._current_id = None
+        if callback:
+            callback(value)
+
+    def _release(self, worker_id):
+        self._workers.pop(worker_id, None)
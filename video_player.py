@@ -0,0 +1,743 @@
+"""Background decoding for the clip preview player.
+
+This module contains the producer side of the preview player. A
+``DecoderThread`` owns the ``cv2.VideoCapture``, reads and converts frames
+and pushes them into a bounded ``FrameRingBuffer``. The GUI thread only pops
+ready frames and displays them, so a slow network read or decode never
+blocks Nuke.
+
+Frames are resized to the display size with ``cv2.resize(INTER_AREA)`` on
+the decoder thread, into a small pool of reusable buffers, so the GUI thread
+never copies or scales a full resolution frame.
+
+Playback is paced by a ``PlaybackClock`` shared by the decoder and the
+GUI: each frame has a presentation time, ``index / fps`` after the clock
+started. When decoding falls behind the clock the decoder skips the late
+frames with ``grab()``, without decoding, converting or scaling them.
+
+Replaying a clip avoids the open and decode work of the first play. A
+``CapturePool`` keeps the captures of recently played local previews open
+and rewinds them by seeking. A ``FrameCache`` keeps every display-sized
+frame of short previews, raw or JPEG compressed, under a global memory
+budget, so a loop replays straight from memory. Evicting a capture closes
+its file handle and evicting a clip frees its frames.
+
+``cv2`` and ``numpy`` are imported by the methods that use them, so
+importing this module, and the plugin UI, does not load them before the
+first preview plays.
+"""
+# Standard modules import
+import time
+import threading
+from collections import deque, OrderedDict
+
+# Local modules
+from api.tracing import get_tracer
+
+
+# Constants
+RING_BUFFER_SIZE = 8
+DEFAULT_FPS = 30.0
+# Longest wait on a download before checking for a stop, in seconds
+DOWNLOAD_WAIT_SLICE = 0.1
+
+# Reuse of captures and decoded frames
+CAPTURE_POOL_SIZE = 4
+FRAME_CACHE_BYTES = 256 * 1024 * 1024
+FRAME_CACHE_MAX_FRAMES = 240
+FRAME_CACHE_QUALITY = 90
+
+
+class PlaybackClock(object):
+    """Wall clock mapping playback time to the index of the frame due.
+
+    The GUI thread starts, pauses and resumes it; the decoder thread reads
+    ``due_index`` to skip the frames playback already passed.
+
+    Args:
+        fps (float): Frames per second of the clip.
+    """
+
+    def __init__(self, fps=DEFAULT_FPS):
+        self.fps = fps
+        self._lock = threading.Lock()
+        # perf_counter() at which frame 0 is due, None until started
+        self._origin = None
+        self._paused_at = None
+
+    @property
+    def started(self):
+        return self._origin is not None
+
+    @property
+    def running(self):
+        return self._origin is not None and self._paused_at is None
+
+    def start(self, index=0, fps=None):
+        """Make frame ``index`` due now and run the clock."""
+        with self._lock:
+            if fps:
+                self.fps = fps
+            self._origin = time.perf_counter() - index / self.fps
+            self._paused_at = None
+
+    def pause(self):
+        """Hold the clock; frames are due later by the paused time."""
+        with self._lock:
+            if self._origin is not None and self._paused_at is None:
+                self._paused_at = time.perf_counter()
+
+    def resume(self):
+        with self._lock:
+            if self._paused_at is not None:
+                self._origin += time.perf_counter() - self._paused_at
+                self._paused_at = None
+
+    def reset(self):
+        """Stop the clock until the next ``start``."""
+        with self._lock:
+            self._origin = None
+            self._paused_at = None
+
+    def due_index(self):
+        """Return the index of the frame due now, or None when not running."""
+        with self._lock:
+            if self._origin is None or self._paused_at is not None:
+                return None
+            return int((time.perf_counter() - self._origin) * self.fps)
+
+    def time_until(self, index):
+        """Return the seconds until frame ``index`` is due, negative once
+        it is late. Only meaningful while the clock runs."""
+        with self._lock:
+            if self._origin is None:
+                return 0.0
+            now = self._paused_at or time.perf_counter()
+            return self._origin + index / self.fps - now
+
+
+class FrameRingBuffer(object):
+    """Bounded FIFO of decoded frames shared by a producer and the GUI.
+
+    ``put`` blocks while the buffer is full so the producer never runs
+    ahead of playback by more than ``capacity`` frames.
+    """
+
+    def __init__(self, capacity=RING_BUFFER_SIZE):
+        self.capacity = capacity
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def put(self, frame):
+        """Add a frame, waiting for space. Returns False once closed."""
+        with self._condition:
+            while len(self._frames) >= self.capacity and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return False
+            self._frames.append(frame)
+            return True
+
+    def peek(self):
+        """Return the oldest frame without removing it, or None."""
+        with self._condition:
+            return self._frames[0] if self._frames else None
+
+    def pop(self):
+        """Return the oldest frame, or None if the buffer is empty."""
+        with self._condition:
+            if not self._frames:
+                return None
+            frame = self._frames.popleft()
+            self._condition.notify()
+            return frame
+
+    def clear(self):
+        """Drop every buffered frame."""
+        with self._condition:
+            self._frames.clear()
+            self._condition.notify_all()
+
+    def close(self):
+        """Wake the producer and refuse any further frames."""
+        with self._condition:
+            self._closed = True
+            self._frames.clear()
+            self._condition.notify_all()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._frames)
+
+
+def fit_size(width, height, max_width, max_height):
+    """Return the size of a ``width`` x ``height`` frame fitted in a box.
+
+    The aspect ratio is kept, like ``Qt.KeepAspectRatio``.
+
+    Returns:
+        tuple: ``(width, height)``.
+    """
+    if max_width <= 0 or max_height <= 0:
+        return width, height
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+class FrameScaler(object):
+    """Resize frames to the display size into reusable buffers.
+
+    Buffers are handed out round-robin. With a ring buffer of ``capacity``
+    frames, ``capacity + 2`` buffers guarantee a buffer is only rewritten
+    after the GUI has displayed it.
+    """
+
+    def __init__(self, buffer_count, convert_rgb=True):
+        self.buffer_count = buffer_count
+        self.convert_rgb = convert_rgb
+        self._buffers = []
+        self._scratch = None
+        self._index = 0
+        self._shape = None
+
+    def _allocate(self, shape):
+        import numpy as np
+
+        self._buffers = [np.empty(shape, np.uint8)
+                         for _ in range(self.buffer_count)]
+        self._scratch = np.empty(shape, np.uint8) if self.convert_rgb \
+            else None
+        self._shape = shape
+        self._index = 0
+
+    def process(self, frame, target_size):
+        """Return ``frame`` fitted in ``target_size``, in a reused buffer.
+
+        Args:
+            frame (numpy.ndarray): BGR frame as read by OpenCV.
+            target_size (tuple): ``(width, height)`` of the display.
+
+        Returns:
+            numpy.ndarray: The resized frame, RGB if ``convert_rgb``.
+        """
+        import cv2
+        import numpy as np
+
+        src_h, src_w = frame.shape[:2]
+        width, height = fit_size(src_w, src_h, *target_size)
+        shape = (height, width, 3)
+        if shape != self._shape:
+            self._allocate(shape)
+
+        out = self._buffers[self._index]
+        self._index = (self._index + 1) % self.buffer_count
+
+        resized = self._scratch if self.convert_rgb else out
+        if (width, height) == (src_w, src_h):
+            np.copyto(resized, frame)
+        else:
+            downscale = width < src_w
+            cv2.resize(frame, (width, height), dst=resized,
+                       interpolation=cv2.INTER_AREA if downscale
+                       else cv2.INTER_LINEAR)
+        if self.convert_rgb:
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=out)
+        return out
+
+
+class CapturePool(object):
+    """LRU of open ``cv2.VideoCapture`` handles of local previews.
+
+    A clip played again takes its capture back rewound to the first frame
+    instead of opening the file again. Captures are only shared one player
+    at a time; evicted ones are released, closing their file handles.
+
+    Args:
+        capacity (int): Captures kept open.
+    """
+
+    def __init__(self, capacity=CAPTURE_POOL_SIZE):
+        self.capacity = capacity
+        self._captures = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, path):
+        """Take the pooled capture of ``path`` at its first frame, or None."""
+        import cv2
+
+        with self._lock:
+            cap = self._captures.pop(path, None)
+            if cap is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        if not cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+            cap.release()
+            return None
+        return cap
+
+    def release(self, path, cap):
+        """Give a capture back; the least recently used one is closed when
+        the pool is full."""
+        evicted = []
+        with self._lock:
+            previous = self._captures.pop(path, None)
+            if previous is not None:
+                evicted.append(previous)
+            self._captures[path] = cap
+            while len(self._captures) > self.capacity:
+                evicted.append(self._captures.popitem(last=False)[1])
+                self.evictions += 1
+        for old in evicted:
+            old.release()
+
+    def clear(self):
+        """Close every pooled capture."""
+        with self._lock:
+            captures = list(self._captures.values())
+            self._captures.clear()
+        for cap in captures:
+            cap.release()
+
+    def stats(self):
+        """Return the pool counters as a dictionary."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "open": len(self._captures),
+            }
+
+
+class CachedClip(object):
+    """Every display-sized frame of a short preview.
+
+    Args:
+        fps (float): Frames per second of the clip.
+        frames (list): ``numpy.ndarray`` frames, or JPEG bytes if
+            ``compressed``.
+        compressed (bool): Frames are JPEG bytes.
+    """
+
+    def __init__(self, fps, frames, compressed=False):
+        self.fps = fps
+        self.frames = frames
+        self.compressed = compressed
+        self.nbytes = sum(len(frame) if compressed else frame.nbytes
+                          for frame in frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def frame(self, index):
+        """Return frame ``index`` ready to display."""
+        frame = self.frames[index]
+        if not self.compressed:
+            return frame
+        import cv2
+        import numpy as np
+
+        return cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+
+
+class FrameCache(object):
+    """LRU of the decoded frames of short previews under a memory budget.
+
+    Clips are keyed by URL, display size and colour order, so a resized
+    preview is decoded again.
+
+    Args:
+        max_bytes (int): Memory budget of every cached clip together.
+        max_frames (int): Longest preview cached, in frames.
+        compress (bool): Store frames as JPEG, about ten times smaller, at
+            the cost of decoding them again on replay.
+        quality (int): JPEG quality of compressed frames.
+    """
+
+    def __init__(self, max_bytes=FRAME_CACHE_BYTES,
+                 max_frames=FRAME_CACHE_MAX_FRAMES, compress=False,
+                 quality=FRAME_CACHE_QUALITY):
+        self.max_bytes = max_bytes
+        self.max_frames = max_frames
+        self.compress = compress
+        self.quality = quality
+        self._clips = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def encode(self, frame):
+        """Return the copy of a display-sized frame the cache stores."""
+        if not self.compress:
+            return frame.copy()
+        import cv2
+
+        ok, data = cv2.imencode(".jpg", frame,
+                                [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("Could not compress a cached frame")
+        return data.tobytes()
+
+    def get(self, key):
+        """Return the ``CachedClip`` stored under ``key``, or None."""
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is None:
+                self.misses += 1
+                return None
+            self._clips.move_to_end(key)
+            self.hits += 1
+            return clip
+
+    def put(self, key, clip):
+        """Store a clip and evict the least recently used ones.
+
+        Clips larger than half the budget are not kept.
+        """
+        if clip.nbytes > self.max_bytes // 2:
+            return
+        with self._lock:
+            previous = self._clips.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._clips[key] = clip
+            self._bytes += clip.nbytes
+            while self._bytes > self.max_bytes:
+                _, old = self._clips.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._clips.clear()
+            self._bytes = 0
+
+    def nbytes(self):
+        return self._bytes
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "clips": len(self._clips),
+                "bytes": self._bytes,
+            }
+
+
+class DecoderThread(threading.Thread):
+    """Open a video and fill a ring buffer with display-sized frames.
+
+    The capture is opened and released on this thread. Check ``error``,
+    ``opened`` and ``finished`` from the GUI thread to follow its state.
+    Frames are pushed as ``(index, frame)`` tuples; ``stalled`` is True
+    while the decoder waits for more of a partial download.
+
+    A clip in ``frame_cache`` is played from memory without opening a
+    capture; a short clip played to the end is added to it. Captures of
+    local files are taken from and given back to ``capture_pool``.
+
+    Args:
+        video_url (str): URL or path of the preview.
+        ring (FrameRingBuffer): Buffer receiving the frames.
+        target_size (tuple): ``(width, height)`` the frames must fit in.
+        convert_rgb (bool): Convert to RGB. Pass False when the display
+            can wrap BGR data directly.
+        download (PreviewDownload): Local proxy of ``video_url``. Playback
+            starts from the partial file and waits for more bytes when it
+            catches up with the download.
+        clock (PlaybackClock): Playback clock. Frames already late on it
+            are skipped instead of decoded.
+        capture_pool (CapturePool): Open captures to reuse, None to always
+            open the file.
+        frame_cache (FrameCache): Decoded clips to replay, None to always
+            decode.
+    """
+
+    def __init__(self, video_url, ring=None, target_size=(0, 0),
+                 convert_rgb=True, download=None, clock=None,
+                 capture_pool=None, frame_cache=None):
+        super(DecoderThread, self).__init__(daemon=True)
+        self.video_url = video_url
+        self.download = download
+        self.ring = ring or FrameRingBuffer()
+        self.target_size = target_size
+        self.scaler = FrameScaler(self.ring.capacity + 2, convert_rgb)
+        self.clock = clock
+        self.capture_pool = capture_pool
+        self.frame_cache = frame_cache
+        self.fps = DEFAULT_FPS
+        self.opened = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self.stalled = False
+        # How the clip was played: from the frame cache, or a pooled capture
+        self.from_cache = False
+        self.capture_reused = False
+        self._capture_path = None
+        self._stop_event = threading.Event()
+
+        # Per-frame CPU time spent reading, scaling and converting
+        self.frames_decoded = 0
+        self.cpu_time = 0.0
+        # Frames grabbed but not decoded because playback had passed them
+        self.frames_skipped = 0
+
+    def set_target_size(self, width, height):
+        """Change the display size used for the next frames."""
+        self.target_size = (width, height)
+
+    def average_frame_ms(self):
+        """Return the average CPU time per decoded frame in ms."""
+        if not self.frames_decoded:
+            return 0.0
+        return 1000.0 * self.cpu_time / self.frames_decoded
+
+    def _cache_key(self, target_size):
+        return (self.video_url, target_size, self.scaler.convert_rgb)
+
+    def _local_capture(self, path):
+        """Return a capture of a complete local file, from the pool if one
+        is open. It goes back to the pool when decoding ends."""
+        import cv2
+
+        self._capture_path = path
+        if self.capture_pool is not None:
+            cap = self.capture_pool.acquire(path)
+            if cap is not None:
+                self.capture_reused = True
+                return cap
+        return cv2.VideoCapture(path)
+
+    def _open_capture(self):
+        """Open the capture, from the local proxy when there is one."""
+        import cv2
+
+        download = self.download
+        if download is None:
+            if self.video_url.startswith(("http://", "https://")):
+                return cv2.VideoCapture(self.video_url)
+            return self._local_capture(self.video_url)
+
+        # Short waits, so stopping the player never leaves the thread
+        # blocked on a slow download
+        while not download.wait_ready(timeout=DOWNLOAD_WAIT_SLICE):
+            if self._stop_event.is_set() or download.done:
+                break
+        while not self._stop_event.is_set():
+            if download.error is not None or download.cancelled:
+                # The proxy failed, stream the preview instead
+                self.download = None
+                return cv2.VideoCapture(self.video_url)
+
+            if download.complete:
+                return self._local_capture(download.path)
+            cap = cv2.VideoCapture(download.path)
+            if cap.isOpened():
+                return cap
+            cap.release()
+            # Not enough of the file yet (e.g. the index is at the end)
+            download.wait_for_more(download.received,
+                                   timeout=DOWNLOAD_WAIT_SLICE)
+        return None
+
+    def _wait_for_download(self, cap, position):
+        """Reopen a partial proxy once more bytes arrived.
+
+        Returns:
+            cv2.VideoCapture: The reopened capture at ``position``, or None
+                if the download is over and the clip really ended.
+        """
+        import cv2
+
+        download = self.download
+        if download is None or download.complete:
+            return None
+        received = download.received
+        while not self._stop_event.is_set() and not download.done:
+            if download.wait_for_more(received, timeout=DOWNLOAD_WAIT_SLICE):
+                break
+        if download.error is not None or download.cancelled:
+            return None
+
+        cap.release()
+        # Opened before the download ended, never pooled
+        self._capture_path = None
+        cap = cv2.VideoCapture(download.path)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        return cap
+
+    def _play_cached(self, clip):
+        """Fill the ring from the frame cache, without opening a capture."""
+        self.fps = clip.fps
+        self.from_cache = True
+        self.opened.set()
+        clock = self.clock
+        for index in range(len(clip)):
+            if self._stop_event.is_set():
+                return
+            due = clock.due_index() if clock is not None else None
+            if due is not None and index < due:
+                self.frames_skipped += 1
+                continue
+            if not self.ring.put((index, clip.frame(index))):
+                return
+
+    def run(self):
+        import cv2
+
+        tracer = get_tracer()
+        cap = None
+        position = 0
+        try:
+            size = self.target_size
+            cached = self.frame_cache.get(self._cache_key(size)) \
+                if self.frame_cache is not None else None
+            if cached is not None:
+                self._play_cached(cached)
+                return
+
+            with tracer.span("video.open", "video", url=self.video_url):
+                cap = self._open_capture()
+            if cap is None:
+                return
+            if not cap.isOpened():
+                raise Exception("Could not open video")
+
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if fps > 0:
+                self.fps = fps
+            self.opened.set()
+
+            # Short clips are recorded for the frame cache while they play
+            recording = None
+            if self.frame_cache is not None and \
+                    cap.get(cv2.CAP_PROP_FRAME_COUNT) <= \
+                    self.frame_cache.max_frames:
+                recording = []
+                recorded_bytes = 0
+            ended = False
+
+            clock = self.clock
+            while not self._stop_event.is_set():
+                start = time.thread_time()
+                wall_start = time.perf_counter()
+                index = position
+                due = clock.due_index() if clock is not None else None
+                skip = due is not None and index < due
+                if skip:
+                    # Already late, advance without decoding the frame
+                    ret = cap.grab()
+                else:
+                    ret, frame = cap.read()
+                if not ret:
+                    # Caught up with a download still in progress
+                    self.stalled = True
+                    try:
+                        reopened = self._wait_for_download(cap, position)
+                    finally:
+                        self.stalled = False
+                    if reopened is None:
+                        download = self.download
+                        ended = download is None or download.complete
+                        break
+                    cap = reopened
+                    continue
+                position += 1
+                if skip:
+                    self.frames_skipped += 1
+                    # A clip with missing frames is not cached
+                    recording = None
+                    continue
+                frame = self.scaler.process(frame, self.target_size)
+                if recording is not None:
+                    if self.target_size != size or \
+                            len(recording) >= self.frame_cache.max_frames:
+                        recording = None
+                    else:
+                        data = self.frame_cache.encode(frame)
+                        recorded_bytes += len(data) \
+                            if self.frame_cache.compress else data.nbytes
+                        # put() would not keep it, stop copying frames
+                        if recorded_bytes > self.frame_cache.max_bytes // 2:
+                            recording = None
+                        else:
+                            recording.append(data)
+                self.cpu_time += time.thread_time() - start
+                self.frames_decoded += 1
+                tracer.record("video.decode_frame", wall_start,
+                              time.perf_counter(), "video", frame=index)
+                if not self.ring.put((index, frame)):
+                    break
+
+            if ended and recording and not self._stop_event.is_set():
+                self.frame_cache.put(
+                    self._cache_key(size),
+                    CachedClip(self.fps, recording, self.frame_cache.compress))
+        except Exception as e:
+            self.error = e
+        finally:
+            if cap is not None:
+                if self._capture_path is not None and \
+                        self.capture_pool is not None and self.error is None:
+                    self.capture_pool.release(self._capture_path, cap)
+                else:
+                    cap.release()
+            self.finished.set()
+
+    def stop(self, timeout=None):
+        """Stop decoding.
+
+        Returns at once by default, so the GUI thread never waits for the
+        decoder; the capture is released on the decoder thread and
+        ``finished`` is set once it is.
+
+        Args:
+            timeout (float): Seconds to wait for the thread to end, None to
+                not wait.
+        """
+        self._stop_event.set()
+        self.ring.close()
+        if timeout is not None and self.is_alive() and \
+                threading.current_thread() is not self:
+            self.join(timeout)
+
+    def is_exhausted(self):
+        """Return True once decoding ended and every frame was shown."""
+        return self.finished.is_set() and not len(self.ring)
+
+
+_capture_pool = None
+_frame_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_capture_pool():
+    """Return the process-wide pool of open preview captures."""
+    global _capture_pool
+    with _cache_lock:
+        if _capture_pool is None:
+            _capture_pool = CapturePool()
+        return _capture_pool
+
+
+def get_frame_cache():
+    """Return the process-wide cache of decoded preview frames."""
+    global _frame_cache
+    with _cache_lock:
+        if _frame_cache is None:
+            _frame_cache = FrameCache()
+        return _frame_cache